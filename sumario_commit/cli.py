@@ -4,7 +4,8 @@
 import os
 import sys
 import subprocess
-from . import nucleo, util_config, util_git, util_debug, constantes,util_ia
+from datetime import date, datetime
+from . import nucleo, util_config, util_git, util_debug, constantes,util_ia, util_busqueda, util_prefetch, util_enrutado, util_triaje, util_informe, util_minhash, util_lotes, util_exportar
 
 def _limpiar_pantalla():
     """Limpia la pantalla de la consola."""
@@ -19,6 +20,14 @@ def _pausar_pantalla():
     """Pausa la ejecución hasta que el usuario presione Enter."""
     input("\nPresiona Enter para continuar...")
 
+def _iniciar_prefetch(config: dict):
+    """Arranca el prefetch en segundo plano del repositorio actual, si está activado en la configuración."""
+    ruta_repo = config.get(constantes.CLAVE_ULTIMA_RUTA)
+    if not config.get(constantes.CLAVE_PREFETCH_ACTIVADO) or not ruta_repo or not util_git.es_repositorio_git(ruta_repo):
+        util_prefetch.detener()
+        return
+    util_prefetch.iniciar(ruta_repo, con_ia=bool(config.get(constantes.CLAVE_PREFETCH_CON_IA)))
+
 def _mostrar_menu(config: dict):
     """Muestra el menú principal de opciones."""
     _limpiar_pantalla()
@@ -40,6 +49,9 @@ def _mostrar_menu(config: dict):
     print(" 5. Listar Resúmenes Guardados")
     print(" 6. Ver un Resumen Guardado")
     print(" 7. Ayuda")
+    print(" 8. Informe Multi-Repositorio")
+    print(" 9. Resúmenes por Lotes (Histórico)")
+    print("10. Exportar Resúmenes (Markdown, HTML o CSV)")
     print(" 0. Salir")
     print("-" * 37) # Separador visual
 
@@ -72,12 +84,15 @@ def _manejar_opcion_2_commit_especifico(config: dict):
         print(f"\nNo se encontraron commits en el repositorio '{ruta_repo}' o hubo un error.")
         return
 
+    consulta_actual = None # Texto de la última búsqueda (None = últimos commits)
     while True:
         _limpiar_pantalla()
         print("-------------------------------------")
         print("   Selecciona un Commit para Resumir")
         print("-------------------------------------")
         print(f"Repositorio: {ruta_repo}")
+        if consulta_actual:
+            print(f"Resultados de búsqueda para: '{consulta_actual}'")
         print("-------------------------------------")
 
         for i, commit in enumerate(commits):
@@ -85,12 +100,25 @@ def _manejar_opcion_2_commit_especifico(config: dict):
             print(f" {i+1:>2}. {commit['mensaje'][:70]} ({commit['fecha']}) [{commit['hash']}]") # Limita el mensaje a 70 caracteres
 
         print("-" * 37)
+        print("  /texto  Buscar en todo el historial (asunto, autor, hash o archivos)")
         print("  0. Volver al Menú Principal")
         print("-" * 37)
 
         try:
             eleccion = input("Tu elección: ").strip()
             if not eleccion: continue # Si no escribe nada, vuelve a mostrar
+            if eleccion.startswith("/"):
+                consulta = eleccion[1:].strip()
+                if not consulta:
+                    continue
+                resultados = util_busqueda.buscar_commits(ruta_repo, consulta, limite=30)
+                if resultados:
+                    commits = resultados
+                    consulta_actual = consulta
+                else:
+                    print(f"\nNo se encontraron commits para '{consulta}'." if resultados is not None else "\nNo se pudo realizar la búsqueda.")
+                    _pausar_pantalla()
+                continue
             indice = int(eleccion)
 
             if indice == 0:
@@ -129,6 +157,7 @@ def _manejar_opcion_3_cambiar_repo(config: dict):
     nueva_ruta = nucleo.seleccionar_ruta_repositorio(config, pedir_si_no_existe=True)
     if nueva_ruta:
         print(f"\nRepositorio establecido en: {nueva_ruta}")
+        _iniciar_prefetch(config) # El prefetch pasa a vigilar el nuevo repositorio
     else:
         # El mensaje de error ya se muestra dentro de seleccionar_ruta_repositorio
         print("\nNo se pudo establecer un nuevo repositorio.")
@@ -139,18 +168,57 @@ def _manejar_opcion_4_ver_config(config: dict):
     print("\n--- Configuración Actual ---")
     ruta_actual = config.get(constantes.CLAVE_ULTIMA_RUTA, "Ninguno")
     debug_activo = os.getenv(constantes.VAR_ENTORNO_DEBUG, "0") == "1"
-    directorio_base_app = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    ruta_resumenes = os.path.join(directorio_base_app, "resumenes_generados")
+    ruta_resumenes = util_config.obtener_ruta_carpeta_resumenes()
 
     print(f"Ruta del Repositorio: {ruta_actual}")
     print(f"Modo Debug Activo: {'Sí' if debug_activo else 'No'}")
     print(f"Carpeta de Resúmenes: {ruta_resumenes}")
+    if config.get(constantes.CLAVE_PREFETCH_ACTIVADO):
+        modo_prefetch = "patch y resumen" if config.get(constantes.CLAVE_PREFETCH_CON_IA) else "solo patch"
+        print(f"Prefetch en Segundo Plano: {modo_prefetch} ({'en marcha' if util_prefetch.esta_activo() else 'detenido'})")
+    else:
+        print("Prefetch en Segundo Plano: desactivado")
+
+    print("\nNiveles de Modelo (enrutado por tamaño del patch):")
+    for nivel in config.get(constantes.CLAVE_NIVELES_MODELO_IA) or constantes.NIVELES_MODELO_IA:
+        limite_latencia = nivel.get("latencia_max_s")
+        print(f"  - {nivel['modelo']}: hasta {nivel.get('max_tokens') or 'sin límite'} tokens"
+              + (f", mediana máx. {limite_latencia} s" if limite_latencia is not None else ""))
+    estadisticas = util_enrutado.obtener_estadisticas_latencia()
+    if estadisticas:
+        print("Latencias observadas en esta sesión:")
+        for modelo, datos in estadisticas.items():
+            if datos["p50"] is None:
+                print(f"  - {modelo}: {datos['muestras']} llamadas (muestras insuficientes)")
+            else:
+                print(f"  - {modelo}: {datos['muestras']} llamadas, mediana {datos['p50']:.1f} s, p95 {datos['p95']:.1f} s")
+
+    plazo = config.get(constantes.CLAVE_PLAZO_IA_SEGUNDOS)
+    print(f"\nPlazo por Resumen: {f'{plazo} s' if plazo else 'sin plazo'}")
+    if config.get(constantes.CLAVE_COBERTURA_ACTIVADA):
+        print(f"Peticiones de Cobertura: activadas (a partir del p{config.get(constantes.CLAVE_PERCENTIL_COBERTURA)} de latencia)")
+    else:
+        print("Peticiones de Cobertura: desactivadas")
+    llamadas = util_ia.obtener_estadisticas_llamadas()
+    if llamadas["llamadas"]:
+        print(f"En esta sesión: {llamadas['llamadas']} llamadas, {llamadas['coberturas_lanzadas']} coberturas lanzadas "
+              f"({llamadas['coberturas_ganadas']} ganadas), {llamadas['plazos_agotados']} plazos agotados")
+    if util_minhash.np is None:
+        print("Casi Duplicados (MinHash): no disponible (instala numpy)")
+    elif util_minhash.disponible():
+        modo = "reutilizar su resumen" if config.get(constantes.CLAVE_REUTILIZAR_CASI_DUPLICADOS) else "solo avisar"
+        print(f"Casi Duplicados (MinHash): similitud ≥ {config.get(constantes.CLAVE_UMBRAL_SIMILITUD_MINHASH)}, {modo}")
+    else:
+        print("Casi Duplicados (MinHash): desactivado")
+    omitidas = util_triaje.obtener_omisiones()
+    if omitidas:
+        detalle = ", ".join(f"{clase}: {total}" for clase, total in sorted(omitidas.items()))
+        print(f"Llamadas a la IA evitadas por triaje: {sum(omitidas.values())} ({detalle})")
 
 def _manejar_opcion_5_listar_resumenes():
     """Lista los archivos de resumen guardados."""
     print("\n--- Resúmenes Guardados ---")
-    directorio_base_app = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    ruta_carpeta_resumenes = os.path.join(directorio_base_app, "resumenes_generados")
+    ruta_carpeta_resumenes = util_config.obtener_ruta_carpeta_resumenes()
     util_debug.registrar_depuracion(f"Buscando resúmenes en: {ruta_carpeta_resumenes}")
 
     if not os.path.isdir(ruta_carpeta_resumenes):
@@ -180,8 +248,7 @@ def _manejar_opcion_5_listar_resumenes():
 def _manejar_opcion_6_ver_resumen():
     """Muestra el contenido de un archivo de resumen específico."""
     print("\n--- Ver un Resumen Guardado ---")
-    directorio_base_app = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    ruta_carpeta_resumenes = os.path.join(directorio_base_app, "resumenes_generados")
+    ruta_carpeta_resumenes = util_config.obtener_ruta_carpeta_resumenes()
 
     if not os.path.isdir(ruta_carpeta_resumenes):
         print("La carpeta de resúmenes 'resumenes_generados' no existe aún.")
@@ -250,15 +317,186 @@ def _manejar_opcion_7_ayuda():
     print("\nOpciones del menú:")
     print(" 1. Generar Resumen (Último Commit): Analiza el commit más reciente del repositorio configurado.")
     print(" 2. Generar Resumen (Commit Específico): Lista los últimos commits y permite elegir uno para analizar.")
+    print("    Escribe '/texto' en la lista para buscar en todo el historial (asunto, autor, hash o archivos).")
     print(" 3. Cambiar/Establecer Repositorio Git: Permite seleccionar la carpeta raíz de tu proyecto Git.")
     print(" 4. Ver Configuración Actual: Muestra la ruta del repositorio en uso y otros detalles.")
     print(" 5. Listar Resúmenes Guardados: Muestra los nombres de los archivos de resumen generados previamente.")
     print(" 6. Ver un Resumen Guardado: Permite elegir un resumen de la lista y ver su contenido.")
     print(" 7. Ayuda: Muestra esta pantalla de ayuda.")
+    print(" 8. Informe Multi-Repositorio: Gestiona la lista de repositorios del perfil y genera un único informe")
+    print("    con los commits de todos ellos entre dos fechas (opcionalmente, solo los tuyos).")
+    print(" 9. Resúmenes por Lotes (Histórico): Envía los commits sin resumen de un periodo como un trabajo por")
+    print("    lotes de la IA (más barato, tarda hasta horas) y guarda los resultados cuando terminan.")
+    print("10. Exportar Resúmenes: Reúne en un solo archivo (Markdown, HTML o CSV) los resúmenes guardados de")
+    print("    un periodo, agrupados por día, filtrando opcionalmente por repositorio y autor. No usa la IA.")
     print(" 0. Salir: Cierra la aplicación.")
     print("\nNota: Necesitas tener Git instalado y una API Key de Gemini configurada en el archivo .env.")
 
 
+def _pedir_fecha(mensaje: str, por_defecto: str) -> str | None:
+    """Pide una fecha YYYY-MM-DD (Enter = valor por defecto); devuelve None si no es válida."""
+    texto = input(f"{mensaje} [{por_defecto}]: ").strip() or por_defecto
+    try:
+        return datetime.strptime(texto, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        print(f"Fecha inválida: '{texto}'. Usa el formato YYYY-MM-DD.")
+        return None
+
+def _manejar_opcion_8_informe_multi(config: dict):
+    """Gestiona los repositorios del perfil y genera el informe combinado."""
+    while True:
+        _limpiar_pantalla()
+        print("-------------------------------------")
+        print("     Informe Multi-Repositorio")
+        print("-------------------------------------")
+        repos = config.get(constantes.CLAVE_REPOSITORIOS_PERFIL) or []
+        if repos:
+            for i, ruta in enumerate(repos):
+                estado = "" if util_git.es_repositorio_git(ruta) else "  (no válido)"
+                print(f" {i+1:>2}. {ruta}{estado}")
+        else:
+            print("No hay repositorios en el perfil.")
+        print("-" * 37)
+        print("  a. Añadir repositorio")
+        print("  q. Quitar repositorio")
+        print("  g. Generar informe")
+        print("  0. Volver al Menú Principal")
+        print("-" * 37)
+
+        try:
+            eleccion = input("Tu elección: ").strip().lower()
+            if eleccion == '0':
+                break
+            elif eleccion == 'a':
+                ruta_actual = config.get(constantes.CLAVE_ULTIMA_RUTA) or ""
+                ruta = input(f"Ruta del repositorio [{ruta_actual or 'ninguna'}]: ").strip() or ruta_actual
+                if not ruta or not util_git.es_repositorio_git(ruta):
+                    print("Error: La ruta no es un repositorio Git válido.")
+                elif os.path.abspath(ruta) in [os.path.abspath(r) for r in repos]:
+                    print("Ese repositorio ya está en el perfil.")
+                else:
+                    config[constantes.CLAVE_REPOSITORIOS_PERFIL] = repos + [os.path.abspath(ruta)]
+                    util_config.guardar_configuracion(config)
+                    print(f"Añadido: {os.path.abspath(ruta)}")
+                _pausar_pantalla()
+            elif eleccion == 'q':
+                indice = int(input("Número del repositorio a quitar: ").strip())
+                if 1 <= indice <= len(repos):
+                    config[constantes.CLAVE_REPOSITORIOS_PERFIL] = repos[:indice - 1] + repos[indice:]
+                    util_config.guardar_configuracion(config)
+                else:
+                    print("Número fuera de rango.")
+                    _pausar_pantalla()
+            elif eleccion == 'g':
+                if not repos:
+                    print("Añade al menos un repositorio antes de generar el informe.")
+                    _pausar_pantalla()
+                    continue
+                desde = _pedir_fecha("Desde (YYYY-MM-DD)", date.today().strftime("%Y-%m-%d"))
+                hasta = _pedir_fecha("Hasta (YYYY-MM-DD)", desde) if desde else None
+                if desde and hasta:
+                    if hasta < desde:
+                        desde, hasta = hasta, desde
+                    solo_propios = input("¿Solo tus commits (según git config user.email)? (s/N): ").strip().lower() == 's'
+                    print(f"\nGenerando informe de {len(repos)} repositorios ({desde} - {hasta})...")
+                    util_informe.generar_informe(repos, desde, hasta, solo_propios)
+                _pausar_pantalla()
+        except ValueError:
+            print("Entrada inválida. Introduce un número.")
+            _pausar_pantalla()
+        except KeyboardInterrupt:
+            print("\nOperación cancelada.")
+            break
+
+def _manejar_opcion_9_lotes(config: dict):
+    """Crea lotes con el histórico pendiente del repositorio actual y consulta o reanuda los existentes."""
+    while True:
+        _limpiar_pantalla()
+        print("-------------------------------------")
+        print("   Resúmenes por Lotes (Histórico)")
+        print("-------------------------------------")
+        lotes = util_lotes.listar_lotes()
+        if lotes:
+            for i, lote in enumerate(lotes):
+                estados = [c["estado"] for c in lote["commits"].values()]
+                en_curso = sum(1 for t in lote["trabajos"] if t["estado"] in (util_lotes.ESTADO_CREADO, util_lotes.ESTADO_ENVIADO))
+                fallidos = estados.count(util_lotes.COMMIT_FALLIDO) + estados.count(util_lotes.COMMIT_ERROR)
+                print(f" {i+1:>2}. {lote['id']}  {os.path.basename(lote['repositorio'])} ({lote['desde']} - {lote['hasta']})  "
+                      f"{estados.count(util_lotes.COMMIT_GUARDADO)}/{len(estados)} guardados"
+                      + (f", {en_curso} trabajo(s) en curso" if en_curso else "") + (f", {fallidos} fallidos" if fallidos else ""))
+        else:
+            print("No hay lotes creados.")
+        print("-" * 37)
+        print("  n. Nuevo lote (repositorio actual)")
+        print("  r. Reanudar / esperar un lote")
+        print("  f. Reintentar los commits fallidos de un lote")
+        print("  0. Volver al Menú Principal")
+        print("-" * 37)
+
+        try:
+            eleccion = input("Tu elección: ").strip().lower()
+            if eleccion == '0':
+                break
+            elif eleccion == 'n':
+                ruta_repo = config.get(constantes.CLAVE_ULTIMA_RUTA)
+                if not ruta_repo or not util_git.es_repositorio_git(ruta_repo):
+                    print("Error: Repositorio no configurado o inválido. Usa la opción 3.")
+                    _pausar_pantalla()
+                    continue
+                desde = _pedir_fecha("Desde (YYYY-MM-DD)", date.today().replace(day=1).strftime("%Y-%m-%d"))
+                hasta = _pedir_fecha("Hasta (YYYY-MM-DD)", date.today().strftime("%Y-%m-%d")) if desde else None
+                if desde and hasta:
+                    if hasta < desde:
+                        desde, hasta = hasta, desde
+                    print(f"\nPreparando el lote de {ruta_repo} ({desde} - {hasta})...")
+                    util_lotes.crear_lote(ruta_repo, desde, hasta)
+                _pausar_pantalla()
+            elif eleccion == 'r':
+                indice = int(input("Número del lote: ").strip())
+                if 1 <= indice <= len(lotes):
+                    try:
+                        util_lotes.procesar_lote(lotes[indice - 1]["id"], esperar=True)
+                    except KeyboardInterrupt:
+                        print("\nEspera interrumpida; el lote se puede reanudar más tarde.")
+                else:
+                    print("Número fuera de rango.")
+                _pausar_pantalla()
+            elif eleccion == 'f':
+                indice = int(input("Número del lote: ").strip())
+                if 1 <= indice <= len(lotes):
+                    util_lotes.reintentar_fallidos(lotes[indice - 1]["id"])
+                else:
+                    print("Número fuera de rango.")
+                _pausar_pantalla()
+        except ValueError:
+            print("Entrada inválida. Introduce un número.")
+            _pausar_pantalla()
+        except KeyboardInterrupt:
+            print("\nOperación cancelada.")
+            break
+
+def _manejar_opcion_10_exportar(config: dict):
+    """Pide formato, periodo y filtros y exporta los resúmenes guardados a un único archivo."""
+    print("\n--- Exportar Resúmenes ---")
+    formatos = constantes.FORMATOS_EXPORTACION
+    formato = input(f"Formato ({'/'.join(formatos)}) [{formatos[0]}]: ").strip().lower() or formatos[0]
+    if formato not in formatos:
+        print(f"Formato no válido: '{formato}'.")
+        return
+    desde = _pedir_fecha("Desde (YYYY-MM-DD)", date.today().replace(day=1).strftime("%Y-%m-%d"))
+    hasta = _pedir_fecha("Hasta (YYYY-MM-DD)", date.today().strftime("%Y-%m-%d")) if desde else None
+    if not desde or not hasta:
+        return
+    if hasta < desde:
+        desde, hasta = hasta, desde
+
+    ruta_repo = config.get(constantes.CLAVE_ULTIMA_RUTA)
+    if ruta_repo and input(f"¿Solo el repositorio actual ({ruta_repo})? (s/N): ").strip().lower() != 's':
+        ruta_repo = None
+    autor = input("Autor (parte del nombre, Enter = todos): ").strip() or None
+    util_exportar.exportar_resumenes(formato, desde, hasta, ruta_repo, autor)
+
+
 # --- Bucle Principal de la CLI ---
 
 def iniciar_cli():
@@ -275,6 +513,14 @@ def iniciar_cli():
          print("Asegúrate de tener la variable GOOGLE_API_KEY en tu archivo .env")
          _pausar_pantalla() # Pausa para que el usuario vea el mensaje
 
+    _iniciar_prefetch(config)
+    try:
+        _bucle_menu(config)
+    finally:
+        util_prefetch.detener() # Salir (o Ctrl+C) cancela cualquier trabajo en segundo plano
+
+def _bucle_menu(config: dict):
+    """Muestra el menú y despacha las opciones hasta que el usuario sale."""
     while True:
         _mostrar_menu(config)
         opcion = input("Tu elección: ").strip()
@@ -303,6 +549,14 @@ def iniciar_cli():
             elif opcion == '7':
                 _manejar_opcion_7_ayuda()
                 _pausar_pantalla()
+            elif opcion == '8':
+                # Submenú con su propio bucle y pausas
+                _manejar_opcion_8_informe_multi(config)
+            elif opcion == '9':
+                _manejar_opcion_9_lotes(config)
+            elif opcion == '10':
+                _manejar_opcion_10_exportar(config)
+                _pausar_pantalla()
             elif opcion == '0':
                 util_debug.registrar_depuracion("Usuario seleccionó salir.")
                 print("\n¡Hasta luego!")
@@ -5,12 +5,89 @@
 NOMBRE_ARCHIVO_CONFIG = "config.json"
 PREFIJO_ARCHIVO_RESUMEN = "resumen_"
 EXTENSION_ARCHIVO_RESUMEN = ".md" # Usar Markdown por defecto
+EXTENSION_ARCHIVO_DATOS_RESUMEN = ".json" # Campos estructurados del resumen, junto al .md
+NOMBRE_CARPETA_RESUMENES = "resumenes_generados"
+NOMBRE_ARCHIVO_INDICE_PATCH_ID = "indice_patch_id.json" # Dentro de la carpeta de resúmenes
+NOMBRE_ARCHIVO_FIRMAS_MINHASH = "firmas_minhash.bin" # Firmas uint32 consecutivas, una fila por resumen
+NOMBRE_ARCHIVO_ENTRADAS_MINHASH = "firmas_minhash.jsonl" # Resumen de cada fila del .bin, en el mismo orden
+
+EXTENSION_ARCHIVO_BLOQUEO = ".lock" # Archivo auxiliar para el bloqueo entre procesos ('<archivo>.lock')
 
 # Claves de configuración
 CLAVE_ULTIMA_RUTA = "ultima_ruta_repo"
+CLAVE_LECTOR_OBJETOS_NATIVO = "lector_objetos_nativo" # Leer commits directamente de .git/objects (sin lanzar git)
+CLAVE_PREFETCH_ACTIVADO = "prefetch_activado" # Preparar el patch de HEAD en segundo plano mientras se ve el menú
+CLAVE_PREFETCH_CON_IA = "prefetch_con_ia" # Además, generar el resumen de HEAD por adelantado (consume cuota)
+CLAVE_NIVELES_MODELO_IA = "niveles_modelo_ia" # Enrutado de modelos por tamaño del patch (ver NIVELES_MODELO_IA)
+CLAVE_PLAZO_IA_SEGUNDOS = "plazo_ia_segundos" # Tiempo máximo por resumen (0 o null = sin plazo)
+CLAVE_COBERTURA_ACTIVADA = "cobertura_activada" # Lanzar una petición duplicada si la primera tarda más de lo habitual
+CLAVE_PERCENTIL_COBERTURA = "percentil_cobertura" # Percentil de latencia a partir del cual se lanza la duplicada
+CLAVE_REPOSITORIOS_PERFIL = "repositorios_perfil" # Repositorios incluidos en el informe multi-repositorio
+CLAVE_MINHASH_ACTIVADO = "minhash_activado" # Buscar resúmenes de patches casi idénticos antes de llamar a la IA (requiere NumPy)
+CLAVE_UMBRAL_SIMILITUD_MINHASH = "umbral_similitud_minhash" # Similitud Jaccard estimada (0-1) para considerar casi duplicado
+CLAVE_REUTILIZAR_CASI_DUPLICADOS = "reutilizar_casi_duplicados" # Reutilizar su resumen (si no, solo se avisa y se llama a la IA)
+CLAVE_PROVEEDOR_LOTES = "proveedor_lotes" # "gemini" (Batch API) o "local" (sustituto sin red, para pruebas)
+CLAVE_LLAMADAS_IA_SIMULTANEAS = "llamadas_ia_simultaneas" # Peticiones al modelo en vuelo a la vez, compartidas por toda la app
 
 # Configuración IA
-NOMBRE_MODELO_IA = "gemini-2.0-flash" # Modelo de IA a utilizar
+NOMBRE_MODELO_IA = "gemini-2.0-flash" # Modelo de IA por defecto (y nivel intermedio del enrutado)
+# Niveles de modelo del más barato/rápido al de contexto más largo. Se elige el primero cuyo
+# 'max_tokens' admite el prompt estimado y cuya latencia mediana observada no supera 'latencia_max_s'.
+NIVELES_MODELO_IA = [
+    {"modelo": "gemini-2.0-flash-lite", "max_tokens": 8000, "latencia_max_s": 8},
+    {"modelo": NOMBRE_MODELO_IA, "max_tokens": 200000, "latencia_max_s": 30},
+    {"modelo": "gemini-2.5-pro", "max_tokens": 1000000, "latencia_max_s": None},
+]
+MUESTRAS_LATENCIA_MAXIMAS = 50 # Últimas latencias guardadas por modelo
+MUESTRAS_LATENCIA_MINIMAS = 5 # Muestras necesarias antes de usar la latencia para decidir
+VIGENCIA_LATENCIA_SEGUNDOS = 600 # Las latencias más antiguas no cuentan (un nivel descartado vuelve a probarse)
+PLAZO_IA_SEGUNDOS = 90
+PERCENTIL_COBERTURA = 95
+HILOS_MAXIMOS_IA = 8 # Llamadas simultáneas al modelo (incluidas las duplicadas de cobertura)
+LLAMADAS_IA_SIMULTANEAS = 4 # Valor por defecto del limitador compartido de peticiones al modelo
+
+# Lector nativo de objetos Git
+TAMANO_MAX_CACHE_OBJETOS = 32 * 1024 * 1024 # Bytes máximos de objetos descomprimidos en caché
+LINEAS_MAXIMAS_DIFF_NATIVO = 5000 # Líneas distintas por archivo a partir de las cuales el numstat se pide a git
+
+# Búsqueda de commits
+NOMBRE_CARPETA_INDICES = "indices_busqueda" # Índices por repositorio, junto a config.json
+MAXIMO_CANDIDATOS_BUSQUEDA = 20000 # Líneas examinadas como máximo por búsqueda (de las más recientes)
+FACTOR_COINCIDENCIAS_BUSQUEDA = 10 # Se ordenan hasta límite * factor coincidencias recientes
+TAMANO_VENTANA_BUSQUEDA = 256 * 1024 # Caracteres por ventana en la búsqueda por subsecuencia
+
+# Prefetch en segundo plano
+INTERVALO_PREFETCH_SEGUNDOS = 5 # Cada cuánto se comprueba si HEAD ha cambiado
+ESPERA_MAXIMA_PREFETCH_SEGUNDOS = 120 # Espera máxima a un resumen que ya se está generando en segundo plano
+
+# Casi duplicados (MinHash)
+PERMUTACIONES_MINHASH = 128 # Valores por firma
+BANDAS_MINHASH = 32 # Bandas LSH de 4 filas: candidatas desde una similitud de ~0.4, se verifican después
+TAMANO_SHINGLE_MINHASH = 5 # Tokens consecutivos por shingle
+BLOQUE_SHINGLES_MINHASH = 4096 # Shingles procesados a la vez al calcular una firma
+LINEAS_MINIMAS_MINHASH = 3 # Por debajo, dos cambios sin relación (p. ej. "+import os") dan firmas idénticas
+SHINGLES_MINIMOS_MINHASH = 16 # Ídem: la similitud estimada sobre conjuntos tan pequeños no significa nada
+SEMILLA_MINHASH = 20240611 # Fija: cambiarla invalida las firmas guardadas
+UMBRAL_SIMILITUD_MINHASH = 0.9
+
+# Informe multi-repositorio
+PREFIJO_ARCHIVO_INFORME = "informe_multi_" # En la carpeta de resúmenes: informe_multi_<desde>_<hasta>.md
+PROCESOS_MAXIMOS_INFORME = 8 # Procesos de git en paralelo como máximo (además del límite de núcleos)
+
+# Resúmenes por lotes
+NOMBRE_CARPETA_LOTES = "lotes" # Dentro de la carpeta de resúmenes: un subdirectorio por lote
+NOMBRE_ARCHIVO_ESTADO_LOTE = "estado.json"
+PROVEEDOR_LOTES = "gemini"
+INTERVALO_SONDEO_LOTES_SEGUNDOS = 30 # Cada cuánto se consulta un trabajo por lotes en curso
+GUARDADO_ESTADO_LOTE_CADA = 50 # Resúmenes ingeridos entre guardados del estado (para reanudar)
+
+# Exportación de resúmenes guardados
+PREFIJO_ARCHIVO_EXPORTACION = "exportacion_" # En la carpeta de resúmenes: exportacion_<desde>_<hasta>.<formato>
+FORMATOS_EXPORTACION = ("md", "html", "csv")
+
+# Escritura de archivos
+REINTENTOS_REEMPLAZO_ARCHIVO = 10 # Reintentos del renombrado atómico (en Windows falla si otro proceso tiene el archivo abierto)
+LONGITUD_HASH_ARCHIVO = 12 # Caracteres del hash del commit en el nombre de cada resumen
 
 # Variables de entorno
 VAR_ENTORNO_API_KEY = "GOOGLE_API_KEY"
@@ -2,8 +2,11 @@
 # -*- coding: utf-8 -*-
 # Lógica principal y orquestación de SumarioCommit
 
+import json
+import multiprocessing
 import os
-from . import util_config, util_git, util_ia, constantes, util_debug 
+from concurrent.futures import ProcessPoolExecutor
+from . import util_config, util_git, util_ia, constantes, util_debug, util_indice_patch, util_prefetch, util_triaje, util_formato, util_minhash, util_archivos
 
 def ejecutar_resumen_para_commit(ruta_repo: str, hash_commit: str, fecha_commit: str) -> bool:
     """
@@ -19,33 +22,159 @@ def ejecutar_resumen_para_commit(ruta_repo: str, hash_commit: str, fecha_commit:
     """
     util_debug.registrar_depuracion(f"Ejecutando resumen para commit: {hash_commit} ({fecha_commit}) en {ruta_repo}")
 
-    patch = util_git.generar_patch_commit(ruta_repo, hash_commit) # Usa la función renombrada/adaptada
-    if not patch:
+    # Si el prefetch en segundo plano ya preparó este commit, se reutiliza su patch
+    preparado = preparar_commit(ruta_repo, hash_commit, util_prefetch.obtener_patch(ruta_repo, hash_commit))
+    if not preparado:
         print("Error: No se pudo generar el patch del commit.")
         util_debug.registrar_depuracion(f"Fallo al generar patch para {hash_commit}")
         return False
 
-    # Verificar si la IA está lista (por si falló al inicio o se necesita reconfigurar)
-    if util_ia.modelo_ia is None:
-         if not util_ia.configurar_ia():
-              print("Error: Fallo al configurar la IA. No se puede generar el resumen.")
-              util_debug.registrar_depuracion("Fallo configuración IA antes de generar resumen.")
-              return False
-
-    print("Generando resumen con IA... (puede tardar unos segundos)")
-    resumen_ia = util_ia.generar_resumen_con_ia(patch)
-
-    if resumen_ia:
-        print("\n--- Resumen Generado ---")
-        print(resumen_ia)
-        print("------------------------\n")
-        guardar_resumen(fecha_commit, resumen_ia, ruta_repo) # Usa la fecha proporcionada
+    aviso_ia = lambda: print("Generando resumen con IA... (puede tardar unos segundos)")
+    datos_resumen, metadatos = obtener_resumen_commit(ruta_repo, preparado, al_llamar_ia=aviso_ia)
+    origen = metadatos.get("origen")
+    if origen == "triaje":
+        print(f"Commit trivial ({preparado['triaje']['motivo']}): resumen rápido sin llamar a la IA.")
+    elif origen == "patch-id":
+        print(f"Cambios equivalentes ya resumidos en el commit {metadatos['hash_origen'][:7]} (mismo patch-id).")
+        print("Reutilizando ese resumen sin llamar a la IA.")
+    elif origen == "minhash":
+        print(f"Patch casi idéntico al del commit {metadatos['hash_origen'][:7]} (similitud {metadatos['similitud']:.0%}).")
+        print("Reutilizando ese resumen sin llamar a la IA.")
+    elif origen == "prefetch":
+        print("Usando el resumen generado en segundo plano.")
+    elif datos_resumen:
+        print(f"Modelo utilizado: {metadatos['modelo']} ({metadatos['motivo']})")
+    if metadatos.get("similar_a"):
+        print(f"Nota: se parece al commit ya resumido {metadatos['similar_a']['hash'][:7]} "
+              f"(similitud {metadatos['similar_a']['similitud']:.0%}): {metadatos['similar_a']['archivo']}")
+
+    if datos_resumen:
+        ruta_archivo = _mostrar_y_guardar_resumen(fecha_commit, datos_resumen, ruta_repo, metadatos, preparado['info'])
+        if ruta_archivo:
+            registrar_resumen_nuevo(preparado, metadatos, ruta_archivo, datos_resumen)
         return True
     else:
-        print("Error: No se pudo generar el resumen usando la IA.")
+        print(f"Error: No se pudo generar el resumen usando la IA ({metadatos.get('motivo')}).")
         util_debug.registrar_depuracion(f"Fallo al obtener resumen de IA para {hash_commit}")
         return False
 
+def _inicializar_proceso_git():
+    # Los procesos 'spawn' empiezan de cero: no heredan el estado del modo debug
+    util_debug.configurar_depuracion()
+
+def crear_pool_git(procesos: int) -> ProcessPoolExecutor:
+    """
+    Pool de procesos para el trabajo de git (preparar_commit y similares).
+
+    Usa 'spawn' en todas las plataformas: con 'fork' (el predeterminado en Linux) el hijo
+    heredaría copiados los cerrojos que en ese momento tuvieran tomados el hilo de prefetch
+    o los hilos de la IA, y podría quedarse bloqueado para siempre.
+    """
+    return ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_inicializar_proceso_git)
+
+def preparar_commit(ruta_repo: str, hash_commit: str, patch: str | None = None) -> dict | None:
+    """
+    Hace todo el trabajo de git de un commit, sin IA ni salida por pantalla.
+
+    Obtiene las estadísticas y el triaje y, si el commit no es trivial, el patch y su
+    patch-id. Solo usa git, así que puede ejecutarse en otro proceso (informes
+    multi-repositorio). Devuelve {'info', 'triaje', 'patch', 'patch_id', 'firma'} o None si
+    no se pudo obtener el patch.
+    """
+    # Datos baratos del commit (padres, autor, asunto, numstat): sirven para el triaje y se guardan con el resumen
+    estadisticas = util_git.obtener_estadisticas_commit(ruta_repo, hash_commit)
+    info_commit = {"hash": hash_commit, "autor": None, "asunto": None}
+    if estadisticas:
+        info_commit.update(autor=estadisticas['autor'], asunto=estadisticas['asunto'])
+
+    # Merges, reverts, renombrados, cambios de formato o de versión no necesitan la IA (ni el patch)
+    triaje = util_triaje.clasificar_commit(ruta_repo, hash_commit, estadisticas) if estadisticas else None
+    if triaje:
+        return {"info": info_commit, "triaje": triaje, "patch": None, "patch_id": None, "firma": None}
+
+    patch = patch or util_git.generar_patch_commit(ruta_repo, hash_commit)
+    if not patch:
+        return None
+    # Un rebase o cherry-pick cambia el hash pero no el patch-id; la firma MinHash detecta además patches casi idénticos
+    patch_id = util_git.obtener_patch_id(ruta_repo, patch)
+    firma = util_minhash.calcular_firma(patch) if util_minhash.disponible() else None
+    return {"info": info_commit, "triaje": None, "patch": patch, "patch_id": patch_id, "firma": firma}
+
+def obtener_resumen_commit(ruta_repo: str, preparado: dict, usar_prefetch: bool = True,
+                           al_llamar_ia=None, permitir_ia: bool = True) -> tuple[dict | None, dict]:
+    """
+    Obtiene (datos, metadatos) del resumen de un commit preparado, sin imprimir nada.
+
+    Prueba por orden el triaje, el índice de patch-id, el prefetch, los casi duplicados
+    (MinHash) y, por último, la IA (llamando antes a 'al_llamar_ia', si se indica; con
+    permitir_ia=False se devuelve sin resumen en lugar de llamarla). metadatos['origen'] indica de dónde
+    salió el resumen; si no se pudo obtener, datos es None y metadatos['motivo'] explica por qué.
+    """
+    hash_commit = preparado['info']['hash']
+    triaje = preparado['triaje']
+    if triaje:
+        util_triaje.registrar_omision(triaje['clase'])
+        return triaje['resumen'], {"origen": "triaje", "modelo": None, "motivo": f"triaje, {triaje['motivo']}"}
+
+    entrada_previa = util_indice_patch.buscar_resumen(preparado['patch_id']) if preparado['patch_id'] else None
+    if entrada_previa and entrada_previa.get("hash") != hash_commit:
+        metadatos = {"origen": "patch-id", "hash_origen": entrada_previa['hash'], "modelo": None,
+                     "motivo": f"reutilizado del commit {entrada_previa['hash'][:7]} (mismo patch-id)"}
+        return entrada_previa["datos"], metadatos
+
+    if usar_prefetch:
+        datos_resumen, metadatos = util_prefetch.obtener_resumen(ruta_repo, hash_commit) or (None, None)
+        if datos_resumen:
+            return datos_resumen, {"origen": "prefetch", **metadatos}
+
+    # Patches casi idénticos (otra rama, un fork, un servicio hermano) que el patch-id no reconoce
+    similar = util_minhash.buscar_similar(preparado.get('firma'), hash_commit)
+    if similar and util_config.obtener_ajuste(constantes.CLAVE_REUTILIZAR_CASI_DUPLICADOS):
+        metadatos = {"origen": "minhash", "hash_origen": similar['hash'], "similitud": similar['similitud'], "modelo": None,
+                     "motivo": f"reutilizado del commit {similar['hash'][:7]} (patch casi idéntico, similitud {similar['similitud']:.0%})"}
+        return similar['datos'], metadatos
+
+    if not permitir_ia:
+        return None, {"origen": None, "modelo": None, "motivo": "necesita la IA"}
+
+    # Verificar si la IA está lista (por si falló al inicio o se necesita reconfigurar)
+    if util_ia.modelo_ia is None and not util_ia.configurar_ia():
+        util_debug.registrar_depuracion("Fallo configuración IA antes de generar resumen.")
+        return None, {"origen": None, "modelo": None, "motivo": "la IA no está configurada"}
+
+    if al_llamar_ia:
+        al_llamar_ia()
+    datos_resumen, metadatos = util_ia.generar_resumen_enrutado(preparado['patch'])
+    metadatos = {"origen": "ia", **metadatos}
+    if similar: # Sin reutilizar, al menos se deja constancia del parecido
+        metadatos["similar_a"] = {"hash": similar['hash'], "archivo": similar['archivo'], "similitud": similar['similitud']}
+    return datos_resumen, metadatos
+
+def registrar_resumen_nuevo(preparado: dict, metadatos: dict, ruta_archivo: str, datos_resumen: dict):
+    """Añade un resumen recién guardado a los índices de reutilización (patch-id y casi duplicados)."""
+    registrar_resumenes_nuevos([(preparado, metadatos, ruta_archivo, datos_resumen)])
+
+def registrar_resumenes_nuevos(registros: list[tuple[dict, dict, str, dict]]):
+    """Como registrar_resumen_nuevo para muchos (preparado, metadatos, ruta, datos), escribiendo el índice de patch-id una vez."""
+    entradas_patch_id = []
+    for preparado, metadatos, ruta_archivo, datos_resumen in registros:
+        hash_commit = preparado['info']['hash']
+        if preparado['patch_id']:
+            entradas_patch_id.append((preparado['patch_id'], hash_commit, ruta_archivo, datos_resumen))
+        # Un resumen reutilizado ya tiene su firma (o una casi igual) en el almacén
+        if preparado.get('firma') is not None and metadatos.get("origen") in ("ia", "prefetch", "lote"):
+            util_minhash.registrar_firma(preparado['firma'], hash_commit, ruta_archivo, datos_resumen)
+    if entradas_patch_id:
+        util_indice_patch.registrar_resumenes(entradas_patch_id)
+
+def _mostrar_y_guardar_resumen(fecha_commit: str, datos_resumen: dict, ruta_repo: str, metadatos: dict, info_commit: dict) -> str | None:
+    """Muestra el resumen renderizado en Markdown y lo guarda; devuelve la ruta del archivo (None si falla)."""
+    print("\n--- Resumen Generado ---")
+    print(util_formato.renderizar_markdown(datos_resumen))
+    print("------------------------\n")
+    return guardar_resumen(fecha_commit, info_commit['hash'], datos_resumen, ruta_repo, metadatos, info_commit) # Usa la fecha proporcionada
+
 def generar_resumen_ultimo_commit(ruta_repo: str):
     """Obtiene el último commit y llama a la función de generación de resumen."""
     util_debug.registrar_depuracion("Iniciando flujo para obtener y resumir último commit.")
@@ -71,39 +200,90 @@ def cargar_configuracion_inicial() -> dict | None:
         # No es fatal, la app puede continuar para otras opciones
     return config
 
-def guardar_resumen(fecha_commit: str, contenido_resumen: str, ruta_base_repo: str) -> bool:
-    """Guarda el resumen generado en un archivo."""
-    nombre_archivo = f"{constantes.PREFIJO_ARCHIVO_RESUMEN}{fecha_commit}_{util_git.obtener_hash_corto(ruta_base_repo, 'HEAD')}.{constantes.EXTENSION_ARCHIVO_RESUMEN}" # Añadir hash corto para diferenciar commits del mismo día
+def describir_origen(metadatos: dict) -> str:
+    """Frase que explica cómo se obtuvo el resumen (modelo usado o motivo para no llamar a la IA)."""
+    if metadatos.get("modelo"):
+        return f"Generado con {metadatos['modelo']} ({metadatos.get('motivo', '')})."
+    return f"Sin llamada a la IA: {metadatos.get('motivo', '')}."
+
+def formatear_metadatos(metadatos: dict) -> str:
+    """Línea final del archivo que deja constancia de cómo se obtuvo el resumen."""
+    return f"\n\n---\n_{describir_origen(metadatos)}_\n"
+
+def obtener_ruta_datos_resumen(ruta_archivo_resumen: str) -> str:
+    """Ruta del .json con los campos estructurados que acompaña a un resumen .md."""
+    return os.path.splitext(ruta_archivo_resumen)[0] + constantes.EXTENSION_ARCHIVO_DATOS_RESUMEN
+
+def nombre_archivo_resumen(fecha_commit: str, hash_commit: str) -> str:
+    """Nombre del archivo Markdown del resumen de un commit (único por commit)."""
+    return f"{constantes.PREFIJO_ARCHIVO_RESUMEN}{fecha_commit}_{hash_commit[:constantes.LONGITUD_HASH_ARCHIVO]}{constantes.EXTENSION_ARCHIVO_RESUMEN}"
+
+def cargar_datos_resumen(fecha_commit: str, hash_commit: str) -> dict | None:
+    """Registro del .json de un resumen ya guardado (fecha, repositorio, autor, asunto, resumen...), o None."""
+    ruta = obtener_ruta_datos_resumen(os.path.join(util_config.obtener_ruta_carpeta_resumenes(),
+                                                   nombre_archivo_resumen(fecha_commit, hash_commit)))
+    try:
+        with open(ruta, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+            registro = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, json.JSONDecodeError) as e:
+        util_debug.registrar_depuracion(f"No se pudo leer {ruta}: {e}")
+        return None
+    registro["resumen"] = util_formato.validar_resumen(registro.get("resumen"))
+    return registro if registro["resumen"] else None
+
+def guardar_resumen(fecha_commit: str, hash_commit: str, datos_resumen: dict, ruta_base_repo: str,
+                    metadatos: dict | None = None, info_commit: dict | None = None, informar: bool = True) -> str | None:
+    """
+    Guarda el resumen en Markdown (renderizado localmente) y sus campos estructurados en un .json al lado.
+
+    El nombre depende de la fecha y del hash del commit resumido, así que resúmenes de commits
+    distintos nunca se pisan. Ambos archivos se reemplazan de forma atómica: aunque varios
+    procesos guarden a la vez, nadie lee un archivo a medias. Con informar=False no se anuncia
+    cada archivo (procesos masivos). Devuelve la ruta del Markdown (None si falla).
+    """
+    hash_corto = hash_commit[:constantes.LONGITUD_HASH_ARCHIVO]
+    nombre_archivo = nombre_archivo_resumen(fecha_commit, hash_commit)
 
     # Guardar en una subcarpeta 'resumenes_generados' dentro del directorio de la app
-    directorio_base_app = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    ruta_carpeta_resumenes = os.path.join(directorio_base_app, "resumenes_generados")
+    ruta_carpeta_resumenes = util_config.obtener_ruta_carpeta_resumenes()
     ruta_completa_archivo = os.path.join(ruta_carpeta_resumenes, nombre_archivo)
 
     util_debug.registrar_depuracion(f"Intentando guardar resumen en: {ruta_completa_archivo}")
 
-    try:
-        # Crear la carpeta si no existe
-        os.makedirs(ruta_carpeta_resumenes, exist_ok=True)
+    encabezado = f"# Resumen del Commit ({fecha_commit} - {hash_corto})\n\n"
+    contenido = encabezado + util_formato.renderizar_markdown(datos_resumen)
+    if metadatos:
+        contenido += formatear_metadatos(metadatos)
+    # Campos estructurados: permiten informes y búsquedas sin volver a parsear el Markdown
+    registro = {
+        "fecha": fecha_commit,
+        "repositorio": os.path.abspath(ruta_base_repo),
+        **(info_commit or {}),
+        "hash": hash_commit,
+        "resumen": datos_resumen,
+        "metadatos": metadatos or {},
+    }
 
-        # Escribir el contenido en el archivo
-        encabezado = f"# Resumen del Commit ({fecha_commit} - {util_git.obtener_hash_corto(ruta_base_repo, 'HEAD')})\n\n" # Encabezado más informativo
-        with open(ruta_completa_archivo, 'w', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
-            f.write(encabezado)
-            f.write(contenido_resumen)
+    try:
+        util_archivos.escribir_atomico(ruta_completa_archivo, contenido)
+        util_archivos.escribir_atomico(obtener_ruta_datos_resumen(ruta_completa_archivo),
+                                       json.dumps(registro, indent=2, ensure_ascii=False))
 
-        print(f"Resumen guardado exitosamente en: {ruta_completa_archivo}")
+        if informar:
+            print(f"Resumen guardado exitosamente en: {ruta_completa_archivo}")
         util_debug.registrar_depuracion("Archivo de resumen guardado.")
-        return True
+        return ruta_completa_archivo
     except OSError as e:
         print(f"Error al crear el directorio o archivo de resumen: {e}")
         util_debug.registrar_depuracion(f"Error de OS al guardar resumen: {e}")
-        return False
+        return None
     except Exception as e:
         print(f"Error inesperado al guardar el resumen: {e}")
         util_debug.registrar_depuracion(f"Excepción inesperada al guardar resumen: {e}")
-        return False
-    
+        return None
+
 def seleccionar_ruta_repositorio(config_actual: dict, pedir_si_no_existe=False) -> str | None:
     """
     Obtiene una ruta de repositorio válida, ya sea la guardada o pidiéndola al usuario.
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Escritura segura de archivos: reemplazo atómico y bloqueo entre procesos
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from . import constantes, util_debug
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+# umask del proceso, leída una vez al importar (os.umask solo permite leerla cambiándola)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def escribir_atomico(ruta: str, contenido: str | bytes):
+    """
+    Escribe el archivo completo en un temporal de la misma carpeta y lo renombra sobre el destino.
+
+    Quien lea el archivo ve el contenido anterior o el nuevo, nunca uno a medias, aunque el
+    proceso se interrumpa. Lanza OSError si falla (el temporal se elimina).
+    """
+    with abrir_atomico(ruta, binario=isinstance(contenido, bytes)) as archivo:
+        archivo.write(contenido)
+
+@contextmanager
+def abrir_atomico(ruta: str, binario: bool = False):
+    """
+    Como escribir_atomico, pero entrega el archivo temporal para escribirlo por partes.
+
+    El destino solo se reemplaza si el bloque termina sin excepciones; así se pueden generar
+    archivos grandes sin tenerlos enteros en memoria.
+    """
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(carpeta, exist_ok=True)
+    descriptor, ruta_temporal = tempfile.mkstemp(prefix=f".{os.path.basename(ruta)}.", suffix=".tmp", dir=carpeta)
+    try:
+        # mkstemp crea el temporal con 0600 y os.replace conserva ese modo: se aplica el que tendría el destino
+        os.chmod(ruta_temporal, _modo_destino(ruta))
+        if binario:
+            archivo = os.fdopen(descriptor, 'wb')
+        else:
+            archivo = os.fdopen(descriptor, 'w', encoding=constantes.CODIFICACION_ARCHIVOS, newline='\n')
+        with archivo:
+            yield archivo
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        _reemplazar(ruta_temporal, ruta)
+    except BaseException:
+        try:
+            os.remove(ruta_temporal)
+        except OSError:
+            pass
+        raise
+
+def _modo_destino(ruta: str) -> int:
+    """Permisos del archivo existente, o los de un archivo nuevo según la umask (0o666 & ~umask)."""
+    try:
+        return os.stat(ruta).st_mode & 0o777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+def _reemplazar(origen: str, destino: str):
+    """os.replace con reintentos: en Windows falla mientras otro proceso tiene abierto el destino."""
+    for intento in range(constantes.REINTENTOS_REEMPLAZO_ARCHIVO):
+        try:
+            os.replace(origen, destino)
+            return
+        except PermissionError:
+            if intento == constantes.REINTENTOS_REEMPLAZO_ARCHIVO - 1:
+                raise
+            time.sleep(0.05 * (intento + 1))
+
+@contextmanager
+def bloqueo(ruta: str):
+    """
+    Bloqueo exclusivo entre procesos (y entre hilos) asociado a un archivo.
+
+    Usa un archivo '<ruta>.lock' junto al protegido, de modo que el bloqueo sobrevive a los
+    reemplazos atómicos del archivo. Se libera solo aunque el proceso termine de golpe.
+    """
+    ruta_bloqueo = ruta + constantes.EXTENSION_ARCHIVO_BLOQUEO
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_bloqueo)), exist_ok=True)
+    with open(ruta_bloqueo, 'a+b') as archivo:
+        if os.name == 'nt':
+            archivo.seek(0)
+            # LK_LOCK reintenta durante ~10 s y lanza OSError; se sigue esperando como haría flock
+            while True:
+                try:
+                    msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    util_debug.registrar_depuracion(f"Esperando al bloqueo de {ruta_bloqueo}...")
+        else:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                archivo.seek(0)
+                msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+# Búsqueda difusa de commits sobre un índice en disco actualizado de forma incremental
+
+import bisect
+import hashlib
+import json
+import os
+import re
+import subprocess
+import time
+from . import constantes, util_archivos, util_config, util_debug, util_git, util_lector_objetos
+
+# Campos de cada línea del índice (separados por tabulador); las rutas van unidas por \x1f
+_CAMPO_HASH, _CAMPO_FECHA, _CAMPO_AUTOR, _CAMPO_ASUNTO, _CAMPO_RUTAS = range(5)
+
+# Índices ya cargados en memoria, por ruta de repositorio
+_indices_cargados = {}
+# Marca de HEAD con la que se actualizó cada índice en esta sesión (evita lanzar git en cada búsqueda)
+_marcas_indexadas = {}
+
+
+def _obtener_rutas_indice(ruta_repo: str) -> tuple[str, str]:
+    """Devuelve (ruta del índice, ruta de sus metadatos) para un repositorio."""
+    directorio_base = os.path.dirname(util_config.obtener_ruta_config())
+    clave = hashlib.sha1(os.path.abspath(ruta_repo).encode(constantes.CODIFICACION_ARCHIVOS)).hexdigest()[:16]
+    carpeta = os.path.join(directorio_base, constantes.NOMBRE_CARPETA_INDICES)
+    return os.path.join(carpeta, f"{clave}.tsv"), os.path.join(carpeta, f"{clave}.json")
+
+def _limpiar_campo(texto: str) -> str:
+    """Evita que un campo rompa el formato de línea del índice."""
+    return texto.replace('\t', ' ').replace('\n', ' ').replace('\x1f', ' ')
+
+def actualizar_indice(ruta_repo: str) -> bool:
+    """
+    Añade al índice los commits nuevos desde el último indexado.
+
+    Si la historia se reescribió (el último commit indexado ya no es ancestro de HEAD)
+    el índice se reconstruye desde cero.
+    """
+    ruta_indice, ruta_meta = _obtener_rutas_indice(ruta_repo)
+    hash_head, _ = util_git.obtener_ultimo_commit_info(ruta_repo)
+    if not hash_head:
+        return False
+
+    # Varios procesos (la CLI, un hook) pueden actualizar el mismo índice: se hace por turnos
+    with util_archivos.bloqueo(ruta_indice):
+        return _actualizar_indice_bloqueado(ruta_repo, ruta_indice, ruta_meta, hash_head)
+
+def _actualizar_indice_bloqueado(ruta_repo: str, ruta_indice: str, ruta_meta: str, hash_head: str) -> bool:
+    meta = {}
+    if os.path.exists(ruta_meta) and os.path.exists(ruta_indice):
+        try:
+            with open(ruta_meta, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+                meta = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            util_debug.registrar_depuracion(f"Metadatos del índice ilegibles, se reconstruye: {e}")
+
+    ultimo_hash = meta.get("ultimo_hash")
+    if ultimo_hash == hash_head:
+        util_debug.registrar_depuracion("Índice de búsqueda al día.")
+        return True
+
+    if ultimo_hash and util_git.es_ancestro(ruta_repo, ultimo_hash, hash_head):
+        # Los commits nuevos se añaden al final: quien lea a la vez solo ve líneas completas
+        rango, ruta_destino, modo, total = f"{ultimo_hash}..{hash_head}", ruta_indice, 'a', meta.get("total", 0)
+        util_debug.registrar_depuracion(f"Actualizando índice de búsqueda desde {ultimo_hash[:7]}.")
+    else:
+        # Reconstrucción en un temporal que sustituye al índice al terminar
+        rango, ruta_destino, modo, total = hash_head, ruta_indice + ".nuevo", 'w', 0
+        print("Construyendo el índice de búsqueda de commits (solo la primera vez, puede tardar)...")
+
+    try:
+        nuevos = 0
+        with open(ruta_destino, modo, encoding=constantes.CODIFICACION_ARCHIVOS, newline='\n') as f:
+            for commit in util_git.iterar_historial(ruta_repo, rango):
+                f.write("\t".join((
+                    commit['hash_completo'],
+                    commit['fecha'],
+                    _limpiar_campo(commit['autor']),
+                    _limpiar_campo(commit['mensaje']),
+                    "\x1f".join(_limpiar_campo(ruta) for ruta in commit['rutas'])
+                )) + "\n")
+                nuevos += 1
+        if ruta_destino != ruta_indice:
+            os.replace(ruta_destino, ruta_indice)
+        meta = {"ultimo_hash": hash_head, "total": total + nuevos, "repositorio": os.path.abspath(ruta_repo)}
+        util_archivos.escribir_atomico(ruta_meta, json.dumps(meta, indent=4))
+        util_debug.registrar_depuracion(f"Índice de búsqueda actualizado: {nuevos} commits nuevos ({total + nuevos} en total).")
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Error al leer el historial para el índice de búsqueda: {e.stderr or e}")
+        util_debug.registrar_depuracion(f"Error en git log al indexar: {e}")
+    except OSError as e:
+        print(f"Error al escribir el índice de búsqueda: {e}")
+        util_debug.registrar_depuracion(f"Error de OS al escribir índice: {e}")
+    # Un índice a medio escribir no es fiable: se fuerza reconstrucción la próxima vez
+    for ruta in (ruta_meta, ruta_indice + ".nuevo"):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+    return False
+
+def _cargar_indice(ruta_repo: str) -> dict | None:
+    """Carga el índice en memoria (o reutiliza el ya cargado si el archivo no ha cambiado)."""
+    ruta_indice, _ = _obtener_rutas_indice(ruta_repo)
+    try:
+        marca = os.stat(ruta_indice).st_mtime_ns
+    except OSError:
+        return None
+
+    cargado = _indices_cargados.get(ruta_repo)
+    if cargado and cargado["marca"] == marca:
+        return cargado
+
+    with open(ruta_indice, 'r', encoding=constantes.CODIFICACION_ARCHIVOS, newline='\n') as f:
+        texto = f.read()
+    texto_min = texto.lower()
+    # Inicio de cada línea en la versión en minúsculas (para pasar de posición a línea con bisect)
+    inicios_min = [0]
+    posicion = texto_min.find("\n")
+    while posicion != -1:
+        inicios_min.append(posicion + 1)
+        posicion = texto_min.find("\n", posicion + 1)
+    inicios_min.pop() # El archivo termina en salto de línea
+
+    lineas = texto.split("\n")[:len(inicios_min)]
+    # Texto solo con los asuntos (uno por línea) para la búsqueda por subsecuencia
+    asuntos_min = "\n".join(linea.split("\t", _CAMPO_RUTAS + 1)[_CAMPO_ASUNTO] if linea.count("\t") >= _CAMPO_ASUNTO else ""
+                            for linea in texto_min.split("\n")[:len(inicios_min)])
+    inicios_asuntos = [0]
+    posicion = asuntos_min.find("\n")
+    while posicion != -1:
+        inicios_asuntos.append(posicion + 1)
+        posicion = asuntos_min.find("\n", posicion + 1)
+
+    cargado = {"marca": marca, "lineas": lineas, "texto_min": texto_min, "inicios_min": inicios_min,
+               "asuntos_min": asuntos_min, "inicios_asuntos": inicios_asuntos}
+    _indices_cargados[ruta_repo] = cargado
+    util_debug.registrar_depuracion(f"Índice de búsqueda cargado en memoria ({len(inicios_min)} commits).")
+    return cargado
+
+def _puntuar(campos: list[str], tokens: list[str]) -> int | None:
+    """Puntúa una línea: cada token debe aparecer en algún campo (el asunto pesa más que las rutas)."""
+    puntos = 0
+    for token in tokens:
+        asunto = campos[_CAMPO_ASUNTO]
+        posicion = asunto.find(token)
+        if posicion != -1:
+            puntos += 4 if posicion == 0 or not asunto[posicion - 1].isalnum() else 3
+        elif campos[_CAMPO_HASH].startswith(token):
+            puntos += 4
+        elif token in campos[_CAMPO_AUTOR]:
+            puntos += 2
+        elif token in campos[_CAMPO_FECHA] or token in campos[_CAMPO_RUTAS]:
+            puntos += 1
+        else:
+            return None
+    return puntos
+
+def _lineas_candidatas(indice: dict, token: str, maximo: int):
+    """Genera las líneas (de la más reciente a la más antigua) que contienen el token."""
+    texto_min, inicios = indice["texto_min"], indice["inicios_min"]
+    fin = len(texto_min)
+    for _ in range(maximo):
+        posicion = texto_min.rfind(token, 0, fin)
+        if posicion == -1:
+            return
+        linea = bisect.bisect_right(inicios, posicion) - 1
+        yield linea
+        fin = inicios[linea] # Saltar el resto de coincidencias de la misma línea
+
+def _buscar_subsecuencia(indice: dict, consulta: str, limite: int) -> list[int]:
+    """Alternativa difusa: letras de la consulta en orden dentro del asunto (p. ej. 'fxlgn' -> 'fix login')."""
+    letras = [re.escape(c) for c in consulta if not c.isspace()]
+    if not letras:
+        return []
+    # 'a[^b\n]*b[^c\n]*c...' salta hasta la primera aparición de cada letra: sin retroceso exponencial
+    patron = re.compile(letras[0] + "".join(f"[^{letra}\\n]*{letra}" for letra in letras[1:]))
+    asuntos, inicios = indice["asuntos_min"], indice["inicios_asuntos"]
+
+    # Se examinan ventanas desde el final (commits recientes) y se para al llegar al límite
+    numeros = []
+    fin = len(asuntos)
+    while fin > 0 and len(numeros) < limite:
+        inicio = inicios[bisect.bisect_right(inicios, max(fin - constantes.TAMANO_VENTANA_BUSQUEDA, 0)) - 1]
+        en_ventana = []
+        for coincidencia in patron.finditer(asuntos, inicio, fin):
+            numero = bisect.bisect_right(inicios, coincidencia.start()) - 1
+            if not en_ventana or en_ventana[-1] != numero:
+                en_ventana.append(numero)
+        numeros.extend(reversed(en_ventana))
+        fin = inicio - 1 if inicio else 0
+    return numeros[:limite]
+
+def _linea_a_commit(linea: str) -> dict:
+    campos = linea.split("\t", _CAMPO_RUTAS)
+    return {
+        'hash': campos[_CAMPO_HASH][:7],
+        'hash_completo': campos[_CAMPO_HASH],
+        'fecha': campos[_CAMPO_FECHA],
+        'autor': campos[_CAMPO_AUTOR],
+        'mensaje': campos[_CAMPO_ASUNTO]
+    }
+
+def buscar_commits(ruta_repo: str, consulta: str, limite: int = 30) -> list[dict] | None:
+    """
+    Busca commits por asunto, autor, hash, fecha o rutas tocadas.
+
+    Actualiza el índice de forma incremental antes de buscar, solo si HEAD se ha movido
+    desde la última actualización de la sesión. Devuelve una lista de diccionarios con el
+    mismo formato que util_git.obtener_lista_commits (más 'autor'), ordenados por relevancia
+    y después por antigüedad (los más recientes primero).
+    """
+    marca = util_lector_objetos.marca_referencias(ruta_repo)
+    if marca is None or _marcas_indexadas.get(ruta_repo) != marca:
+        if not actualizar_indice(ruta_repo):
+            _marcas_indexadas.pop(ruta_repo, None)
+            return None
+        if marca is not None:
+            _marcas_indexadas[ruta_repo] = marca
+    indice = _cargar_indice(ruta_repo)
+    if indice is None:
+        _marcas_indexadas.pop(ruta_repo, None)
+        return None
+
+    inicio_busqueda = time.perf_counter()
+    tokens = consulta.lower().split()
+    if not tokens:
+        return []
+
+    # El token más largo suele ser el más selectivo: acota los candidatos con una búsqueda de subcadena
+    # y se para tras reunir suficientes coincidencias recientes para ordenarlas por relevancia
+    puntuadas = []
+    for numero in _lineas_candidatas(indice, max(tokens, key=len), constantes.MAXIMO_CANDIDATOS_BUSQUEDA):
+        inicio = indice["inicios_min"][numero]
+        campos = indice["texto_min"][inicio:indice["texto_min"].find("\n", inicio)].split("\t", _CAMPO_RUTAS)
+        if len(campos) <= _CAMPO_RUTAS:
+            continue
+        puntos = _puntuar(campos, tokens)
+        if puntos is not None:
+            puntuadas.append((puntos, numero))
+            if len(puntuadas) >= limite * constantes.FACTOR_COINCIDENCIAS_BUSQUEDA:
+                break
+    puntuadas.sort(reverse=True)
+    numeros = [numero for _, numero in puntuadas[:limite]]
+
+    if not numeros:
+        util_debug.registrar_depuracion("Sin coincidencias exactas; probando búsqueda por subsecuencia.")
+        numeros = _buscar_subsecuencia(indice, consulta.lower(), limite)
+
+    resultados = [_linea_a_commit(indice["lineas"][numero]) for numero in numeros]
+    duracion_ms = (time.perf_counter() - inicio_busqueda) * 1000
+    util_debug.registrar_depuracion(f"Búsqueda '{consulta}': {len(resultados)} resultados en {duracion_ms:.1f} ms.")
+    return resultados
@@ -1,10 +1,36 @@
 # -*- coding: utf-8 -*-
 # Utilidades para la gestión de la configuración
 
+import copy
 import json
 import os
 from sumario_commit import constantes
 from sumario_commit import util_debug
+from sumario_commit import util_archivos
+
+# Última configuración cargada/guardada, para consultas rápidas de ajustes
+_config_en_memoria = None
+# Copia de la configuración al leerla/escribirla por última vez: permite saber qué claves cambió esta sesión
+_config_leida = None
+
+def obtener_valores_por_defecto() -> dict:
+    """Devuelve un diccionario nuevo con los valores por defecto de la configuración."""
+    return {
+        constantes.CLAVE_ULTIMA_RUTA: None,
+        constantes.CLAVE_LECTOR_OBJETOS_NATIVO: False,
+        constantes.CLAVE_PREFETCH_ACTIVADO: False,
+        constantes.CLAVE_PREFETCH_CON_IA: False,
+        constantes.CLAVE_NIVELES_MODELO_IA: [dict(nivel) for nivel in constantes.NIVELES_MODELO_IA],
+        constantes.CLAVE_PLAZO_IA_SEGUNDOS: constantes.PLAZO_IA_SEGUNDOS,
+        constantes.CLAVE_COBERTURA_ACTIVADA: False,
+        constantes.CLAVE_PERCENTIL_COBERTURA: constantes.PERCENTIL_COBERTURA,
+        constantes.CLAVE_MINHASH_ACTIVADO: True,
+        constantes.CLAVE_UMBRAL_SIMILITUD_MINHASH: constantes.UMBRAL_SIMILITUD_MINHASH,
+        constantes.CLAVE_REUTILIZAR_CASI_DUPLICADOS: True,
+        constantes.CLAVE_REPOSITORIOS_PERFIL: [],
+        constantes.CLAVE_PROVEEDOR_LOTES: constantes.PROVEEDOR_LOTES,
+        constantes.CLAVE_LLAMADAS_IA_SIMULTANEAS: constantes.LLAMADAS_IA_SIMULTANEAS,
+    }
 
 def obtener_ruta_config() -> str:
     """Devuelve la ruta completa al archivo de configuración."""
@@ -12,11 +38,18 @@ def obtener_ruta_config() -> str:
     directorio_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     return os.path.join(directorio_base, constantes.NOMBRE_ARCHIVO_CONFIG)
 
+def obtener_ruta_carpeta_resumenes() -> str:
+    """Devuelve la ruta de la carpeta donde se guardan los resúmenes generados."""
+    # Subcarpeta 'resumenes_generados' dentro del directorio de la app
+    directorio_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(directorio_base, constantes.NOMBRE_CARPETA_RESUMENES)
+
 def cargar_configuracion() -> dict:
     """Carga la configuración desde el archivo JSON."""
+    global _config_en_memoria, _config_leida
     ruta_archivo = obtener_ruta_config()
     util_debug.registrar_depuracion(f"Intentando cargar configuración desde: {ruta_archivo}")
-    config = {constantes.CLAVE_ULTIMA_RUTA: None} # Valores por defecto
+    config = obtener_valores_por_defecto()
 
     if os.path.exists(ruta_archivo):
         try:
@@ -32,23 +65,65 @@ def cargar_configuracion() -> dict:
             print(f"Error inesperado al leer configuración: {e}")
             util_debug.registrar_depuracion(f"Excepción al leer config: {e}")
     else:
-        util_debug.registrar_depuracion("Archivo de configuración no encontrado. Creando con valores por defecto.")
-        guardar_configuracion(config) # Crea el archivo si no existe
+        # No se crea: config.json solo guarda los ajustes que el usuario cambie
+        util_debug.registrar_depuracion("Archivo de configuración no encontrado. Se usan los valores por defecto.")
 
+    _config_en_memoria = config
+    _config_leida = copy.deepcopy(config)
     return config
 
+def _leer_config_disco() -> dict:
+    """Lee config.json tal como está en disco ({} si no existe o no es legible)."""
+    ruta_archivo = obtener_ruta_config()
+    if not os.path.exists(ruta_archivo):
+        return {}
+    try:
+        with open(ruta_archivo, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        util_debug.registrar_depuracion(f"No se pudo releer la configuración antes de guardar: {e}")
+        return {}
+
 def guardar_configuracion(config: dict):
-    """Guarda la configuración en el archivo JSON."""
+    """
+    Guarda la configuración en el archivo JSON.
+
+    El archivo solo contiene los ajustes que ha fijado el usuario: los que ya estaban en disco
+    (releídos dentro del bloqueo, para no pisar lo que hayan guardado otros procesos) más los
+    que esta sesión ha cambiado. Los demás no se escriben y se toman de constantes al leerlos,
+    de modo que un cambio en los valores por defecto llega también a las instalaciones existentes.
+    """
+    global _config_en_memoria, _config_leida
+    _config_en_memoria = config
     ruta_archivo = obtener_ruta_config()
     util_debug.registrar_depuracion(f"Guardando configuración en: {ruta_archivo}")
     try:
-        with open(ruta_archivo, 'w', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
-            json.dump(config, f, indent=4)
+        # Bloqueo + reemplazo atómico: otro proceso nunca lee un config.json a medio escribir
+        with util_archivos.bloqueo(ruta_archivo):
+            # Se relee dentro del bloqueo para no perder lo que hayan guardado otros procesos
+            base = _config_leida if _config_leida is not None else obtener_valores_por_defecto()
+            cambios = {clave: valor for clave, valor in config.items() if clave not in base or base[clave] != valor}
+            del_usuario = {**_leer_config_disco(), **cambios}
+            for clave in base.keys() - config.keys():
+                del_usuario.pop(clave, None)
+            util_archivos.escribir_atomico(ruta_archivo, json.dumps(del_usuario, indent=4))
+        config.clear()
+        config.update(obtener_valores_por_defecto())
+        config.update(del_usuario)
+        _config_leida = copy.deepcopy(config)
         util_debug.registrar_depuracion("Configuración guardada exitosamente.")
     except Exception as e:
         print(f"Error al guardar la configuración: {e}")
         util_debug.registrar_depuracion(f"Excepción al guardar config: {e}")
 
+def obtener_ajuste(clave: str):
+    """Devuelve el valor de un ajuste, cargando la configuración solo la primera vez."""
+    if _config_en_memoria is None:
+        cargar_configuracion()
+    if clave in _config_en_memoria:
+        return _config_en_memoria[clave]
+    return obtener_valores_por_defecto().get(clave)
+
 def obtener_api_key() -> str | None:
     """Obtiene la API Key de Google desde las variables de entorno."""
     api_key = os.getenv(constantes.VAR_ENTORNO_API_KEY)
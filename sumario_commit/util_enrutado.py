@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Enrutado de modelos de IA según el tamaño del prompt y la latencia observada
+
+import re
+import threading
+import time
+from collections import deque
+from . import constantes, util_config, util_debug
+
+_PATRON_PALABRAS = re.compile(r"\w+")
+_PATRON_SIMBOLOS = re.compile(r"[^\w\s]")
+
+# Latencias recientes (instante de registro, segundos) por nombre de modelo, recogidas durante la ejecución
+_latencias = {}
+_cerrojo_latencias = threading.Lock()
+
+
+def estimar_tokens(texto: str) -> int:
+    """
+    Estima los tokens de un texto localmente, sin llamar a la API.
+
+    Aproximación para código: cada símbolo cuenta como un token y cada palabra
+    como ceil(longitud / 4) tokens, calculado en bloque para no recorrer el texto en Python.
+    """
+    if not texto:
+        return 0
+    palabras = len(_PATRON_PALABRAS.findall(texto))
+    simbolos = len(_PATRON_SIMBOLOS.findall(texto))
+    espacios = len(texto) - len("".join(texto.split()))
+    caracteres_palabra = len(texto) - simbolos - espacios
+    # sum(ceil(L/4)) ≈ (sum(L) + 3 * palabras) / 4
+    return simbolos + (caracteres_palabra + 3 * palabras) // 4
+
+def registrar_latencia(nombre_modelo: str, segundos: float):
+    """Guarda la latencia de una llamada completada al modelo."""
+    with _cerrojo_latencias:
+        if nombre_modelo not in _latencias:
+            _latencias[nombre_modelo] = deque(maxlen=constantes.MUESTRAS_LATENCIA_MAXIMAS)
+        _latencias[nombre_modelo].append((time.monotonic(), segundos))
+    util_debug.registrar_depuracion(f"Latencia de {nombre_modelo}: {segundos:.2f} s")
+
+def obtener_percentil_latencia(nombre_modelo: str, percentil: float) -> float | None:
+    """
+    Devuelve el percentil (0-100) de latencia observado para el modelo, o None sin muestras suficientes.
+
+    Solo cuentan las muestras de los últimos VIGENCIA_LATENCIA_SEGUNDOS: un modelo descartado por
+    lento deja de recibir llamadas, y sin caducidad nunca volvería a probarse.
+    """
+    limite = time.monotonic() - constantes.VIGENCIA_LATENCIA_SEGUNDOS
+    with _cerrojo_latencias:
+        muestras = sorted(segundos for instante, segundos in _latencias.get(nombre_modelo, ()) if instante >= limite)
+    if len(muestras) < constantes.MUESTRAS_LATENCIA_MINIMAS:
+        return None
+    posicion = min(len(muestras) - 1, int(round(percentil / 100 * (len(muestras) - 1))))
+    return muestras[posicion]
+
+def obtener_estadisticas_latencia() -> dict[str, dict]:
+    """Resumen de latencias por modelo: número de muestras, mediana y p95 (en segundos)."""
+    with _cerrojo_latencias:
+        muestras_por_modelo = {modelo: len(muestras) for modelo, muestras in _latencias.items()}
+    estadisticas = {}
+    for modelo, total in muestras_por_modelo.items():
+        estadisticas[modelo] = {
+            "muestras": total,
+            "p50": obtener_percentil_latencia(modelo, 50),
+            "p95": obtener_percentil_latencia(modelo, 95),
+        }
+    return estadisticas
+
+def decidir_modelo(tokens_estimados: int) -> dict:
+    """
+    Elige el modelo para un prompt del tamaño indicado.
+
+    Devuelve un diccionario con 'modelo', 'tokens_estimados' y 'motivo', pensado para
+    guardarse junto al resumen.
+    """
+    niveles = util_config.obtener_ajuste(constantes.CLAVE_NIVELES_MODELO_IA) or constantes.NIVELES_MODELO_IA
+    admiten_tamano = [nivel for nivel in niveles if nivel.get("max_tokens") is None or tokens_estimados <= nivel["max_tokens"]]
+
+    if not admiten_tamano:
+        nivel = niveles[-1]
+        motivo = f"el prompt supera todos los umbrales; se usa el nivel de mayor contexto ({nivel['modelo']})"
+    else:
+        nivel = None
+        descartados = []
+        for candidato in admiten_tamano:
+            mediana = obtener_percentil_latencia(candidato["modelo"], 50)
+            limite = candidato.get("latencia_max_s")
+            if limite is not None and mediana is not None and mediana > limite:
+                descartados.append(f"{candidato['modelo']} lento (mediana {mediana:.1f} s > {limite} s)")
+                continue
+            nivel = candidato
+            break
+        if nivel is None: # Todos lentos: el más barato que admite el tamaño
+            nivel = admiten_tamano[0]
+        limite_tokens = nivel.get("max_tokens")
+        motivo = f"~{tokens_estimados} tokens ≤ {limite_tokens}" if limite_tokens is not None else f"~{tokens_estimados} tokens"
+        if descartados:
+            motivo += "; descartados: " + ", ".join(descartados)
+
+    decision = {"modelo": nivel["modelo"], "tokens_estimados": tokens_estimados, "motivo": motivo}
+    util_debug.registrar_depuracion(f"Enrutado: {decision}")
+    return decision
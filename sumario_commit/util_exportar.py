@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# Exportación de los resúmenes guardados a un único informe Markdown, HTML o CSV, en streaming y sin IA
+
+import csv
+import html
+import json
+import os
+import re
+import time
+from . import constantes, nucleo, util_archivos, util_config, util_debug, util_formato
+
+# resumen_<YYYY-MM-DD>_<hash>.json: la fecha del nombre permite filtrar y ordenar sin abrir el archivo
+_PATRON_DATOS_RESUMEN = re.compile(
+    rf"^{re.escape(constantes.PREFIJO_ARCHIVO_RESUMEN)}(\d{{4}}-\d{{2}}-\d{{2}})_[0-9a-f]+"
+    rf"{re.escape(constantes.EXTENSION_ARCHIVO_DATOS_RESUMEN)}$")
+
+# Caracteres con significado en Markdown que no deben interpretarse en asuntos y autores
+_PATRON_ESPECIALES_MARKDOWN = re.compile(r"([\\`*_\[\]<>#|~])")
+
+_COLUMNAS_CSV = ["fecha", "repositorio", "hash", "autor", "asunto", "tareas", "aprendizajes",
+                 "resumen_tareas", "resumen_aprendizajes", "origen", "modelo"]
+
+
+def obtener_ruta_exportacion(desde: str, hasta: str, formato: str) -> str:
+    """Ruta del archivo exportado para una ventana de fechas y un formato."""
+    nombre = f"{constantes.PREFIJO_ARCHIVO_EXPORTACION}{desde}_{hasta}.{formato}"
+    return os.path.join(util_config.obtener_ruta_carpeta_resumenes(), nombre)
+
+def _iterar_resumenes(desde: str, hasta: str, ruta_repo: str | None, autor: str | None):
+    """
+    Genera, en orden de fecha, los registros de los .json de resumen que cumplen los filtros.
+
+    Solo se guardan en memoria los nombres de los archivos del periodo; cada registro se lee
+    cuando le toca y se descarta después. Los resúmenes antiguos sin .json no se incluyen.
+    """
+    carpeta = util_config.obtener_ruta_carpeta_resumenes()
+    with os.scandir(carpeta) as entradas:
+        nombres = [entrada.name for entrada in entradas
+                   if (coincidencia := _PATRON_DATOS_RESUMEN.match(entrada.name)) and desde <= coincidencia.group(1) <= hasta]
+    nombres.sort() # El nombre empieza por la fecha: ordenar los nombres es ordenar por fecha
+
+    repo_normalizado = os.path.normcase(os.path.abspath(ruta_repo)) if ruta_repo else None
+    autor_buscado = autor.casefold() if autor else None
+    for nombre in nombres:
+        try:
+            with open(os.path.join(carpeta, nombre), 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+                registro = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            util_debug.registrar_depuracion(f"Se omite {nombre} en la exportación: {e}")
+            continue
+        if repo_normalizado and os.path.normcase(registro.get("repositorio") or "") != repo_normalizado:
+            continue
+        if autor_buscado and autor_buscado not in (registro.get("autor") or "").casefold():
+            continue
+        registro["resumen"] = util_formato.validar_resumen(registro.get("resumen"))
+        if registro["resumen"]:
+            yield registro
+
+def _escapar_markdown(texto: str) -> str:
+    """Escapa los caracteres especiales de Markdown para mostrar el texto literalmente."""
+    return _PATRON_ESPECIALES_MARKDOWN.sub(r"\\\1", " ".join(texto.split()))
+
+def _escribir_markdown(archivo, registros, titulo: str, filtros: str) -> int:
+    archivo.write(f"# {titulo}\n\n{filtros}\n")
+    total, dia_actual = 0, None
+    for registro in registros:
+        if registro["fecha"] != dia_actual:
+            dia_actual = registro["fecha"]
+            archivo.write(f"\n## {dia_actual}\n")
+        repositorio = os.path.basename(registro.get("repositorio") or "")
+        archivo.write(f"\n### `{registro['hash'][:7]}` · {_escapar_markdown(registro.get('asunto') or '(sin asunto)')}\n\n"
+                      f"_{_escapar_markdown(repositorio)} · {_escapar_markdown(registro.get('autor') or 'autor desconocido')}_\n\n")
+        archivo.write(util_formato.renderizar_markdown(registro["resumen"]).rstrip("\n")
+                      + nucleo.formatear_metadatos(registro.get("metadatos") or {}))
+        total += 1
+    archivo.write(f"\n---\n_{total} resúmenes exportados._\n")
+    return total
+
+def _lista_html(elementos: list[str], vacio: str) -> str:
+    return "<ul>" + "".join(f"<li>{html.escape(e)}</li>" for e in elementos or [vacio]) + "</ul>\n"
+
+def _escribir_html(archivo, registros, titulo: str, filtros: str) -> int:
+    archivo.write("<!DOCTYPE html>\n<html lang=\"es\">\n<head>\n<meta charset=\"utf-8\">\n"
+                  f"<title>{html.escape(titulo)}</title>\n"
+                  "<style>body{font-family:sans-serif;max-width:60em;margin:auto}"
+                  "article{border-top:1px solid #ccc}.meta{color:#666}</style>\n"
+                  f"</head>\n<body>\n<h1>{html.escape(titulo)}</h1>\n<p>{html.escape(filtros)}</p>\n")
+    total, dia_actual = 0, None
+    for registro in registros:
+        if registro["fecha"] != dia_actual:
+            if dia_actual is not None:
+                archivo.write("</section>\n")
+            dia_actual = registro["fecha"]
+            archivo.write(f"<section>\n<h2>{html.escape(dia_actual)}</h2>\n")
+        resumen = registro["resumen"]
+        metadatos = registro.get("metadatos") or {}
+        archivo.write(f"<article>\n<h3><code>{html.escape(registro['hash'][:7])}</code> · "
+                      f"{html.escape(registro.get('asunto') or '(sin asunto)')}</h3>\n"
+                      f"<p class=\"meta\">{html.escape(os.path.basename(registro.get('repositorio') or ''))} · "
+                      f"{html.escape(registro.get('autor') or 'autor desconocido')}</p>\n"
+                      "<h4>Tareas Realizadas</h4>\n" + _lista_html(resumen["tareas"], "No se identifican tareas claras en el patch.")
+                      + "<h4>Aprendizajes</h4>\n" + _lista_html(resumen["aprendizajes"], util_formato.SIN_APRENDIZAJES)
+                      + f"<h4>Resumen General de Tareas</h4>\n<p>{html.escape(resumen['resumen_tareas'] or '-')}</p>\n"
+                      f"<h4>Resumen General de Aprendizaje</h4>\n<p>{html.escape(resumen['resumen_aprendizajes'] or util_formato.SIN_APRENDIZAJES)}</p>\n"
+                      f"<p class=\"meta\">{html.escape(nucleo.describir_origen(metadatos))}</p>\n"
+                      "</article>\n")
+        total += 1
+    if dia_actual is not None:
+        archivo.write("</section>\n")
+    archivo.write(f"<p>{total} resúmenes exportados.</p>\n</body>\n</html>\n")
+    return total
+
+def _escribir_csv(archivo, registros, titulo: str, filtros: str) -> int:
+    """Una fila por resumen; las listas de tareas y aprendizajes van en una celda, una por línea."""
+    escritor = csv.writer(archivo, lineterminator="\n")
+    escritor.writerow(_COLUMNAS_CSV)
+    total = 0
+    for registro in registros:
+        resumen = registro["resumen"]
+        metadatos = registro.get("metadatos") or {}
+        escritor.writerow([registro["fecha"], registro.get("repositorio"), registro["hash"], registro.get("autor"),
+                           registro.get("asunto"), "\n".join(resumen["tareas"]), "\n".join(resumen["aprendizajes"]),
+                           resumen["resumen_tareas"], resumen["resumen_aprendizajes"],
+                           metadatos.get("origen"), metadatos.get("modelo")])
+        total += 1
+    return total
+
+_ESCRITORES = {"md": _escribir_markdown, "html": _escribir_html, "csv": _escribir_csv}
+
+def exportar_resumenes(formato: str, desde: str, hasta: str, ruta_repo: str | None = None,
+                       autor: str | None = None) -> str | None:
+    """
+    Exporta los resúmenes guardados entre dos fechas a un único archivo, agrupados por día.
+
+    Lee los .json de resumen de uno en uno y escribe cada uno en cuanto lo lee, de modo que la
+    memoria no crece con el histórico; no llama a la IA. Opcionalmente filtra por repositorio
+    y por autor (parte del nombre, sin distinguir mayúsculas). El archivo se reemplaza de forma
+    atómica al terminar. Devuelve su ruta o None si falla.
+    """
+    if formato not in _ESCRITORES:
+        print(f"Error: Formato de exportación no soportado: '{formato}'.")
+        return None
+    carpeta = util_config.obtener_ruta_carpeta_resumenes()
+    if not os.path.isdir(carpeta):
+        print("La carpeta de resúmenes 'resumenes_generados' no existe aún.")
+        return None
+
+    inicio = time.perf_counter()
+    titulo = f"Resúmenes de Commits ({desde} - {hasta})"
+    filtros = f"Repositorio: {ruta_repo or 'todos'} · Autor: {autor or 'todos'}"
+    ruta_exportacion = obtener_ruta_exportacion(desde, hasta, formato)
+    try:
+        with util_archivos.abrir_atomico(ruta_exportacion) as archivo:
+            total = _ESCRITORES[formato](archivo, _iterar_resumenes(desde, hasta, ruta_repo, autor), titulo, filtros)
+    except OSError as e:
+        print(f"Error al exportar los resúmenes: {e}")
+        util_debug.registrar_depuracion(f"Error de OS al exportar resúmenes: {e}")
+        return None
+
+    util_debug.registrar_depuracion(f"Exportación: {total} resúmenes en {time.perf_counter() - inicio:.2f} s.")
+    print(f"{total} resúmenes exportados a: {ruta_exportacion} ({time.perf_counter() - inicio:.1f} s)")
+    return ruta_exportacion
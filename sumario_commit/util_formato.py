@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Formato estructurado de los resúmenes: esquema JSON, validación y renderizado a Markdown
+
+import json
+from . import util_debug
+
+SIN_APRENDIZAJES = "No se infieren aprendizajes directos del patch."
+
+# Esquema que se impone a la respuesta del modelo (response_schema de Gemini)
+ESQUEMA_RESUMEN = {
+    "type": "object",
+    "properties": {
+        "tareas": {"type": "array", "items": {"type": "string"}},
+        "aprendizajes": {"type": "array", "items": {"type": "string"}},
+        "resumen_tareas": {"type": "string"},
+        "resumen_aprendizajes": {"type": "string"},
+    },
+    "required": ["tareas", "aprendizajes", "resumen_tareas", "resumen_aprendizajes"],
+}
+
+
+def crear_resumen(tareas: list[str], resumen_tareas: str, aprendizajes: list[str] | None = None,
+                  resumen_aprendizajes: str = "") -> dict:
+    """Construye un resumen estructurado con los campos del esquema."""
+    return {
+        "tareas": list(tareas),
+        "aprendizajes": list(aprendizajes or []),
+        "resumen_tareas": resumen_tareas,
+        "resumen_aprendizajes": resumen_aprendizajes,
+    }
+
+def validar_resumen(datos) -> dict | None:
+    """Comprueba que los datos cumplen el esquema y devuelve una copia normalizada (o None si no)."""
+    if not isinstance(datos, dict):
+        return None
+    resumen = {}
+    for campo in ("tareas", "aprendizajes"):
+        valor = datos.get(campo, [])
+        if not isinstance(valor, list) or not all(isinstance(elemento, str) for elemento in valor):
+            util_debug.registrar_depuracion(f"Resumen inválido: '{campo}' no es una lista de textos.")
+            return None
+        resumen[campo] = [elemento.strip() for elemento in valor if elemento.strip()]
+    for campo in ("resumen_tareas", "resumen_aprendizajes"):
+        valor = datos.get(campo, "")
+        if not isinstance(valor, str):
+            util_debug.registrar_depuracion(f"Resumen inválido: '{campo}' no es un texto.")
+            return None
+        resumen[campo] = valor.strip()
+    if not resumen["tareas"] and not resumen["resumen_tareas"]:
+        util_debug.registrar_depuracion("Resumen inválido: sin tareas ni resumen de tareas.")
+        return None
+    return resumen
+
+def parsear_resumen_json(texto: str) -> dict | None:
+    """Parsea y valida el JSON devuelto por el modelo."""
+    try:
+        return validar_resumen(json.loads(texto))
+    except (json.JSONDecodeError, TypeError) as e:
+        util_debug.registrar_depuracion(f"Respuesta JSON no parseable: {e}")
+        return None
+
+def renderizar_markdown(datos: dict) -> str:
+    """Genera localmente el Markdown de siempre a partir de los campos estructurados."""
+    lineas = ["**Tareas Realizadas:**"]
+    lineas += [f"- {tarea}" for tarea in datos["tareas"]] or ["- No se identifican tareas claras en el patch."]
+    lineas += ["", "**Aprendizajes:**"]
+    lineas += [f"- {aprendizaje}" for aprendizaje in datos["aprendizajes"]] or [f"- {SIN_APRENDIZAJES}"]
+    lineas += ["", "**Resumen General de Tareas:**", datos["resumen_tareas"] or "-"]
+    lineas += ["", "**Resumen General de Aprendizaje:**", datos["resumen_aprendizajes"] or SIN_APRENDIZAJES]
+    return "\n".join(lineas) + "\n"
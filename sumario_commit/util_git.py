@@ -1,9 +1,43 @@
 # -*- coding: utf-8 -*-
 # Utilidades para interactuar con el repositorio Git
 
+import difflib
+import re
 import subprocess
 import os
 from . import util_debug # Usar imports relativos
+from . import constantes, util_config, util_lector_objetos
+
+def _obtener_lector_nativo(ruta_repo: str) -> util_lector_objetos.LectorObjetos | None:
+    """Devuelve el lector nativo de objetos si está activado en la configuración y es utilizable."""
+    if not util_config.obtener_ajuste(constantes.CLAVE_LECTOR_OBJETOS_NATIVO):
+        return None
+    return util_lector_objetos.obtener_lector(ruta_repo)
+
+def _startupinfo():
+    """En Windows, evita que cada proceso git abra una ventana de consola."""
+    if os.name != 'nt':
+        return None
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    startupinfo.wShowWindow = subprocess.SW_HIDE
+    return startupinfo
+
+def _correr_git(ruta_repo: str, argumentos: list[str], entrada: str | None = None,
+                comprobar: bool = True) -> subprocess.CompletedProcess:
+    """Ejecuta un comando git en el repositorio; con comprobar=True lanza CalledProcessError si falla."""
+    comando = ["git", "-C", ruta_repo] + argumentos
+    util_debug.registrar_depuracion(f"Ejecutando: {' '.join(comando)}")
+    return subprocess.run(comando, input=entrada, capture_output=True, text=True, check=comprobar,
+                          encoding='utf-8', errors='replace', startupinfo=_startupinfo())
+
+def _ejecutar_git(ruta_repo: str, argumentos: list[str], entrada: str | None = None) -> str:
+    """Ejecuta un comando git en el repositorio y devuelve su salida (lanza CalledProcessError si falla)."""
+    return _correr_git(ruta_repo, argumentos, entrada).stdout
+
+def _codigo_salida_git(ruta_repo: str, argumentos: list[str]) -> int:
+    """Ejecuta un comando git y devuelve su código de salida sin tratarlo como error."""
+    return _correr_git(ruta_repo, argumentos, comprobar=False).returncode
 
 def es_repositorio_git(ruta_carpeta: str) -> bool:
     """Verifica si una ruta corresponde a un repositorio Git válido."""
@@ -31,8 +65,22 @@ def es_repositorio_git(ruta_carpeta: str) -> bool:
         util_debug.registrar_depuracion(f"Excepción inesperada verificando repo: {e}")
         return False
 
-def obtener_ultimo_commit_info(ruta_repo: str) -> tuple[str | None, str | None]:
-    """Obtiene el hash COMPLETO y la fecha (YYYY-MM-DD) del último commit."""
+def obtener_ultimo_commit_info(ruta_repo: str, silencioso: bool = False) -> tuple[str | None, str | None]:
+    """
+    Obtiene el hash COMPLETO y la fecha (YYYY-MM-DD) del último commit.
+
+    Con silencioso=True los errores solo van al log de depuración (para hilos en segundo plano).
+    """
+    lector = _obtener_lector_nativo(ruta_repo)
+    if lector is not None:
+        try:
+            with lector.en_uso():
+                commit = lector.leer_commit(lector.resolver_ref("HEAD"))
+            util_debug.registrar_depuracion(f"Último commit (lector nativo): Hash={commit['hash']}, Fecha={commit['fecha']}")
+            return commit['hash'], commit['fecha']
+        except (util_lector_objetos.ObjetoNoSoportado, OSError, ValueError) as e:
+            util_debug.registrar_depuracion(f"Lector nativo falló, se usa git: {e}")
+
     # No necesita verificar si es repo, se asume que quien llama lo hizo
     comando_hash = ["git", "-C", ruta_repo, "rev-parse", "HEAD"]
     # Obtener fecha del autor para consistencia
@@ -54,11 +102,13 @@ def obtener_ultimo_commit_info(ruta_repo: str) -> tuple[str | None, str | None]:
         util_debug.registrar_depuracion(f"Último commit: Hash={hash_commit}, Fecha={fecha_commit}")
         return hash_commit, fecha_commit
     except subprocess.CalledProcessError as e:
-        print(f"Error al obtener información del último commit: {e.stderr or e}")
+        if not silencioso:
+            print(f"Error al obtener información del último commit: {e.stderr or e}")
         util_debug.registrar_depuracion(f"Error en subprocess al obtener commit info: {e}")
         return None, None
     except FileNotFoundError:
-         print("Error: Comando 'git' no encontrado. Asegúrate de que Git esté instalado y en el PATH.")
+         if not silencioso:
+             print("Error: Comando 'git' no encontrado. Asegúrate de que Git esté instalado y en el PATH.")
          util_debug.registrar_depuracion("Comando git no encontrado.")
          return None, None
     except Exception as e:
@@ -68,6 +118,24 @@ def obtener_ultimo_commit_info(ruta_repo: str) -> tuple[str | None, str | None]:
 # --- Nueva Función ---
 def obtener_lista_commits(ruta_repo: str, limite: int = 30) -> list[dict] | None:
     """Obtiene una lista de los últimos N commits con hash, fecha y mensaje."""
+    lector = _obtener_lector_nativo(ruta_repo)
+    if lector is not None:
+        try:
+            commits = []
+            with lector.en_uso():
+                for hash_completo in lector.recorrer_historial(lector.resolver_ref("HEAD"), limite):
+                    commit = lector.leer_commit(hash_completo)
+                    commits.append({
+                        'hash': hash_completo[:7],
+                        'hash_completo': hash_completo,
+                        'fecha': commit['fecha'],
+                        'mensaje': commit['asunto']
+                    })
+            util_debug.registrar_depuracion(f"Obtenidos {len(commits)} commits (lector nativo).")
+            return commits
+        except (util_lector_objetos.ObjetoNoSoportado, OSError, ValueError) as e:
+            util_debug.registrar_depuracion(f"Lector nativo falló, se usa git: {e}")
+
     # Formato: hash_corto | hash_completo | fecha_autor (YYYY-MM-DD) | mensaje (asunto)
     formato = "%h|%H|%ad|%s"
     comando = [
@@ -179,6 +247,309 @@ def _generar_diff_show(ruta_repo: str, hash_commit: str) -> str | None:
         util_debug.registrar_depuracion(f"Fallo de 'git show' para {hash_commit}: {e}")
         return None
 
+def obtener_patch_id(ruta_repo: str, patch: str) -> str | None:
+    """Calcula el 'git patch-id --stable' de un patch (igual para cambios equivalentes tras rebase/cherry-pick)."""
+    try:
+        # Salida: "<patch-id> <hash-commit>" (vacía si el patch no tiene cambios)
+        partes = _ejecutar_git(ruta_repo, ["patch-id", "--stable"], entrada=patch).split()
+        if not partes:
+            util_debug.registrar_depuracion("El patch no produjo patch-id (sin cambios).")
+            return None
+        util_debug.registrar_depuracion(f"Patch-id calculado: {partes[0]}")
+        return partes[0]
+    except Exception as e:
+        util_debug.registrar_depuracion(f"Excepción calculando patch-id: {e}")
+        return None
+
+def es_ancestro(ruta_repo: str, hash_ancestro: str, hash_descendiente: str) -> bool:
+    """Indica si hash_ancestro es ancestro de (o igual a) hash_descendiente."""
+    try:
+        # Código de salida 0 = es ancestro, 1 = no lo es, otro = error (p. ej. hash inexistente)
+        return _codigo_salida_git(ruta_repo, ["merge-base", "--is-ancestor", hash_ancestro, hash_descendiente]) == 0
+    except Exception as e:
+        util_debug.registrar_depuracion(f"Excepción comprobando ancestro: {e}")
+        return False
+
+def iterar_historial(ruta_repo: str, rango: str):
+    """
+    Recorre el historial del rango indicado (del más antiguo al más reciente) sin cargarlo entero en memoria.
+
+    Genera diccionarios con 'hash_completo', 'fecha', 'autor', 'mensaje' y 'rutas' (archivos tocados).
+    'rango' es '<hash>' o '<hash>..<hash>'. Con el lector nativo los commits y sus rutas se leen
+    de .git/objects; si no se puede, se usa 'git log'. Lanza subprocess.CalledProcessError si git
+    termina con error.
+    """
+    lector = _obtener_lector_nativo(ruta_repo)
+    if lector is not None:
+        with lector.en_uso():
+            hashes = _hashes_rango_nativo(lector, rango)
+            if hashes is not None:
+                for hash_commit in hashes:
+                    yield _commit_historial_nativo(ruta_repo, lector, hash_commit)
+                return
+    yield from _iterar_historial_git(ruta_repo, rango)
+
+def _hashes_rango_nativo(lector: util_lector_objetos.LectorObjetos, rango: str) -> list[str] | None:
+    """Hashes del rango, del más antiguo al más reciente, o None si el lector nativo no puede resolverlo."""
+    excluido, _, incluido = rango.rpartition("..")
+    try:
+        if excluido:
+            hashes = list(lector.recorrer_rango(lector.resolver_ref(incluido), lector.resolver_ref(excluido)))
+        else:
+            hashes = list(lector.recorrer_historial(lector.resolver_ref(incluido)))
+        hashes.reverse()
+        util_debug.registrar_depuracion(f"{len(hashes)} commits en {rango} (lector nativo).")
+        return hashes
+    except (util_lector_objetos.ObjetoNoSoportado, OSError, ValueError) as e:
+        util_debug.registrar_depuracion(f"Lector nativo falló, se usa git: {e}")
+        return None
+
+def _commit_historial_nativo(ruta_repo: str, lector: util_lector_objetos.LectorObjetos, hash_commit: str) -> dict:
+    """Datos de un commit para el índice de búsqueda; si el lector nativo falla, se piden a git solo para él."""
+    try:
+        commit = lector.leer_commit(hash_commit)
+        # Como 'git log --name-only': los merges no listan archivos
+        rutas = [] if len(commit['padres']) > 1 else [ruta for _, ruta, _, _ in lector.cambios_commit(hash_commit)]
+        return {'hash_completo': hash_commit, 'fecha': commit['fecha'], 'autor': commit['autor'],
+                'mensaje': commit['asunto'], 'rutas': rutas}
+    except (util_lector_objetos.ObjetoNoSoportado, OSError, ValueError) as e:
+        util_debug.registrar_depuracion(f"Lector nativo falló con {hash_commit[:7]}, se usa git: {e}")
+        return list(_iterar_historial_git(ruta_repo, hash_commit, ["--no-walk"]))[0]
+
+def _iterar_historial_git(ruta_repo: str, rango: str, opciones: list[str] | None = None):
+    """iterar_historial con 'git log' (opciones extra, p. ej. '--no-walk', antes del rango)."""
+    # \x1e separa commits y \x1f separa campos; las rutas llegan una por línea tras la cabecera
+    comando = [
+        "git", "-C", ruta_repo, "-c", "core.quotePath=false", "log", "--reverse",
+        "--pretty=format:%x1e%H%x1f%ad%x1f%an%x1f%s",
+        "--date=format:%Y-%m-%d", "--name-only", *(opciones or []), rango
+    ]
+    util_debug.registrar_depuracion(f"Ejecutando: {' '.join(comando)}")
+    proceso = subprocess.Popen(comando, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               encoding='utf-8', errors='replace', startupinfo=_startupinfo())
+    commit = None
+    for linea in proceso.stdout:
+        linea = linea.rstrip('\n')
+        if linea.startswith('\x1e'):
+            if commit:
+                yield commit
+            partes = linea[1:].split('\x1f', 3)
+            if len(partes) != 4:
+                util_debug.registrar_depuracion(f"Línea de log mal formada omitida: {linea}")
+                commit = None
+                continue
+            commit = {'hash_completo': partes[0], 'fecha': partes[1], 'autor': partes[2], 'mensaje': partes[3], 'rutas': []}
+        elif linea and commit:
+            commit['rutas'].append(linea)
+    if commit:
+        yield commit
+
+    error = proceso.stderr.read()
+    if proceso.wait() != 0:
+        raise subprocess.CalledProcessError(proceso.returncode, comando, stderr=error)
+
+def _parsear_numstat_z(salida: str) -> list[dict]:
+    """Parsea 'diff-tree --numstat -z': 'A\\tB\\truta\\0' o, en renombrados, 'A\\tB\\t\\0origen\\0destino\\0'."""
+    campos = salida.split('\0')
+    archivos = []
+    i = 0
+    while i < len(campos):
+        partes = campos[i].split('\t')
+        i += 1
+        if len(partes) != 3:
+            continue
+        anadidas, borradas, ruta = partes
+        ruta_anterior = None
+        if not ruta: # Renombrado/copia: las rutas vienen en los dos campos siguientes
+            ruta_anterior, ruta = campos[i], campos[i + 1]
+            i += 2
+        binario = anadidas == '-'
+        archivos.append({
+            'ruta': ruta,
+            'ruta_anterior': ruta_anterior,
+            'anadidas': 0 if binario else int(anadidas),
+            'borradas': 0 if binario else int(borradas),
+            'binario': binario
+        })
+    return archivos
+
+_PATRON_LINEAS = re.compile(rb"[^\n]*\n|[^\n]+") # Líneas con su salto (la última puede no tenerlo, como en git)
+
+def _lineas_sin_espacios(lineas: list[bytes]) -> list[bytes]:
+    """Líneas sin ningún espacio y sin las vacías: iguales si el cambio es de -w --ignore-blank-lines."""
+    return [normalizada for normalizada in (b"".join(linea.split()) for linea in lineas) if normalizada]
+
+def _contar_cambios_lineas(lineas_viejas: list[bytes], lineas_nuevas: list[bytes]) -> tuple[int, int]:
+    """(añadidas, borradas) entre dos versiones, descartando antes el principio y el final comunes."""
+    inicio = 0
+    while inicio < min(len(lineas_viejas), len(lineas_nuevas)) and lineas_viejas[inicio] == lineas_nuevas[inicio]:
+        inicio += 1
+    fin = 0
+    while fin < min(len(lineas_viejas), len(lineas_nuevas)) - inicio and lineas_viejas[-1 - fin] == lineas_nuevas[-1 - fin]:
+        fin += 1
+    viejas = lineas_viejas[inicio:len(lineas_viejas) - fin]
+    nuevas = lineas_nuevas[inicio:len(lineas_nuevas) - fin]
+    if not viejas or not nuevas:
+        return len(nuevas), len(viejas)
+    if len(viejas) + len(nuevas) > constantes.LINEAS_MAXIMAS_DIFF_NATIVO:
+        raise util_lector_objetos.ObjetoNoSoportado("Diff demasiado grande para calcularlo sin git.")
+    anadidas = borradas = 0
+    for operacion, i1, i2, j1, j2 in difflib.SequenceMatcher(None, viejas, nuevas, autojunk=False).get_opcodes():
+        if operacion != "equal":
+            borradas += i2 - i1
+            anadidas += j2 - j1
+    return anadidas, borradas
+
+def _numstat_nativo(lector: util_lector_objetos.LectorObjetos, cambios: list) -> tuple[list[dict], int]:
+    """
+    Equivalente a las dos pasadas de 'diff-tree --numstat --find-renames' (con y sin -w) de un commit.
+
+    Solo se detectan los renombrados exactos (mismo contenido); uno con cambios aparece como
+    borrado + alta. Los recuentos de líneas pueden diferir ligeramente de los de git.
+    """
+    borrados = {}
+    for estado, ruta, hash_viejo, _ in cambios:
+        if estado == "D":
+            borrados.setdefault(hash_viejo, []).append(ruta)
+    renombrados = {}
+    for estado, ruta, _, hash_nuevo in cambios:
+        if estado == "A" and borrados.get(hash_nuevo):
+            renombrados[ruta] = borrados[hash_nuevo].pop(0)
+    origenes = set(renombrados.values())
+
+    archivos = []
+    archivos_sin_espacios = 0
+    for estado, ruta, hash_viejo, hash_nuevo in cambios:
+        if estado == "D" and ruta in origenes:
+            continue
+        if ruta in renombrados:
+            archivos.append({'ruta': ruta, 'ruta_anterior': renombrados[ruta], 'anadidas': 0, 'borradas': 0, 'binario': False})
+            archivos_sin_espacios += 1
+            continue
+        viejo = lector.leer_blob(hash_viejo) if hash_viejo else b""
+        nuevo = lector.leer_blob(hash_nuevo) if hash_nuevo else b""
+        binario = b"\0" in viejo[:8000] or b"\0" in nuevo[:8000] # Mismo criterio que git
+        anadidas = borradas = 0
+        solo_espacios = False
+        if not binario:
+            lineas_viejas, lineas_nuevas = _PATRON_LINEAS.findall(viejo), _PATRON_LINEAS.findall(nuevo)
+            anadidas, borradas = _contar_cambios_lineas(lineas_viejas, lineas_nuevas)
+            # Con -w solo desaparecen los archivos modificados cuyo cambio es únicamente de espacios
+            solo_espacios = estado == "M" and viejo != nuevo and \
+                _lineas_sin_espacios(lineas_viejas) == _lineas_sin_espacios(lineas_nuevas)
+        archivos.append({'ruta': ruta, 'ruta_anterior': None, 'anadidas': anadidas, 'borradas': borradas, 'binario': binario})
+        archivos_sin_espacios += not solo_espacios
+    return archivos, archivos_sin_espacios
+
+def _estadisticas_nativas(lector: util_lector_objetos.LectorObjetos, hash_commit: str) -> dict:
+    """obtener_estadisticas_commit leyendo el commit y sus árboles de .git/objects."""
+    sha = lector.resolver_ref(hash_commit)
+    commit = lector.leer_commit(sha)
+    # Como %b: el mensaje tras el primer párrafo, con los saltos normalizados igual que la salida de git en modo texto
+    partes = commit['mensaje'].replace("\r\n", "\n").strip().split("\n\n", 1)
+    archivos, archivos_sin_espacios = [], 0
+    if len(commit['padres']) <= 1:
+        archivos, archivos_sin_espacios = _numstat_nativo(lector, lector.cambios_commit(sha))
+    return {'padres': commit['padres'], 'autor': commit['autor'], 'asunto': commit['asunto'],
+            'cuerpo': partes[1].strip() if len(partes) > 1 else "",
+            'archivos': archivos, 'archivos_sin_espacios': archivos_sin_espacios}
+
+def obtener_estadisticas_commit(ruta_repo: str, hash_commit: str) -> dict | None:
+    """
+    Obtiene datos baratos de un commit para clasificarlo sin mirar el patch completo.
+
+    Devuelve 'padres', 'autor', 'asunto', 'cuerpo', 'archivos' (numstat con detección de renombrados)
+    y 'archivos_sin_espacios' (cuántos archivos cambian algo más que espacios o líneas en blanco).
+    Con el lector nativo se calcula sin lanzar git; si no se puede, se usa diff-tree.
+    """
+    lector = _obtener_lector_nativo(ruta_repo)
+    if lector is not None:
+        try:
+            with lector.en_uso():
+                datos = _estadisticas_nativas(lector, hash_commit)
+            util_debug.registrar_depuracion(f"Estadísticas de {hash_commit[:7]} (lector nativo): "
+                                            f"{len(datos['padres'])} padres, {len(datos['archivos'])} archivos.")
+            return datos
+        except (util_lector_objetos.ObjetoNoSoportado, OSError, ValueError) as e:
+            util_debug.registrar_depuracion(f"Lector nativo falló, se usa git: {e}")
+
+    try:
+        # Sin strip(): Python trata \x1f como espacio y, en un commit raíz (%P vacío), se comería
+        # el primer separador y desplazaría todos los campos
+        cabecera = _ejecutar_git(ruta_repo, ["show", "-s", "--format=%P%x1f%an%x1f%s%x1f%b", hash_commit])
+        padres, autor, asunto, cuerpo = (cabecera.split('\x1f', 3) + ["", "", ""])[:4]
+        padres = padres.split()
+        cuerpo = cuerpo.strip()
+
+        archivos = []
+        archivos_sin_espacios = 0
+        if len(padres) <= 1: # En merges diff-tree no muestra nada sin -m/--cc
+            archivos = _parsear_numstat_z(_ejecutar_git(ruta_repo, [
+                "diff-tree", "-r", "--root", "--no-commit-id", "--numstat", "--find-renames", "-z", hash_commit]))
+            # Con -w los archivos cuyo único cambio es de espacios desaparecen de la salida
+            archivos_sin_espacios = len(_parsear_numstat_z(_ejecutar_git(ruta_repo, [
+                "diff-tree", "-r", "--root", "--no-commit-id", "--numstat", "--find-renames", "-z",
+                "-w", "--ignore-blank-lines", hash_commit])))
+
+        util_debug.registrar_depuracion(f"Estadísticas de {hash_commit[:7]}: {len(padres)} padres, {len(archivos)} archivos.")
+        return {'padres': padres, 'autor': autor, 'asunto': asunto, 'cuerpo': cuerpo,
+                'archivos': archivos, 'archivos_sin_espacios': archivos_sin_espacios}
+    except subprocess.CalledProcessError as e:
+        print(f"Error al obtener las estadísticas del commit {hash_commit[:7]}: {e.stderr or e}")
+        util_debug.registrar_depuracion(f"Error en subprocess al obtener estadísticas: {e}")
+        return None
+    except FileNotFoundError:
+         print("Error: Comando 'git' no encontrado.")
+         util_debug.registrar_depuracion("Comando git no encontrado al obtener estadísticas.")
+         return None
+    except Exception as e:
+        util_debug.registrar_depuracion(f"Excepción inesperada obteniendo estadísticas: {e}")
+        return None
+
+def obtener_commits_rango_fechas(ruta_repo: str, desde: str, hasta: str, email_autor: str | None = None) -> list[dict] | None:
+    """
+    Lista los commits de todas las ramas locales entre dos fechas (YYYY-MM-DD, ambas incluidas).
+
+    Las fechas se refieren a la fecha de autor (%ad), la misma que se muestra y con la que se
+    nombran los resúmenes. Si se indica 'email_autor', solo devuelve los de ese autor. Cada
+    commit es un diccionario con 'hash', 'hash_completo', 'fecha' y 'mensaje', ordenados por fecha.
+    """
+    # --since/--until filtran por fecha de commit, no de autor: --since solo sirve para no recorrer
+    # el histórico antiguo (un commit es siempre posterior a su autoría) y el rango se aplica después
+    argumentos = [
+        "log", "--branches", "--reverse", "--pretty=format:%h%x1f%H%x1f%ad%x1f%s", "--date=format:%Y-%m-%d",
+        f"--since={desde} 00:00:00",
+    ]
+    if email_autor:
+        argumentos.append(f"--author=<{email_autor}>")
+    try:
+        commits = []
+        for linea in _ejecutar_git(ruta_repo, argumentos).splitlines():
+            partes = linea.split('\x1f', 3)
+            if len(partes) == 4:
+                if desde <= partes[2] <= hasta:
+                    commits.append({'hash': partes[0], 'hash_completo': partes[1], 'fecha': partes[2], 'mensaje': partes[3]})
+            elif linea:
+                util_debug.registrar_depuracion(f"Línea de log mal formada omitida: {linea}")
+        commits.sort(key=lambda commit: commit['fecha']) # Estable: dentro de un día se mantiene el orden de git
+        util_debug.registrar_depuracion(f"{len(commits)} commits entre {desde} y {hasta} en {ruta_repo}.")
+        return commits
+    except subprocess.CalledProcessError as e:
+        print(f"Error al obtener los commits de '{ruta_repo}': {e.stderr or e}")
+        util_debug.registrar_depuracion(f"Error en subprocess al obtener commits por fechas: {e}")
+        return None
+    except FileNotFoundError:
+         print("Error: Comando 'git' no encontrado.")
+         util_debug.registrar_depuracion("Comando git no encontrado al obtener commits por fechas.")
+         return None
+
+def obtener_email_usuario(ruta_repo: str) -> str | None:
+    """Devuelve el 'user.email' que git usa en ese repositorio (local o global), o None si no hay."""
+    try:
+        return _ejecutar_git(ruta_repo, ["config", "user.email"]).strip() or None
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
 # --- Nueva función auxiliar para obtener hash corto ---
 def obtener_hash_corto(ruta_repo: str, ref: str = "HEAD") -> str:
     """Obtiene el hash corto de una referencia (por defecto, HEAD)."""
@@ -1,12 +1,28 @@
 # -*- coding: utf-8 -*-
 # Utilidades para interactuar con el modelo de lenguaje (IA - Gemini)
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import google.generativeai as genai
 from sumario_commit import util_config
 from sumario_commit import constantes
 from sumario_commit import util_debug
+from sumario_commit import util_enrutado
+from sumario_commit import util_formato
 
 # Variable global para el modelo inicializado
 modelo_ia = None
+# Modelos adicionales del enrutado, creados bajo demanda por nombre
+_modelos_por_nombre = {}
+
+# Hilos para las llamadas al modelo: permiten aplicar plazos y lanzar peticiones de cobertura
+_ejecutor_ia = ThreadPoolExecutor(max_workers=constantes.HILOS_MAXIMOS_IA, thread_name_prefix="ia")
+# Contadores de plazos y coberturas (peticiones duplicadas) de la sesión
+_estadisticas_llamadas = {"llamadas": 0, "coberturas_lanzadas": 0, "coberturas_ganadas": 0, "plazos_agotados": 0}
+_cerrojo_estadisticas = threading.Lock()
+# Limitador compartido de peticiones en vuelo (resúmenes sueltos, prefetch, coberturas e informes)
+_limitador_llamadas = None
+_cerrojo_limitador = threading.Lock()
 
 def configurar_ia() -> bool:
     """Configura el cliente de la API de Google AI."""
@@ -20,6 +36,8 @@ def configurar_ia() -> bool:
         genai.configure(api_key=api_key)
         # Crear el modelo una vez
         modelo_ia = genai.GenerativeModel(constantes.NOMBRE_MODELO_IA)
+        _modelos_por_nombre.clear()
+        _modelos_por_nombre[constantes.NOMBRE_MODELO_IA] = modelo_ia
         util_debug.registrar_depuracion(f"Modelo IA '{constantes.NOMBRE_MODELO_IA}' listo.")
         return True
     except Exception as e:
@@ -28,33 +46,107 @@ def configurar_ia() -> bool:
         modelo_ia = None
         return False
 
+def obtener_modelo(nombre_modelo: str):
+    """Devuelve el modelo con ese nombre, creándolo la primera vez (requiere configurar_ia previo)."""
+    if nombre_modelo not in _modelos_por_nombre:
+        util_debug.registrar_depuracion(f"Creando modelo IA '{nombre_modelo}' para el enrutado.")
+        _modelos_por_nombre[nombre_modelo] = genai.GenerativeModel(nombre_modelo)
+    return _modelos_por_nombre[nombre_modelo]
+
+def _contar(clave: str):
+    with _cerrojo_estadisticas:
+        _estadisticas_llamadas[clave] += 1
+
+def obtener_estadisticas_llamadas() -> dict:
+    """Devuelve una copia de los contadores de llamadas, coberturas y plazos agotados."""
+    with _cerrojo_estadisticas:
+        return dict(_estadisticas_llamadas)
+
+def _obtener_limitador() -> threading.BoundedSemaphore:
+    """Crea (la primera vez) el semáforo que limita las peticiones simultáneas al modelo."""
+    global _limitador_llamadas
+    with _cerrojo_limitador:
+        if _limitador_llamadas is None:
+            maximo = util_config.obtener_ajuste(constantes.CLAVE_LLAMADAS_IA_SIMULTANEAS) or constantes.LLAMADAS_IA_SIMULTANEAS
+            _limitador_llamadas = threading.BoundedSemaphore(max(1, int(maximo)))
+            util_debug.registrar_depuracion(f"Limitador de llamadas a la IA: {maximo} simultáneas.")
+        return _limitador_llamadas
+
+def _llamar_modelo(nombre_modelo: str, prompt: str, generation_config, plazo: float | None):
+    """Una petición al modelo; registra su latencia para el enrutado y la cobertura."""
+    opciones = {"timeout": plazo} if plazo else None
+    with _obtener_limitador(): # La espera por un hueco cuenta para el plazo de quien llama
+        inicio = time.perf_counter()
+        respuesta = obtener_modelo(nombre_modelo).generate_content(prompt, generation_config=generation_config, request_options=opciones)
+    util_enrutado.registrar_latencia(nombre_modelo, time.perf_counter() - inicio)
+    return respuesta
+
+def _generar_con_plazo(nombre_modelo: str, prompt: str, generation_config):
+    """
+    Llama al modelo respetando el plazo configurado y, si está activada, con cobertura.
+
+    Si la petición tarda más que el percentil de latencia observado, se lanza una duplicada
+    y se usa la primera respuesta válida. Lanza TimeoutError si se agota el plazo.
+    """
+    plazo = util_config.obtener_ajuste(constantes.CLAVE_PLAZO_IA_SEGUNDOS) or None
+    limite = time.monotonic() + plazo if plazo else None
+    _contar("llamadas")
+
+    principal = _ejecutor_ia.submit(_llamar_modelo, nombre_modelo, prompt, generation_config, plazo)
+    en_curso = {principal}
+    cobertura = None
+
+    retraso = None
+    if util_config.obtener_ajuste(constantes.CLAVE_COBERTURA_ACTIVADA):
+        percentil = util_config.obtener_ajuste(constantes.CLAVE_PERCENTIL_COBERTURA)
+        retraso = util_enrutado.obtener_percentil_latencia(nombre_modelo, percentil)
+    if retraso is not None and (limite is None or time.monotonic() + retraso < limite):
+        terminadas, _ = wait(en_curso, timeout=retraso)
+        if not terminadas:
+            util_debug.registrar_depuracion(f"La petición supera el p{percentil} ({retraso:.1f} s): lanzando cobertura.")
+            cobertura = _ejecutor_ia.submit(_llamar_modelo, nombre_modelo, prompt, generation_config, plazo)
+            en_curso.add(cobertura)
+            _contar("coberturas_lanzadas")
+
+    ultimo_error = None
+    while en_curso:
+        restante = None if limite is None else limite - time.monotonic()
+        if restante is not None and restante <= 0:
+            break
+        terminadas, en_curso = wait(en_curso, timeout=restante, return_when=FIRST_COMPLETED)
+        for futura in terminadas:
+            try:
+                respuesta = futura.result()
+            except Exception as e:
+                ultimo_error = e # Si la otra petición sigue en curso, aún puede responder
+                continue
+            if futura is cobertura:
+                _contar("coberturas_ganadas")
+                util_debug.registrar_depuracion("La petición de cobertura respondió primero.")
+            for pendiente in en_curso:
+                pendiente.cancel() # La que siga en vuelo termina sola; su respuesta se descarta
+            return respuesta
+
+    if not en_curso and ultimo_error is not None:
+        raise ultimo_error
+    _contar("plazos_agotados")
+    raise TimeoutError(f"la IA no respondió en {plazo} s")
+
 def construir_prompt(diff_content: str) -> str:
     """Construye el prompt completo para enviar a la IA."""
     prompt_sistema = f"""
 Eres un asistente experto en análisis de código y commits de Git. Tu tarea es analizar el siguiente patch de Git (diff) y extraer *exclusivamente* dos puntos clave: las tareas concretas que se realizaron y cualquier aprendizaje, descubrimiento o dificultad encontrada durante la implementación de esos cambios.
 
-Basándote *únicamente* en el contenido del patch proporcionado, responde de forma concisa y estructurada en castellano y en primera persona. No añadas introducciones, conclusiones ni ningún otro texto fuera de la estructura solicitada.
-
-Formato estricto de la respuesta:
+Basándote *únicamente* en el contenido del patch proporcionado, responde de forma concisa en castellano y en primera persona, como el usuario que hizo el commit, directo y al grano.
 
-**Tareas Realizadas:**
-- [Descripción breve de la tarea 1 basada en el diff]
-- [Descripción breve de la tarea 2 basada en el diff]
-- ...
+Responde exclusivamente con un objeto JSON con estos campos:
 
-**Aprendizajes:**
-- [Descripción breve del aprendizaje 1, si se infiere del diff o comentarios]
-- [Descripción breve de la dificultad o descubrimiento 2, si se infiere]
-- ...
+- "tareas": lista de descripciones breves de cada tarea realizada, basadas en el diff.
+- "aprendizajes": lista de aprendizajes, descubrimientos o dificultades que se infieran del diff o sus comentarios.
+- "resumen_tareas": resumen muy breve (2-3 líneas máximo) de qué tipo de trabajo se realizó en este commit.
+- "resumen_aprendizajes": resumen muy breve (2-3 líneas máximo) de los aprendizajes o dificultades clave.
 
-**Resumen General de Tareas:**
-[Un resumen muy breve (2-3 líneas máximo) describiendo en general qué tipo de trabajo se realizó en este commit, deberas escribirlo en primera persona como el usuario, directo y al grano.]
-- ...
-**Resumen General de Aprendizaje:**
-[Un resumen muy breve (2-3 líneas máximo) sobre los aprendizajes, descubrimientos o dificultades clave encontradas, si se pueden inferir, deberas escribirlo en primera persona como el usuario, directo y al grano.]
-- ...
-
-Si no puedes inferir claramente alguna de las secciones (especialmente Aprendizajes) a partir del patch, deja esa sección vacía o indica "No se infieren aprendizajes directos del patch". No inventes información. Si no hay tareas claras, indícalo también.
+Si no puedes inferir aprendizajes a partir del patch, deja "aprendizajes" como lista vacía y "resumen_aprendizajes" como cadena vacía. No inventes información. Si no hay tareas claras, indícalo en "resumen_tareas".
 
 Aquí está el patch:
 ```diff
@@ -63,8 +155,8 @@ Aquí está el patch:
     util_debug.registrar_depuracion("Prompt construido para la IA.")
     return prompt_sistema
 
-def generar_resumen_con_ia(patch_contenido: str) -> str | None:
-    """Envía el patch a la IA y devuelve el resumen generado."""
+def generar_resumen_con_ia(patch_contenido: str, nombre_modelo: str | None = None) -> dict | None:
+    """Envía el patch a la IA (al modelo indicado o al de por defecto) y devuelve el resumen estructurado validado."""
     global modelo_ia
 
     if modelo_ia is None:
@@ -74,24 +166,30 @@ def generar_resumen_con_ia(patch_contenido: str) -> str | None:
             return None
 
     if not patch_contenido:
+        print("Error: Contenido del patch vacío.")
         util_debug.registrar_depuracion("Contenido del patch vacío, no se llama a la IA.")
-        return "Error: Contenido del patch vacío."
+        return None
 
     prompt = construir_prompt(patch_contenido)
-    util_debug.registrar_depuracion(f"Enviando prompt a la IA (modelo {constantes.NOMBRE_MODELO_IA})...")
+    nombre_modelo = nombre_modelo or constantes.NOMBRE_MODELO_IA
+    util_debug.registrar_depuracion(f"Enviando prompt a la IA (modelo {nombre_modelo})...")
 
     try:
-        # Configuración para asegurar respuesta de texto
+        # Respuesta JSON restringida al esquema de resumen
         generation_config = genai.types.GenerationConfig(
             #candidate_count=1,  # Solo necesitamos una respuesta
-            response_mime_type="text/plain"  # Asegurar texto plano
+            response_mime_type="application/json",
+            response_schema=util_formato.ESQUEMA_RESUMEN
         )
-        respuesta = modelo_ia.generate_content(prompt, generation_config=generation_config)
+        respuesta = _generar_con_plazo(nombre_modelo, prompt, generation_config)
 
         # Acceder al texto de la respuesta de forma segura
         if respuesta.parts:
-            resumen = respuesta.text  # Acceso directo si parts existe y tiene contenido
             util_debug.registrar_depuracion("Respuesta recibida de la IA.")
+            resumen = util_formato.parsear_resumen_json(respuesta.text)
+            if resumen is None:
+                print("Error: La IA devolvió un JSON que no cumple el formato de resumen esperado.")
+                util_debug.registrar_depuracion(f"Respuesta IA no válida: {respuesta.text[:200]}")
             return resumen
         else:
             # Manejar el caso donde no hay 'parts' o están vacías (podría indicar bloqueo, etc.)
@@ -99,7 +197,17 @@ def generar_resumen_con_ia(patch_contenido: str) -> str | None:
             util_debug.registrar_depuracion(f"Respuesta IA sin 'parts' válidas. Prompt Safety?: {respuesta.prompt_feedback}")
             return None
 
+    except TimeoutError as e:
+        print(f"Error: Plazo agotado, {e}. Puedes ajustar '{constantes.CLAVE_PLAZO_IA_SEGUNDOS}' en config.json.")
+        util_debug.registrar_depuracion(f"Plazo agotado en generate_content: {e}")
+        return None
     except Exception as e:
         print(f"Error al interactuar con la API de Gemini: {e}")
         util_debug.registrar_depuracion(f"Excepción durante llamada a generate_content: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def generar_resumen_enrutado(patch_contenido: str) -> tuple[dict | None, dict]:
+    """Elige el modelo según el tamaño estimado del prompt y genera el resumen con él."""
+    tokens_estimados = util_enrutado.estimar_tokens(construir_prompt(patch_contenido))
+    decision = util_enrutado.decidir_modelo(tokens_estimados)
+    return generar_resumen_con_ia(patch_contenido, decision["modelo"]), decision
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Índice de resúmenes por patch-id: reutiliza resúmenes tras rebase o cherry-pick
+
+import json
+import os
+from . import constantes, util_archivos, util_config, util_debug
+
+# Índice en memoria: {patch_id: {"hash": ..., "archivo": ..., "datos": {resumen estructurado}}}
+_indice = None
+
+def obtener_ruta_indice() -> str:
+    """Devuelve la ruta del archivo JSON del índice de patch-ids."""
+    return os.path.join(util_config.obtener_ruta_carpeta_resumenes(), constantes.NOMBRE_ARCHIVO_INDICE_PATCH_ID)
+
+def _leer_indice_disco() -> dict:
+    ruta_indice = obtener_ruta_indice()
+    if not os.path.exists(ruta_indice):
+        return {}
+    try:
+        with open(ruta_indice, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+            indice = json.load(f)
+        util_debug.registrar_depuracion(f"Índice de patch-id cargado ({len(indice)} entradas).")
+        return indice
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Advertencia: No se pudo leer el índice de patch-id, se empezará uno nuevo: {e}")
+        util_debug.registrar_depuracion(f"Error al cargar índice de patch-id: {e}")
+        return {}
+
+def cargar_indice() -> dict:
+    """Carga el índice desde disco (solo la primera vez; después se usa la copia en memoria)."""
+    global _indice
+    if _indice is None:
+        _indice = _leer_indice_disco()
+    return _indice
+
+def buscar_resumen(patch_id: str) -> dict | None:
+    """Devuelve la entrada {hash, archivo, datos} de un patch equivalente ya resumido, o None."""
+    entrada = cargar_indice().get(patch_id)
+    if entrada and "datos" not in entrada:
+        # Entradas antiguas guardaban solo el Markdown: no sirven para reconstruir el resumen estructurado
+        util_debug.registrar_depuracion(f"Patch-id {patch_id[:12]} con entrada antigua sin datos estructurados, se ignora.")
+        return None
+    if entrada:
+        util_debug.registrar_depuracion(f"Patch-id {patch_id[:12]} encontrado (commit {entrada.get('hash', '?')[:7]}).")
+    return entrada
+
+def registrar_resumen(patch_id: str, hash_commit: str, ruta_archivo: str, datos_resumen: dict) -> bool:
+    """Asocia un patch-id con el resumen guardado y persiste el índice."""
+    return registrar_resumenes([(patch_id, hash_commit, ruta_archivo, datos_resumen)])
+
+def registrar_resumenes(registros: list[tuple[str, str, str, dict]]) -> bool:
+    """Registra varios (patch_id, hash, archivo, datos) con una sola escritura del índice."""
+    global _indice
+    entradas = {patch_id: {"hash": hash_commit, "archivo": ruta_archivo, "datos": datos_resumen}
+                for patch_id, hash_commit, ruta_archivo, datos_resumen in registros}
+    ruta_indice = obtener_ruta_indice()
+    try:
+        with util_archivos.bloqueo(ruta_indice):
+            # Se relee dentro del bloqueo para no perder lo que hayan añadido otros procesos
+            indice = _leer_indice_disco()
+            indice.update(entradas)
+            util_archivos.escribir_atomico(ruta_indice, json.dumps(indice, indent=1, ensure_ascii=False))
+        _indice = indice
+        util_debug.registrar_depuracion(f"{len(entradas)} patch-id registrados.")
+        return True
+    except OSError as e:
+        cargar_indice().update(entradas) # Al menos sirven durante esta sesión
+        print(f"Advertencia: No se pudo guardar el índice de patch-id: {e}")
+        util_debug.registrar_depuracion(f"Error al guardar índice de patch-id: {e}")
+        return False
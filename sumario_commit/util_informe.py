@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# Informe multi-repositorio: extrae en paralelo los commits de varios repositorios y genera un único Markdown
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from . import constantes, nucleo, util_archivos, util_config, util_debug, util_formato, util_git
+
+
+def _listar_commits(ruta_repo: str, desde: str, hasta: str, solo_propios: bool) -> tuple[list[dict] | None, str | None]:
+    """(En un proceso del pool) commits del repositorio en la ventana y el email usado para filtrarlos."""
+    email = util_git.obtener_email_usuario(ruta_repo) if solo_propios else None
+    if solo_propios and not email:
+        print(f"Advertencia: '{ruta_repo}' no tiene user.email configurado; se omite.")
+        return None, None
+    return util_git.obtener_commits_rango_fechas(ruta_repo, desde, hasta, email), email
+
+def obtener_ruta_informe(desde: str, hasta: str) -> str:
+    """Ruta del informe combinado para una ventana de fechas."""
+    nombre = f"{constantes.PREFIJO_ARCHIVO_INFORME}{desde}_{hasta}{constantes.EXTENSION_ARCHIVO_RESUMEN}"
+    return os.path.join(util_config.obtener_ruta_carpeta_resumenes(), nombre)
+
+def generar_informe(rutas_repos: list[str], desde: str, hasta: str, solo_propios: bool = False) -> str | None:
+    """
+    Genera el informe combinado de los commits de varios repositorios entre dos fechas.
+
+    El trabajo de git (listar commits, estadísticas, triaje, patch y patch-id) se reparte
+    entre procesos; cada commit preparado pasa en cuanto está listo a un grupo de hilos que
+    obtiene su resumen, de modo que las llamadas a la IA se solapan con el git del resto
+    de repositorios y quedan sujetas al limitador compartido de util_ia. Los commits con el
+    mismo patch-id (cherry-picks entre repositorios) solo se resumen una vez, y los que ya
+    tienen su resumen guardado no se vuelven a preparar. Cada resumen nuevo se guarda además
+    como un resumen normal del commit (resumen_<fecha>_<hash>.md y su .json).
+
+    Devuelve la ruta del informe guardado o None si falla.
+    """
+    inicio = time.perf_counter()
+    repos = [ruta for ruta in rutas_repos if util_git.es_repositorio_git(ruta)]
+    for ruta in set(rutas_repos) - set(repos):
+        print(f"Advertencia: '{ruta}' ya no es un repositorio Git válido; se omite.")
+    if not repos:
+        print("Error: No hay repositorios válidos en el perfil.")
+        return None
+
+    commits_por_repo = {ruta: None for ruta in repos} # None = no se pudieron listar
+    emails = {}
+    resultados = {} # (ruta, hash) -> (info, datos, metadatos)
+    duplicados = [] # (ruta, info, patch_id) pendientes de reutilizar el resumen de otro commit del informe
+    primero_por_patch_id = {} # patch_id -> (ruta, hash) del commit que se resume
+    preparados = {} # (ruta, hash) -> commit preparado, para registrar después los resúmenes nuevos
+    ya_guardados = set() # (ruta, hash) con su resumen guardado de antes
+
+    procesos = max(1, min(constantes.PROCESOS_MAXIMOS_INFORME, os.cpu_count() or 1, len(repos) * 4))
+    hilos = util_config.obtener_ajuste(constantes.CLAVE_LLAMADAS_IA_SIMULTANEAS) or constantes.LLAMADAS_IA_SIMULTANEAS
+    util_debug.registrar_depuracion(f"Informe: {len(repos)} repositorios, {procesos} procesos, {hilos} hilos de IA.")
+
+    with nucleo.crear_pool_git(procesos) as pool_git, \
+         ThreadPoolExecutor(max_workers=max(1, int(hilos)), thread_name_prefix="informe") as pool_ia:
+        pendientes = {pool_git.submit(_listar_commits, ruta, desde, hasta, solo_propios): ("listar", ruta, None)
+                      for ruta in repos}
+        while pendientes:
+            terminadas, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futura in terminadas:
+                tarea, ruta, commit = pendientes.pop(futura) # En "resumir", 'commit' es la info del commit preparado
+                try:
+                    resultado = futura.result()
+                except Exception as e:
+                    print(f"Error al procesar '{ruta}': {e}")
+                    util_debug.registrar_depuracion(f"Excepción en el informe ({tarea}) para {ruta}: {e}")
+                    continue
+
+                if tarea == "listar":
+                    commits, emails[ruta] = resultado
+                    commits_por_repo[ruta] = commits
+                    if commits:
+                        print(f"{os.path.basename(ruta)}: {len(commits)} commits.")
+                    for commit in commits or []:
+                        registro = nucleo.cargar_datos_resumen(commit['fecha'], commit['hash_completo'])
+                        if registro:
+                            info = {"hash": commit['hash_completo'], "autor": registro.get("autor"), "asunto": registro.get("asunto")}
+                            resultados[(ruta, commit['hash_completo'])] = (info, registro["resumen"], registro.get("metadatos") or {})
+                            ya_guardados.add((ruta, commit['hash_completo']))
+                            continue
+                        pendientes[pool_git.submit(nucleo.preparar_commit, ruta, commit['hash_completo'])] = ("preparar", ruta, commit)
+
+                elif tarea == "preparar":
+                    preparado = resultado
+                    if preparado is None:
+                        resultados[(ruta, commit['hash_completo'])] = (None, None, {"modelo": None, "motivo": "no se pudo obtener el patch"})
+                        continue
+                    patch_id = preparado['patch_id']
+                    if patch_id and patch_id in primero_por_patch_id:
+                        duplicados.append((ruta, preparado['info'], patch_id))
+                        continue
+                    if patch_id:
+                        primero_por_patch_id[patch_id] = (ruta, commit['hash_completo'])
+                    preparados[(ruta, commit['hash_completo'])] = preparado
+                    pendientes[pool_ia.submit(nucleo.obtener_resumen_commit, ruta, preparado, False)] = ("resumir", ruta, preparado['info'])
+
+                else: # "resumir"
+                    datos, metadatos = resultado
+                    resultados[(ruta, commit['hash'])] = (commit, datos, metadatos)
+
+    for ruta, info, patch_id in duplicados:
+        ruta_origen, hash_origen = primero_por_patch_id[patch_id]
+        _, datos, _ = resultados.get((ruta_origen, hash_origen), (None, None, None))
+        metadatos = {"origen": "patch-id", "hash_origen": hash_origen, "modelo": None,
+                     "motivo": f"reutilizado del commit {hash_origen[:7]} de {os.path.basename(ruta_origen)} (mismo patch-id)"}
+        resultados[(ruta, info['hash'])] = (info, datos, metadatos)
+
+    ruta_informe = obtener_ruta_informe(desde, hasta)
+    contenido = _componer_informe(repos, commits_por_repo, emails, resultados, desde, hasta)
+    try:
+        util_archivos.escribir_atomico(ruta_informe, contenido)
+    except OSError as e:
+        print(f"Error al guardar el informe: {e}")
+        util_debug.registrar_depuracion(f"Error de OS al guardar informe: {e}")
+        return None
+
+    # Cada resumen nuevo se guarda como el de cualquier commit (visor, exportación) y los generados
+    # por la IA quedan disponibles para futuros rebases, cherry-picks o patches casi idénticos
+    registros = []
+    for ruta in repos:
+        for commit in commits_por_repo[ruta] or []:
+            clave = (ruta, commit['hash_completo'])
+            info, datos, metadatos = resultados.get(clave, (None, None, None))
+            if not datos or clave in ya_guardados:
+                continue
+            ruta_archivo = nucleo.guardar_resumen(commit['fecha'], commit['hash_completo'], datos, ruta, metadatos, info, informar=False)
+            if ruta_archivo and metadatos.get("origen") == "ia" and clave in preparados:
+                registros.append((preparados[clave], metadatos, ruta_archivo, datos))
+    nucleo.registrar_resumenes_nuevos(registros)
+
+    print(f"Informe guardado en: {ruta_informe} ({time.perf_counter() - inicio:.1f} s)")
+    return ruta_informe
+
+def _componer_informe(repos: list[str], commits_por_repo: dict, emails: dict, resultados: dict, desde: str, hasta: str) -> str:
+    """Markdown del informe: un apartado por repositorio y, dentro, los commits en orden cronológico."""
+    origenes = [metadatos.get("origen") for _, _, metadatos in resultados.values()]
+    total = len(resultados)
+    sin_resumen = sum(1 for _, datos, _ in resultados.values() if not datos)
+
+    lineas = [f"# Informe Multi-Repositorio ({desde} - {hasta})", ""]
+    autores = sorted({email for email in emails.values() if email})
+    lineas.append(f"Autor: {', '.join(autores)}" if autores else "Autor: todos")
+    lineas.append(f"{total} commits en {sum(1 for c in commits_por_repo.values() if c)} repositorios: "
+                  f"{origenes.count('ia')} resumidos con IA, {origenes.count('triaje')} por triaje, "
+                  f"{origenes.count('patch-id')} reutilizados, {sin_resumen} sin resumen.")
+
+    for ruta in repos:
+        commits = commits_por_repo[ruta]
+        lineas += ["", f"## {os.path.basename(os.path.abspath(ruta))} (`{ruta}`)", ""]
+        if commits is None:
+            lineas.append("_No se pudieron leer los commits de este repositorio._")
+            continue
+        if not commits:
+            lineas.append("_Sin commits en este periodo._")
+            continue
+        for commit in commits:
+            info, datos, metadatos = resultados.get((ruta, commit['hash_completo']), (None, None, {}))
+            lineas += [f"### {commit['fecha']} · `{commit['hash']}` · {commit['mensaje']}", ""]
+            if datos:
+                lineas.append(util_formato.renderizar_markdown(datos).rstrip("\n") + nucleo.formatear_metadatos(metadatos).rstrip("\n"))
+            else:
+                lineas.append(f"_Sin resumen: {(metadatos or {}).get('motivo', 'error al procesar el commit')}._")
+            lineas.append("")
+    return "\n".join(lineas).rstrip("\n") + "\n"
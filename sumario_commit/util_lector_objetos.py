@@ -0,0 +1,757 @@
+# -*- coding: utf-8 -*-
+# Lector de objetos Git en Python puro (packfiles vía mmap, objetos sueltos y commit-graph)
+# Backend opcional de solo lectura para util_git: evita lanzar procesos git y parsear su salida.
+# Cualquier caso no soportado lanza ObjetoNoSoportado y util_git recurre a la CLI de git.
+
+import heapq
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from . import constantes, util_debug
+
+# Tipos de objeto tal y como se codifican dentro de un packfile
+TIPOS_OBJETO = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+_TIPO_OFS_DELTA = 6
+_TIPO_REF_DELTA = 7
+
+_MODO_DIRECTORIO = b"40000"
+_SIN_PADRE_GRAFO = 0x70000000 # Marcador de "sin padre" en el chunk CDAT del commit-graph
+
+
+class ObjetoNoSoportado(Exception):
+    """Indica que el lector nativo no puede resolver la petición y debe usarse la CLI de git."""
+
+
+# --- Caché acotada de objetos descomprimidos ---
+
+class _CacheObjetos:
+    """Caché LRU de objetos (tipo, datos) limitada por el total de bytes almacenados (segura entre hilos)."""
+
+    def __init__(self, limite_bytes: int):
+        self._limite = limite_bytes
+        self._ocupado = 0
+        self._entradas = OrderedDict()
+        self._cerrojo = threading.Lock()
+
+    def obtener(self, clave):
+        with self._cerrojo:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+            return entrada
+
+    def guardar(self, clave, tipo: str, datos: bytes):
+        with self._cerrojo:
+            if len(datos) > self._limite or clave in self._entradas:
+                return
+            self._entradas[clave] = (tipo, datos)
+            self._ocupado += len(datos)
+            while self._ocupado > self._limite:
+                _, (_, datos_expulsados) = self._entradas.popitem(last=False)
+                self._ocupado -= len(datos_expulsados)
+
+
+# --- Packfiles ---
+
+def _mapear_archivo(ruta: str) -> mmap.mmap:
+    """Abre un archivo en modo solo lectura y lo proyecta en memoria."""
+    with open(ruta, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _leer_tamano_delta(delta: bytes, pos: int) -> tuple[int, int]:
+    """Lee un entero de longitud variable de la cabecera de un delta."""
+    tamano = 0
+    desplazamiento = 0
+    while True:
+        byte = delta[pos]
+        pos += 1
+        tamano |= (byte & 0x7f) << desplazamiento
+        desplazamiento += 7
+        if not byte & 0x80:
+            return tamano, pos
+
+def _aplicar_delta(base: bytes, delta: bytes) -> bytes:
+    """Reconstruye un objeto aplicando las instrucciones copy/insert de un delta sobre su base."""
+    tamano_base, pos = _leer_tamano_delta(delta, 0)
+    tamano_destino, pos = _leer_tamano_delta(delta, pos)
+    if tamano_base != len(base):
+        raise ObjetoNoSoportado("Tamaño de base del delta inconsistente.")
+
+    salida = bytearray()
+    while pos < len(delta):
+        instruccion = delta[pos]
+        pos += 1
+        if instruccion & 0x80: # Copiar un rango de la base
+            desplazamiento = 0
+            tamano = 0
+            for i in range(4):
+                if instruccion & (1 << i):
+                    desplazamiento |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if instruccion & (1 << (4 + i)):
+                    tamano |= delta[pos] << (8 * i)
+                    pos += 1
+            if tamano == 0:
+                tamano = 0x10000
+            salida += base[desplazamiento:desplazamiento + tamano]
+        elif instruccion: # Insertar bytes literales
+            salida += delta[pos:pos + instruccion]
+            pos += instruccion
+        else:
+            raise ObjetoNoSoportado("Instrucción de delta reservada.")
+
+    if len(salida) != tamano_destino:
+        raise ObjetoNoSoportado("Tamaño final del delta inconsistente.")
+    return bytes(salida)
+
+
+class _Pack:
+    """Un par .idx (versión 2) / .pack proyectados en memoria."""
+
+    def __init__(self, ruta_idx: str, ruta_pack: str):
+        self.ruta_pack = ruta_pack
+        self._idx = _mapear_archivo(ruta_idx)
+        if self._idx[:4] != b"\xfftOc" or struct.unpack_from(">I", self._idx, 4)[0] != 2:
+            raise ObjetoNoSoportado(f"Índice de pack no soportado: {ruta_idx}")
+        self._fanout = struct.unpack_from(">256I", self._idx, 8)
+        self.total = self._fanout[255]
+        self._inicio_sha = 8 + 256 * 4
+        self._inicio_offsets = self._inicio_sha + self.total * 24 # 20 bytes de SHA + 4 de CRC
+        self._inicio_offsets64 = self._inicio_offsets + self.total * 4
+
+        self._pack = _mapear_archivo(ruta_pack)
+        if self._pack[:4] != b"PACK":
+            raise ObjetoNoSoportado(f"Packfile inválido: {ruta_pack}")
+        self._vista = memoryview(self._pack)
+
+    def cerrar(self):
+        """Cierra las proyecciones; si otro hilo aún lee de ellas, se cierran al liberarse."""
+        try:
+            self._vista.release()
+            self._pack.close()
+            self._idx.close()
+        except BufferError as e:
+            util_debug.registrar_depuracion(f"Pack {self.ruta_pack} aún en uso; se cerrará al liberarse: {e}")
+
+    def buscar(self, sha_bin: bytes) -> int | None:
+        """Devuelve el offset del objeto dentro del pack, o None si no está."""
+        primero = sha_bin[0]
+        bajo = self._fanout[primero - 1] if primero else 0
+        alto = self._fanout[primero]
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            inicio = self._inicio_sha + medio * 20
+            candidato = self._idx[inicio:inicio + 20]
+            if candidato < sha_bin:
+                bajo = medio + 1
+            elif candidato > sha_bin:
+                alto = medio
+            else:
+                return self._offset(medio)
+        return None
+
+    def _offset(self, posicion: int) -> int:
+        offset = struct.unpack_from(">I", self._idx, self._inicio_offsets + posicion * 4)[0]
+        if offset & 0x80000000: # Offset de 64 bits en la tabla extendida
+            indice = offset & 0x7fffffff
+            offset = struct.unpack_from(">Q", self._idx, self._inicio_offsets64 + indice * 8)[0]
+        return offset
+
+    def leer_cabecera(self, offset: int) -> tuple[int, int, int | bytes | None, int]:
+        """Devuelve (tipo, tamaño, base del delta, posición de los datos comprimidos)."""
+        pack = self._pack
+        byte = pack[offset]
+        pos = offset + 1
+        tipo = (byte >> 4) & 0x07
+        tamano = byte & 0x0f
+        desplazamiento = 4
+        while byte & 0x80:
+            byte = pack[pos]
+            pos += 1
+            tamano |= (byte & 0x7f) << desplazamiento
+            desplazamiento += 7
+
+        base = None
+        if tipo == _TIPO_OFS_DELTA:
+            byte = pack[pos]
+            pos += 1
+            relativo = byte & 0x7f
+            while byte & 0x80:
+                byte = pack[pos]
+                pos += 1
+                relativo = ((relativo + 1) << 7) | (byte & 0x7f)
+            base = offset - relativo
+        elif tipo == _TIPO_REF_DELTA:
+            base = bytes(pack[pos:pos + 20])
+            pos += 20
+        return tipo, tamano, base, pos
+
+    def descomprimir(self, pos: int, tamano: int) -> bytes:
+        """Descomprime el flujo zlib que empieza en 'pos' sin copiar el resto del pack."""
+        descompresor = zlib.decompressobj()
+        partes = []
+        bloque = max(tamano + 64, 4096)
+        while not descompresor.eof:
+            fragmento = self._vista[pos:pos + bloque]
+            if not fragmento:
+                raise ObjetoNoSoportado(f"Objeto truncado en {self.ruta_pack}")
+            try:
+                partes.append(descompresor.decompress(fragmento))
+            except zlib.error as e:
+                raise ObjetoNoSoportado(f"Objeto corrupto en {self.ruta_pack}: {e}") from e
+            pos += len(fragmento)
+            bloque *= 2
+        return b"".join(partes)
+
+
+# --- Commit-graph ---
+
+class _GrafoCommits:
+    """Lectura del archivo objects/info/commit-graph (un único archivo, sin cadena)."""
+
+    def __init__(self, ruta: str):
+        self._mm = _mapear_archivo(ruta)
+        mm = self._mm
+        if mm[:4] != b"CGPH" or mm[4] != 1 or mm[5] != 1 or mm[7] != 0:
+            raise ObjetoNoSoportado("Formato de commit-graph no soportado.")
+        chunks = {}
+        for i in range(mm[6] + 1):
+            identificador, offset = struct.unpack_from(">4sQ", mm, 8 + i * 12)
+            chunks[identificador] = offset
+        try:
+            self._fanout = chunks[b"OIDF"]
+            self._oids = chunks[b"OIDL"]
+            self._datos = chunks[b"CDAT"]
+        except KeyError:
+            raise ObjetoNoSoportado("Commit-graph sin los chunks obligatorios.")
+        self._aristas = chunks.get(b"EDGE")
+        self.total = struct.unpack_from(">I", mm, self._fanout + 255 * 4)[0]
+
+    def cerrar(self):
+        self._mm.close()
+
+    def posicion(self, sha_bin: bytes) -> int | None:
+        primero = sha_bin[0]
+        bajo = struct.unpack_from(">I", self._mm, self._fanout + (primero - 1) * 4)[0] if primero else 0
+        alto = struct.unpack_from(">I", self._mm, self._fanout + primero * 4)[0]
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            inicio = self._oids + medio * 20
+            candidato = self._mm[inicio:inicio + 20]
+            if candidato < sha_bin:
+                bajo = medio + 1
+            elif candidato > sha_bin:
+                alto = medio
+            else:
+                return medio
+        return None
+
+    def _sha(self, posicion: int) -> str:
+        inicio = self._oids + posicion * 20
+        return self._mm[inicio:inicio + 20].hex()
+
+    def datos(self, posicion: int) -> tuple[str, list[str], int]:
+        """Devuelve (árbol, padres, fecha del committer) del commit en 'posicion'."""
+        inicio = self._datos + posicion * 36
+        arbol = self._mm[inicio:inicio + 20].hex()
+        padre1, padre2, generacion, tiempo_bajo = struct.unpack_from(">IIII", self._mm, inicio + 20)
+        tiempo = ((generacion & 0x3) << 32) | tiempo_bajo
+
+        padres = []
+        if padre1 != _SIN_PADRE_GRAFO:
+            padres.append(self._sha(padre1))
+        if padre2 != _SIN_PADRE_GRAFO:
+            if padre2 & 0x80000000: # Merge de más de dos padres: lista en el chunk EDGE
+                if self._aristas is None:
+                    raise ObjetoNoSoportado("Commit-graph sin chunk EDGE.")
+                indice = padre2 & 0x7fffffff
+                while True:
+                    valor = struct.unpack_from(">I", self._mm, self._aristas + indice * 4)[0]
+                    padres.append(self._sha(valor & 0x7fffffff))
+                    if valor & 0x80000000:
+                        break
+                    indice += 1
+            else:
+                padres.append(self._sha(padre2))
+        return arbol, padres, tiempo
+
+
+# --- Utilidades de parseo ---
+
+def _parsear_firma(valor: str) -> tuple[str, int, str]:
+    """Parsea 'Nombre <email> 1700000000 +0200' en (nombre, timestamp, zona)."""
+    identidad, marca_tiempo, zona = valor.rsplit(" ", 2)
+    nombre = identidad.split(" <", 1)[0]
+    return nombre, int(marca_tiempo), zona
+
+def _formatear_fecha(marca_tiempo: int, zona: str) -> str:
+    """Devuelve YYYY-MM-DD en la zona horaria del autor (como --date=format:%Y-%m-%d)."""
+    minutos = int(zona[1:3]) * 60 + int(zona[3:5])
+    if zona.startswith("-"):
+        minutos = -minutos
+    return datetime.fromtimestamp(marca_tiempo, timezone(timedelta(minutes=minutos))).strftime("%Y-%m-%d")
+
+def _encontrar_dir_git(ruta_repo: str) -> str | None:
+    """Busca el directorio .git subiendo desde la ruta indicada (admite worktrees con archivo .git)."""
+    actual = os.path.abspath(ruta_repo)
+    while True:
+        candidato = os.path.join(actual, ".git")
+        if os.path.isdir(candidato):
+            return candidato
+        if os.path.isfile(candidato):
+            with open(candidato, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+                contenido = f.read().strip()
+            if contenido.startswith("gitdir:"):
+                return os.path.normpath(os.path.join(actual, contenido[len("gitdir:"):].strip()))
+            return None
+        padre = os.path.dirname(actual)
+        if padre == actual:
+            return None
+        actual = padre
+
+def _directorio_comun(dir_git: str) -> str:
+    """Directorio con los objetos y refs compartidos (distinto de dir_git en worktrees secundarios)."""
+    ruta_commondir = os.path.join(dir_git, "commondir")
+    if not os.path.isfile(ruta_commondir):
+        return dir_git
+    with open(ruta_commondir, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+        return os.path.normpath(os.path.join(dir_git, f.read().strip()))
+
+
+# --- Lector principal ---
+
+class LectorObjetos:
+    """Acceso de solo lectura a los objetos y referencias de un repositorio Git."""
+
+    def __init__(self, dir_git: str):
+        self.dir_git = dir_git
+        self.dir_comun = _directorio_comun(dir_git)
+        self.dir_objetos = os.path.join(self.dir_comun, "objects")
+
+        ruta_config = os.path.join(self.dir_comun, "config")
+        if os.path.isfile(ruta_config):
+            with open(ruta_config, 'r', encoding=constantes.CODIFICACION_ARCHIVOS, errors='replace') as f:
+                config_git = f.read().lower()
+            if "objectformat" in config_git and "sha256" in config_git:
+                raise ObjetoNoSoportado("Repositorios SHA-256 no soportados.")
+        if os.path.exists(os.path.join(self.dir_objetos, "info", "alternates")):
+            raise ObjetoNoSoportado("Repositorios con 'alternates' no soportados.")
+
+        self._cache = _CacheObjetos(constantes.TAMANO_MAX_CACHE_OBJETOS)
+        self._packs = []
+        self._marca_dir_packs = None
+        self._cerrojo_packs = threading.Lock()
+        self._grafo = None
+        self._grafo_cargado = False
+        self._usos = 0
+        self._cerrojo_usos = threading.Lock()
+        self._cargar_packs()
+
+    def _cargar_grafo(self):
+        """Proyecta objects/info/commit-graph si existe (solo se intenta una vez por apertura)."""
+        self._grafo_cargado = True
+        ruta_grafo = os.path.join(self.dir_objetos, "info", "commit-graph")
+        if os.path.isfile(ruta_grafo):
+            try:
+                self._grafo = _GrafoCommits(ruta_grafo)
+                util_debug.registrar_depuracion(f"Commit-graph cargado ({self._grafo.total} commits).")
+            except (ObjetoNoSoportado, OSError, struct.error) as e:
+                util_debug.registrar_depuracion(f"Commit-graph ignorado: {e}")
+
+    def _cargar_packs(self):
+        """
+        Sincroniza los packfiles proyectados con los del disco.
+
+        Proyecta los nuevos y cierra los que ya no existen (p. ej. tras un 'git gc' o 'repack'),
+        conservando el resto.
+        """
+        dir_packs = os.path.join(self.dir_objetos, "pack")
+        if not os.path.isdir(dir_packs):
+            return
+        with self._cerrojo_packs:
+            self._marca_dir_packs = os.stat(dir_packs).st_mtime_ns
+            en_disco = {os.path.join(dir_packs, nombre[:-4] + ".pack"): os.path.join(dir_packs, nombre)
+                        for nombre in os.listdir(dir_packs) if nombre.endswith(".idx")}
+            en_disco = {ruta_pack: ruta_idx for ruta_pack, ruta_idx in en_disco.items() if os.path.isfile(ruta_pack)}
+            conservados = [pack for pack in self._packs if pack.ruta_pack in en_disco]
+            retirados = [pack for pack in self._packs if pack.ruta_pack not in en_disco]
+            conocidos = {pack.ruta_pack for pack in conservados}
+            nuevos = [_Pack(en_disco[ruta_pack], ruta_pack) for ruta_pack in sorted(en_disco) if ruta_pack not in conocidos]
+            # Se sustituye la lista en vez de modificarla: los hilos que la recorren no ven cambios a medias
+            self._packs = conservados + nuevos
+        for pack in retirados:
+            pack.cerrar()
+        util_debug.registrar_depuracion(f"Lector nativo: {len(self._packs)} packfiles proyectados"
+                                        f" ({len(nuevos)} nuevos, {len(retirados)} retirados).")
+
+    def _refrescar_packs(self):
+        """Vuelve a sincronizar los packs solo si la carpeta de packs ha cambiado (el commit-graph se relee después)."""
+        try:
+            marca = os.stat(os.path.join(self.dir_objetos, "pack")).st_mtime_ns
+        except OSError:
+            return
+        if marca != self._marca_dir_packs:
+            self._cargar_packs()
+            grafo, self._grafo, self._grafo_cargado = self._grafo, None, False # 'git gc' también lo reescribe
+            if grafo is not None:
+                grafo.cerrar()
+
+    def liberar(self):
+        """Cierra los mmap de packs y commit-graph; se vuelven a proyectar cuando hagan falta."""
+        with self._cerrojo_packs:
+            packs, self._packs = self._packs, []
+            self._marca_dir_packs = None
+        grafo, self._grafo, self._grafo_cargado = self._grafo, None, False
+        for pack in packs:
+            pack.cerrar()
+        if grafo is not None:
+            grafo.cerrar()
+
+    @contextmanager
+    def en_uso(self):
+        """
+        Delimita una operación sobre el lector.
+
+        Al empezar se recogen los packs nuevos o borrados. En Windows un archivo proyectado no se
+        puede borrar, así que al terminar el último uso se cierran los mmap para que 'git gc' y
+        'git repack' puedan eliminar los packs antiguos; la caché de objetos se conserva.
+        """
+        with self._cerrojo_usos:
+            if self._usos == 0:
+                self._refrescar_packs()
+            self._usos += 1
+        try:
+            yield self
+        finally:
+            with self._cerrojo_usos:
+                self._usos -= 1
+                if self._usos == 0 and os.name == 'nt':
+                    self.liberar()
+
+    # -- Objetos --
+
+    def leer_objeto(self, sha: str) -> tuple[str, bytes]:
+        """Devuelve (tipo, contenido) de un objeto por su hash completo en hexadecimal."""
+        en_cache = self._cache.obtener(sha)
+        if en_cache is not None:
+            return en_cache
+
+        objeto = self._leer_objeto_suelto(sha)
+        if objeto is None:
+            objeto = self._leer_objeto_empaquetado(bytes.fromhex(sha))
+        if objeto is None:
+            self._cargar_packs() # Puede haber aparecido un pack nuevo (p. ej. tras un 'git gc')
+            objeto = self._leer_objeto_empaquetado(bytes.fromhex(sha))
+        if objeto is None:
+            raise ObjetoNoSoportado(f"Objeto {sha[:7]} no encontrado.")
+
+        self._cache.guardar(sha, *objeto)
+        return objeto
+
+    def _leer_objeto_suelto(self, sha: str) -> tuple[str, bytes] | None:
+        ruta = os.path.join(self.dir_objetos, sha[:2], sha[2:])
+        if not os.path.isfile(ruta):
+            return None
+        with open(ruta, 'rb') as f:
+            try:
+                crudo = zlib.decompress(f.read())
+            except zlib.error as e:
+                raise ObjetoNoSoportado(f"Objeto suelto {sha[:7]} corrupto: {e}") from e
+        cabecera, _, datos = crudo.partition(b"\0")
+        tipo = cabecera.split(b" ", 1)[0].decode("ascii")
+        return tipo, datos
+
+    def _leer_objeto_empaquetado(self, sha_bin: bytes) -> tuple[str, bytes] | None:
+        for pack in self._packs:
+            offset = pack.buscar(sha_bin)
+            if offset is not None:
+                return self._resolver_en_pack(pack, offset)
+        return None
+
+    def _resolver_en_pack(self, pack: _Pack, offset: int) -> tuple[str, bytes]:
+        """Resuelve la cadena de deltas de forma iterativa, reutilizando bases en caché."""
+        cadena = []
+        while True:
+            clave = (pack.ruta_pack, offset)
+            en_cache = self._cache.obtener(clave)
+            if en_cache is not None:
+                tipo, datos = en_cache
+                break
+            tipo_num, tamano, base, pos = pack.leer_cabecera(offset)
+            if tipo_num in TIPOS_OBJETO:
+                tipo, datos = TIPOS_OBJETO[tipo_num], pack.descomprimir(pos, tamano)
+                self._cache.guardar(clave, tipo, datos)
+                break
+            if tipo_num == _TIPO_OFS_DELTA:
+                cadena.append((clave, pack.descomprimir(pos, tamano)))
+                offset = base
+            elif tipo_num == _TIPO_REF_DELTA:
+                delta = pack.descomprimir(pos, tamano)
+                tipo, datos = self.leer_objeto(base.hex())
+                datos = _aplicar_delta(datos, delta)
+                self._cache.guardar(clave, tipo, datos)
+                break
+            else:
+                raise ObjetoNoSoportado(f"Tipo de objeto desconocido en pack: {tipo_num}")
+
+        for clave, delta in reversed(cadena):
+            datos = _aplicar_delta(datos, delta)
+            self._cache.guardar(clave, tipo, datos)
+        return tipo, datos
+
+    # -- Referencias --
+
+    def resolver_ref(self, ref: str = "HEAD") -> str:
+        """Resuelve HEAD, una rama/etiqueta o un hash completo a un hash de commit."""
+        if len(ref) == 40 and all(c in "0123456789abcdef" for c in ref.lower()):
+            return ref.lower()
+        if ref == "HEAD":
+            with open(os.path.join(self.dir_git, "HEAD"), 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+                contenido = f.read().strip()
+            if not contenido.startswith("ref:"):
+                return contenido # HEAD separado
+            ref = contenido[len("ref:"):].strip()
+
+        candidatos = [ref] if ref.startswith("refs/") else [f"refs/{ref}", f"refs/tags/{ref}", f"refs/heads/{ref}"]
+        for candidato in candidatos:
+            ruta = os.path.join(self.dir_comun, *candidato.split("/"))
+            if os.path.isfile(ruta):
+                with open(ruta, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+                    return self._pelar_etiqueta(f.read().strip())
+        ruta_empaquetadas = os.path.join(self.dir_comun, "packed-refs")
+        if os.path.isfile(ruta_empaquetadas):
+            with open(ruta_empaquetadas, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+                for linea in f:
+                    if linea.startswith(("#", "^")):
+                        continue
+                    sha, _, nombre = linea.strip().partition(" ")
+                    if nombre in candidatos:
+                        return self._pelar_etiqueta(sha)
+        raise ObjetoNoSoportado(f"Referencia '{ref}' no resoluble sin git.")
+
+    def _pelar_etiqueta(self, sha: str) -> str:
+        """Sigue etiquetas anotadas hasta el commit al que apuntan."""
+        tipo, datos = self.leer_objeto(sha)
+        while tipo == "tag":
+            sha = datos.split(b"\n", 1)[0].split(b" ", 1)[1].decode("ascii")
+            tipo, datos = self.leer_objeto(sha)
+        return sha
+
+    # -- Commits --
+
+    def leer_commit(self, sha: str) -> dict:
+        """Devuelve los metadatos de un commit: árbol, padres, autor, fechas y mensaje."""
+        tipo, datos = self.leer_objeto(sha)
+        if tipo != "commit":
+            raise ObjetoNoSoportado(f"El objeto {sha[:7]} no es un commit ({tipo}).")
+        cabecera, _, mensaje = datos.partition(b"\n\n")
+        commit = {'hash': sha, 'arbol': None, 'padres': []}
+        for linea in cabecera.decode("utf-8", errors="replace").split("\n"):
+            if linea.startswith(" "):
+                continue # Continuación de una cabecera multilínea (p. ej. gpgsig)
+            clave, _, valor = linea.partition(" ")
+            if clave == "tree":
+                commit['arbol'] = valor
+            elif clave == "parent":
+                commit['padres'].append(valor)
+            elif clave == "author":
+                commit['autor'], marca_tiempo, zona = _parsear_firma(valor)
+                commit['fecha'] = _formatear_fecha(marca_tiempo, zona)
+            elif clave == "committer":
+                commit['tiempo_commit'] = _parsear_firma(valor)[1]
+
+        mensaje = mensaje.decode("utf-8", errors="replace")
+        commit['mensaje'] = mensaje
+        # Igual que %s: primer párrafo del mensaje con los saltos de línea unidos por espacios
+        commit['asunto'] = " ".join(linea.strip() for linea in mensaje.strip().split("\n\n", 1)[0].split("\n"))
+        return commit
+
+    def _arbol_padres_y_tiempo(self, sha: str) -> tuple[str, list[str], int]:
+        """Obtiene árbol, padres y fecha de commit, desde el commit-graph si está disponible."""
+        if not self._grafo_cargado:
+            self._cargar_grafo()
+        if self._grafo is not None:
+            posicion = self._grafo.posicion(bytes.fromhex(sha))
+            if posicion is not None:
+                return self._grafo.datos(posicion)
+        commit = self.leer_commit(sha)
+        return commit['arbol'], commit['padres'], commit.get('tiempo_commit', 0)
+
+    def recorrer_historial(self, sha_inicio: str, limite: int | None = None):
+        """Genera los hashes alcanzables desde sha_inicio en orden de fecha de commit (como git log)."""
+        tiempo = self._arbol_padres_y_tiempo(sha_inicio)[2]
+        pendientes = [(-tiempo, 0, sha_inicio)]
+        vistos = {sha_inicio}
+        secuencia = 1
+        emitidos = 0
+        while pendientes and (limite is None or emitidos < limite):
+            _, _, sha = heapq.heappop(pendientes)
+            yield sha
+            emitidos += 1
+            for padre in self._arbol_padres_y_tiempo(sha)[1]:
+                if padre not in vistos:
+                    vistos.add(padre)
+                    heapq.heappush(pendientes, (-self._arbol_padres_y_tiempo(padre)[2], secuencia, padre))
+                    secuencia += 1
+
+    def recorrer_rango(self, sha_incluido: str, sha_excluido: str):
+        """
+        Genera los hashes de 'sha_excluido..sha_incluido' en orden de fecha de commit (como git log).
+
+        Ambos lados avanzan por fecha; los commits alcanzables desde sha_excluido se marcan y se
+        para cuando en la cola solo quedan commits marcados.
+        """
+        excluido = {sha_incluido: False, sha_excluido: True}
+        pendientes = [(-self._arbol_padres_y_tiempo(sha)[2], secuencia, sha) for secuencia, sha in enumerate(excluido)]
+        heapq.heapify(pendientes)
+        secuencia = len(pendientes)
+        en_cola = set(excluido)
+        interesantes = sum(not marcado for marcado in excluido.values()) # Commits sin marcar en la cola
+        while interesantes:
+            _, _, sha = heapq.heappop(pendientes)
+            en_cola.discard(sha)
+            if not excluido[sha]:
+                interesantes -= 1
+                yield sha
+            for padre in self._arbol_padres_y_tiempo(sha)[1]:
+                if padre not in excluido:
+                    excluido[padre] = excluido[sha]
+                    heapq.heappush(pendientes, (-self._arbol_padres_y_tiempo(padre)[2], secuencia, padre))
+                    secuencia += 1
+                    en_cola.add(padre)
+                    interesantes += not excluido[sha]
+                elif excluido[sha] and not excluido[padre]:
+                    excluido[padre] = True
+                    interesantes -= padre in en_cola
+
+    # -- Árboles --
+
+    def _entradas_arbol(self, sha: str | None) -> dict[str, tuple[bytes, str]]:
+        """Devuelve {nombre: (modo, hash)} de un árbol (vacío si sha es None)."""
+        if sha is None:
+            return {}
+        tipo, datos = self.leer_objeto(sha)
+        if tipo != "tree":
+            raise ObjetoNoSoportado(f"El objeto {sha[:7]} no es un árbol ({tipo}).")
+        entradas = {}
+        pos = 0
+        while pos < len(datos):
+            fin_modo = datos.index(b" ", pos)
+            fin_nombre = datos.index(b"\0", fin_modo)
+            modo = datos[pos:fin_modo]
+            nombre = datos[fin_modo + 1:fin_nombre].decode("utf-8", errors="replace")
+            entradas[nombre] = (modo, datos[fin_nombre + 1:fin_nombre + 21].hex())
+            pos = fin_nombre + 21
+        return entradas
+
+    def diferencias_arbol(self, arbol_viejo: str | None, arbol_nuevo: str | None,
+                          prefijo: str = "") -> list[tuple[str, str, str | None, str | None]]:
+        """
+        Compara dos árboles como 'diff-tree -r --no-renames'.
+
+        Devuelve [(estado, ruta, hash anterior, hash nuevo)] con estado 'A', 'D' o 'M'; los
+        subárboles idénticos se saltan sin leerlos.
+        """
+        viejas = self._entradas_arbol(arbol_viejo)
+        nuevas = self._entradas_arbol(arbol_nuevo)
+        cambios = []
+        for nombre in sorted(viejas.keys() | nuevas.keys()):
+            ruta = prefijo + nombre
+            vieja = viejas.get(nombre)
+            nueva = nuevas.get(nombre)
+            if vieja == nueva:
+                continue
+            es_dir_viejo = vieja is not None and vieja[0] == _MODO_DIRECTORIO
+            es_dir_nuevo = nueva is not None and nueva[0] == _MODO_DIRECTORIO
+            if es_dir_viejo and es_dir_nuevo:
+                cambios.extend(self.diferencias_arbol(vieja[1], nueva[1], ruta + "/"))
+            elif es_dir_viejo or es_dir_nuevo:
+                # Cambio de tipo directorio <-> archivo: se trata como borrado + alta
+                if es_dir_viejo:
+                    cambios.extend(self.diferencias_arbol(vieja[1], None, ruta + "/"))
+                elif vieja is not None:
+                    cambios.append(("D", ruta, vieja[1], None))
+                if es_dir_nuevo:
+                    cambios.extend(self.diferencias_arbol(None, nueva[1], ruta + "/"))
+                elif nueva is not None:
+                    cambios.append(("A", ruta, None, nueva[1]))
+            elif vieja is None:
+                cambios.append(("A", ruta, None, nueva[1]))
+            elif nueva is None:
+                cambios.append(("D", ruta, vieja[1], None))
+            else:
+                cambios.append(("M", ruta, vieja[1], nueva[1]))
+        return cambios
+
+    def cambios_commit(self, sha: str) -> list[tuple[str, str, str | None, str | None]]:
+        """Archivos cambiados por un commit respecto a su único padre (o al árbol vacío), como diferencias_arbol."""
+        arbol, padres, _ = self._arbol_padres_y_tiempo(sha)
+        if len(padres) > 1:
+            raise ObjetoNoSoportado("Los diffs de merges se delegan en git.")
+        arbol_padre = self._arbol_padres_y_tiempo(padres[0])[0] if padres else None
+        return self.diferencias_arbol(arbol_padre, arbol)
+
+    def leer_blob(self, sha: str) -> bytes:
+        """Devuelve el contenido de un blob (los submódulos no están en este repo y lanzan ObjetoNoSoportado)."""
+        tipo, datos = self.leer_objeto(sha)
+        if tipo != "blob":
+            raise ObjetoNoSoportado(f"El objeto {sha[:7]} no es un blob ({tipo}).")
+        return datos
+
+
+# --- API de módulo ---
+
+# Lectores ya abiertos, por directorio .git (los mmap se reutilizan entre llamadas)
+_lectores: dict[str, LectorObjetos] = {}
+_cerrojo_lectores = threading.Lock()
+
+def obtener_lector(ruta_repo: str) -> LectorObjetos | None:
+    """Devuelve un lector nativo para el repositorio, o None si no es utilizable."""
+    try:
+        dir_git = _encontrar_dir_git(ruta_repo)
+        if dir_git is None:
+            util_debug.registrar_depuracion(f"Lector nativo: no se encontró .git para {ruta_repo}")
+            return None
+        with _cerrojo_lectores:
+            if dir_git not in _lectores:
+                _lectores[dir_git] = LectorObjetos(dir_git)
+            return _lectores[dir_git]
+    except (ObjetoNoSoportado, OSError, ValueError, struct.error) as e:
+        util_debug.registrar_depuracion(f"Lector nativo no disponible para {ruta_repo}: {e}")
+        return None
+
+def marca_referencias(ruta_repo: str) -> tuple | None:
+    """
+    Devuelve una marca de HEAD que cambia cuando se mueve (commit, checkout, reset, pull...).
+
+    Solo lee HEAD, el archivo de la rama a la que apunta y el estado de packed-refs: sirve para
+    saber sin lanzar git si algo derivado de HEAD sigue al día. None si no se puede calcular.
+    """
+    try:
+        dir_git = _encontrar_dir_git(ruta_repo)
+        if dir_git is None:
+            return None
+        with open(os.path.join(dir_git, "HEAD"), 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+            head = f.read().strip()
+        dir_comun = _directorio_comun(dir_git)
+        rama = None
+        if head.startswith("ref:"):
+            ruta_rama = os.path.join(dir_comun, *head[len("ref:"):].strip().split("/"))
+            if os.path.isfile(ruta_rama):
+                with open(ruta_rama, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+                    rama = f.read().strip()
+        ruta_empaquetadas = os.path.join(dir_comun, "packed-refs")
+        empaquetadas = None
+        if os.path.isfile(ruta_empaquetadas):
+            estado = os.stat(ruta_empaquetadas)
+            empaquetadas = (estado.st_mtime_ns, estado.st_size)
+        return head, rama, empaquetadas
+    except OSError as e:
+        util_debug.registrar_depuracion(f"No se pudo calcular la marca de HEAD de {ruta_repo}: {e}")
+        return None
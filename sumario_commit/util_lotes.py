@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+# Resúmenes por lotes: envía el histórico pendiente como trabajos de inferencia por lotes y guarda los resultados
+
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+from . import constantes, nucleo, util_archivos, util_config, util_debug, util_enrutado, util_formato, util_git, util_ia, util_minhash
+
+try:
+    from google import genai as genai_lotes # SDK 'google-genai': solo lo necesita el proveedor de lotes de Gemini
+except ImportError:
+    genai_lotes = None
+
+# Estados de un trabajo (un archivo de peticiones enviado a un modelo)
+ESTADO_CREADO, ESTADO_ENVIADO, ESTADO_TERMINADO, ESTADO_FALLIDO = "creado", "enviado", "terminado", "fallido"
+# Estados de cada commit del lote; los dos últimos se pueden reenviar con reintentar_fallidos
+COMMIT_PENDIENTE, COMMIT_GUARDADO, COMMIT_FALLIDO, COMMIT_ERROR = "pendiente", "guardado", "fallido", "error"
+_ESTADOS_FINALES_GEMINI = {"JOB_STATE_SUCCEEDED": ESTADO_TERMINADO, "JOB_STATE_PARTIALLY_SUCCEEDED": ESTADO_TERMINADO,
+                           "JOB_STATE_FAILED": ESTADO_FALLIDO, "JOB_STATE_CANCELLED": ESTADO_FALLIDO,
+                           "JOB_STATE_EXPIRED": ESTADO_FALLIDO}
+_PATRON_ARCHIVO_DIFF = re.compile(r"^diff --git a/(.+?) b/", re.MULTILINE)
+
+
+class _ProveedorGemini:
+    """Batch API de Gemini: sube el JSONL, crea el trabajo, consulta su estado y descarga los resultados."""
+
+    def __init__(self):
+        if genai_lotes is None:
+            raise RuntimeError("el modo por lotes de Gemini necesita el paquete 'google-genai' (pip install google-genai)")
+        api_key = util_config.obtener_api_key()
+        if not api_key:
+            raise RuntimeError("no hay API Key configurada")
+        self._cliente = genai_lotes.Client(api_key=api_key)
+
+    def enviar(self, ruta_peticiones: str, modelo: str, nombre: str) -> str:
+        archivo = self._cliente.files.upload(file=ruta_peticiones, config={"display_name": nombre, "mime_type": "jsonl"})
+        trabajo = self._cliente.batches.create(model=modelo, src=archivo.name, config={"display_name": nombre})
+        return trabajo.name
+
+    def consultar(self, nombre_remoto: str) -> str:
+        trabajo = self._cliente.batches.get(name=nombre_remoto)
+        return _ESTADOS_FINALES_GEMINI.get(trabajo.state.name, ESTADO_ENVIADO)
+
+    def descargar(self, nombre_remoto: str, ruta_destino: str):
+        trabajo = self._cliente.batches.get(name=nombre_remoto)
+        if not trabajo.dest or not trabajo.dest.file_name:
+            raise RuntimeError("el trabajo terminó sin archivo de resultados")
+        util_archivos.escribir_atomico(ruta_destino, self._cliente.files.download(file=trabajo.dest.file_name))
+
+
+class _ProveedorLocal:
+    """
+    Sustituto local de la API por lotes para probar el flujo completo sin red ni cuota.
+
+    "Procesa" el archivo de peticiones al instante y responde, en el mismo formato que
+    Gemini, con un resumen de prueba que solo enumera los archivos del patch.
+    """
+
+    def enviar(self, ruta_peticiones: str, modelo: str, nombre: str) -> str:
+        return f"local:{ruta_peticiones}"
+
+    def consultar(self, nombre_remoto: str) -> str:
+        return ESTADO_TERMINADO
+
+    def descargar(self, nombre_remoto: str, ruta_destino: str):
+        lineas = []
+        with open(nombre_remoto[len("local:"):], 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+            for linea in f:
+                peticion = json.loads(linea)
+                prompt = peticion["request"]["contents"][0]["parts"][0]["text"]
+                archivos = list(dict.fromkeys(_PATRON_ARCHIVO_DIFF.findall(prompt)))
+                resumen = util_formato.crear_resumen(
+                    [f"Modifiqué `{archivo}`." for archivo in archivos[:10]] or ["Cambios sin archivos identificables."],
+                    "Resumen de prueba generado por el proveedor de lotes local.")
+                respuesta = {"candidates": [{"content": {"parts": [{"text": json.dumps(resumen, ensure_ascii=False)}]}}]}
+                lineas.append(json.dumps({"key": peticion["key"], "response": respuesta}, ensure_ascii=False))
+        util_archivos.escribir_atomico(ruta_destino, "".join(linea + "\n" for linea in lineas))
+
+
+def _obtener_proveedor(nombre: str):
+    if nombre == "local":
+        return _ProveedorLocal()
+    if nombre == "gemini":
+        return _ProveedorGemini()
+    raise RuntimeError(f"proveedor de lotes desconocido: '{nombre}'")
+
+def obtener_ruta_carpeta_lotes() -> str:
+    """Carpeta con un subdirectorio por lote (peticiones, resultados y estado.json)."""
+    return os.path.join(util_config.obtener_ruta_carpeta_resumenes(), constantes.NOMBRE_CARPETA_LOTES)
+
+def _ruta_estado(id_lote: str) -> str:
+    return os.path.join(obtener_ruta_carpeta_lotes(), id_lote, constantes.NOMBRE_ARCHIVO_ESTADO_LOTE)
+
+def _guardar_estado(estado: dict):
+    """Persiste el estado del lote (se hace tras cada paso para poder reanudarlo)."""
+    util_archivos.escribir_atomico(_ruta_estado(estado["id"]), json.dumps(estado, indent=1, ensure_ascii=False))
+
+def cargar_estado(id_lote: str) -> dict | None:
+    """Carga el estado de un lote guardado, o None si no existe o está dañado."""
+    try:
+        with open(_ruta_estado(id_lote), 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+            estado = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        util_debug.registrar_depuracion(f"No se pudo leer el estado del lote {id_lote}: {e}")
+        return None
+    # Lotes anteriores no guardaban el archivo de peticiones de cada commit: era el único de su modelo
+    archivo_por_modelo = {trabajo["modelo"]: trabajo["archivo"] for trabajo in estado["trabajos"]}
+    for commit in estado["commits"].values():
+        commit.setdefault("archivo", archivo_por_modelo.get(commit["modelo"]))
+    return estado
+
+def listar_lotes() -> list[dict]:
+    """Estados de todos los lotes guardados, del más reciente al más antiguo."""
+    carpeta = obtener_ruta_carpeta_lotes()
+    if not os.path.isdir(carpeta):
+        return []
+    lotes = [cargar_estado(nombre) for nombre in sorted(os.listdir(carpeta), reverse=True)]
+    return [lote for lote in lotes if lote]
+
+def _peticion_jsonl(clave: str, prompt: str) -> str:
+    """Línea del archivo de peticiones en el formato de la Batch API (salida JSON con el esquema del resumen)."""
+    peticion = {
+        "key": clave,
+        "request": {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generation_config": {"response_mime_type": "application/json",
+                                  "response_schema": _esquema_rest(util_formato.ESQUEMA_RESUMEN)},
+        },
+    }
+    return json.dumps(peticion, ensure_ascii=False)
+
+def _esquema_rest(esquema: dict) -> dict:
+    """La API REST espera los tipos del esquema en mayúsculas ('OBJECT', 'STRING'...)."""
+    resultado = {}
+    for clave, valor in esquema.items():
+        if clave == "type":
+            resultado[clave] = valor.upper()
+        elif isinstance(valor, dict):
+            resultado[clave] = {k: _esquema_rest(v) if isinstance(v, dict) else v for k, v in valor.items()} \
+                if clave == "properties" else _esquema_rest(valor)
+        else:
+            resultado[clave] = valor
+    return resultado
+
+def crear_lote(ruta_repo: str, desde: str, hasta: str) -> dict | None:
+    """
+    Prepara y envía un lote con los commits del periodo que aún no tienen resumen.
+
+    Los commits que no necesitan la IA (triaje, patch-id, casi duplicados) se guardan al
+    momento; el resto se escribe en un JSONL por modelo (según el enrutado por tamaño) y se
+    envía como un trabajo por lotes. Devuelve el estado del lote, o None si no hay nada que enviar.
+    """
+    commits = util_git.obtener_commits_rango_fechas(ruta_repo, desde, hasta)
+    if commits is None:
+        return None
+    carpeta_resumenes = util_config.obtener_ruta_carpeta_resumenes()
+    pendientes = [c for c in commits if not os.path.exists(
+        nucleo.obtener_ruta_datos_resumen(os.path.join(carpeta_resumenes, nucleo.nombre_archivo_resumen(c['fecha'], c['hash_completo']))))]
+    print(f"{len(commits)} commits en el periodo, {len(pendientes)} sin resumen.")
+    if not pendientes:
+        return None
+
+    # El trabajo de git se reparte entre procesos, como en el informe multi-repositorio
+    procesos = max(1, min(constantes.PROCESOS_MAXIMOS_INFORME, os.cpu_count() or 1))
+    with nucleo.crear_pool_git(procesos) as pool:
+        preparados = list(pool.map(nucleo.preparar_commit, [ruta_repo] * len(pendientes),
+                                   [c['hash_completo'] for c in pendientes], chunksize=8))
+
+    id_lote = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    carpeta_lote = os.path.join(obtener_ruta_carpeta_lotes(), id_lote)
+    estado = {"id": id_lote, "repositorio": os.path.abspath(ruta_repo), "desde": desde, "hasta": hasta,
+              "proveedor": util_config.obtener_ajuste(constantes.CLAVE_PROVEEDOR_LOTES), "commits": {}, "trabajos": []}
+    peticiones_por_modelo = {}
+    registros = [] # Resúmenes guardados sin IA, para los índices de reutilización
+    for commit, preparado in zip(pendientes, preparados):
+        if preparado is None:
+            print(f"Advertencia: No se pudo obtener el patch de {commit['hash']}; se omite.")
+            continue
+        datos, metadatos = nucleo.obtener_resumen_commit(ruta_repo, preparado, usar_prefetch=False, permitir_ia=False)
+        if datos:
+            # Triaje, patch-id o casi duplicado: se guarda ya, sin pasar por el lote
+            ruta_archivo = nucleo.guardar_resumen(commit['fecha'], commit['hash_completo'], datos, ruta_repo,
+                                                  metadatos, preparado['info'], informar=False)
+            if ruta_archivo:
+                registros.append((preparado, metadatos, ruta_archivo, datos))
+            continue
+        prompt = util_ia.construir_prompt(preparado['patch'])
+        modelo = util_enrutado.decidir_modelo(util_enrutado.estimar_tokens(prompt))["modelo"]
+        peticiones_por_modelo.setdefault(modelo, []).append(_peticion_jsonl(commit['hash_completo'], prompt))
+        # El patch-id y la firma se guardan para registrar el resumen al llegar sin repetir el trabajo de git
+        estado["commits"][commit['hash_completo']] = {
+            "fecha": commit['fecha'], "info": preparado['info'], "modelo": modelo, "archivo": _nombre_peticiones(modelo),
+            "estado": COMMIT_PENDIENTE, "patch_id": preparado['patch_id'], "firma": util_minhash.firma_a_texto(preparado['firma'])}
+    if registros:
+        nucleo.registrar_resumenes_nuevos(registros)
+        print(f"{len(registros)} commits resumidos sin IA (triaje o reutilizados).")
+    if not peticiones_por_modelo:
+        return None
+
+    try:
+        for modelo, lineas in peticiones_por_modelo.items():
+            nombre_archivo = _nombre_peticiones(modelo)
+            util_archivos.escribir_atomico(os.path.join(carpeta_lote, nombre_archivo), "".join(l + "\n" for l in lineas))
+            estado["trabajos"].append(_nuevo_trabajo(modelo, nombre_archivo, len(lineas)))
+        _guardar_estado(estado)
+    except OSError as e:
+        print(f"Error al escribir el lote: {e}")
+        util_debug.registrar_depuracion(f"Error de OS al crear el lote {id_lote}: {e}")
+        return None
+    print(f"Lote {id_lote} creado: {len(estado['commits'])} peticiones en {len(estado['trabajos'])} trabajo(s).")
+    return procesar_lote(id_lote, esperar=False)
+
+def _nombre_peticiones(modelo: str, reintento: int = 0) -> str:
+    sufijo = f"_reintento{reintento}" if reintento else ""
+    return f"peticiones_{re.sub(r'[^A-Za-z0-9.-]', '_', modelo)}{sufijo}.jsonl"
+
+def _nuevo_trabajo(modelo: str, nombre_archivo: str, peticiones: int) -> dict:
+    return {"modelo": modelo, "archivo": nombre_archivo, "peticiones": peticiones, "nombre_remoto": None, "estado": ESTADO_CREADO}
+
+def _commits_del_trabajo(estado: dict, trabajo: dict, estado_commit: str) -> list[tuple[str, dict]]:
+    return [(hash_commit, commit) for hash_commit, commit in estado["commits"].items()
+            if commit.get("archivo") == trabajo["archivo"] and commit["estado"] == estado_commit]
+
+def reintentar_fallidos(id_lote: str) -> dict | None:
+    """
+    Reenvía los commits de un lote cuyo trabajo falló (o caducó) o cuya respuesta no sirvió.
+
+    Copia sus peticiones de los archivos originales a un archivo nuevo por modelo (sin volver a
+    generar los patches) y lo envía como un trabajo más del mismo lote. Devuelve el estado.
+    """
+    estado = cargar_estado(id_lote)
+    if estado is None:
+        print(f"Error: No se encontró el lote '{id_lote}'.")
+        return None
+    reintentar = {hash_commit: commit for hash_commit, commit in estado["commits"].items()
+                  if commit["estado"] in (COMMIT_FALLIDO, COMMIT_ERROR)}
+    if not reintentar:
+        print("El lote no tiene commits fallidos que reintentar.")
+        return estado
+
+    carpeta_lote = os.path.dirname(_ruta_estado(id_lote))
+    lineas_por_modelo = {}
+    try:
+        for archivo in sorted({commit["archivo"] for commit in reintentar.values()}):
+            with open(os.path.join(carpeta_lote, archivo), 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+                for linea in f: # Línea a línea: cada petición lleva un patch completo
+                    clave = json.loads(linea).get("key")
+                    if clave in reintentar and reintentar[clave]["archivo"] == archivo:
+                        lineas_por_modelo.setdefault(reintentar[clave]["modelo"], []).append((clave, linea))
+        for modelo, lineas in lineas_por_modelo.items():
+            nombre_archivo = _nombre_peticiones(modelo, len(estado["trabajos"]))
+            util_archivos.escribir_atomico(os.path.join(carpeta_lote, nombre_archivo), "".join(linea for _, linea in lineas))
+            estado["trabajos"].append(_nuevo_trabajo(modelo, nombre_archivo, len(lineas)))
+            for clave, _ in lineas:
+                commit = estado["commits"][clave]
+                commit.update(archivo=nombre_archivo, estado=COMMIT_PENDIENTE)
+                commit.pop("error", None)
+        _guardar_estado(estado)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error al preparar el reintento del lote: {e}")
+        util_debug.registrar_depuracion(f"Error al reintentar el lote {id_lote}: {e}")
+        return estado
+    print(f"{sum(len(l) for l in lineas_por_modelo.values())} commits reenviados en {len(lineas_por_modelo)} trabajo(s).")
+    return procesar_lote(id_lote, esperar=False)
+
+def procesar_lote(id_lote: str, esperar: bool = True) -> dict | None:
+    """
+    Avanza un lote todo lo posible: envía los trabajos pendientes, consulta su estado y guarda
+    los resultados de los terminados. Se puede llamar de nuevo en cualquier momento para reanudarlo.
+
+    Con 'esperar' sondea cada INTERVALO_SONDEO_LOTES_SEGUNDOS hasta que todos terminan (Ctrl+C
+    lo interrumpe sin perder nada). Devuelve el estado actualizado.
+    """
+    estado = cargar_estado(id_lote)
+    if estado is None:
+        print(f"Error: No se encontró el lote '{id_lote}'.")
+        return None
+    carpeta_lote = os.path.dirname(_ruta_estado(id_lote))
+    try:
+        proveedor = _obtener_proveedor(estado["proveedor"])
+    except RuntimeError as e:
+        print(f"Error: No se puede procesar el lote: {e}")
+        return estado
+
+    while True:
+        for trabajo in estado["trabajos"]:
+            try:
+                if trabajo["estado"] == ESTADO_CREADO:
+                    trabajo["nombre_remoto"] = proveedor.enviar(os.path.join(carpeta_lote, trabajo["archivo"]),
+                                                                trabajo["modelo"], f"sumariocommit-{id_lote}")
+                    trabajo["estado"] = ESTADO_ENVIADO
+                    _guardar_estado(estado)
+                    print(f"Trabajo de {trabajo['modelo']} enviado ({trabajo['peticiones']} peticiones).")
+                if trabajo["estado"] == ESTADO_ENVIADO:
+                    nuevo_estado = proveedor.consultar(trabajo["nombre_remoto"])
+                    if nuevo_estado == ESTADO_TERMINADO:
+                        trabajo["resultados"] = trabajo["archivo"].replace("peticiones_", "resultados_", 1)
+                        proveedor.descargar(trabajo["nombre_remoto"], os.path.join(carpeta_lote, trabajo["resultados"]))
+                    trabajo["estado"] = nuevo_estado
+                    if nuevo_estado == ESTADO_FALLIDO:
+                        # Fallido, cancelado o caducado: sus commits se pueden reenviar con reintentar_fallidos
+                        for _, commit in _commits_del_trabajo(estado, trabajo, COMMIT_PENDIENTE):
+                            commit.update(estado=COMMIT_FALLIDO, error="el trabajo por lotes no terminó con éxito")
+                        print(f"El trabajo de {trabajo['modelo']} ha fallado; sus commits se pueden reintentar.")
+                    _guardar_estado(estado)
+                if trabajo["estado"] == ESTADO_TERMINADO and _commits_del_trabajo(estado, trabajo, COMMIT_PENDIENTE):
+                    _ingerir_resultados(estado, trabajo, os.path.join(carpeta_lote, trabajo["resultados"]))
+            except Exception as e: # Errores de red o de la API: el lote queda como estaba y se puede reanudar
+                print(f"Error al procesar el trabajo de {trabajo['modelo']}: {e}")
+                util_debug.registrar_depuracion(f"Excepción en el lote {id_lote} ({trabajo['modelo']}): {e}")
+
+        en_curso = [t for t in estado["trabajos"] if t["estado"] in (ESTADO_CREADO, ESTADO_ENVIADO)]
+        if not esperar or not en_curso:
+            break
+        print(f"{len(en_curso)} trabajo(s) en curso; nueva consulta en {constantes.INTERVALO_SONDEO_LOTES_SEGUNDOS} s (Ctrl+C para seguir más tarde)...")
+        time.sleep(constantes.INTERVALO_SONDEO_LOTES_SEGUNDOS)
+
+    _mostrar_progreso(estado)
+    return estado
+
+def _texto_respuesta(resultado: dict) -> str | None:
+    """Texto de la primera candidata de una línea de resultados (None si la petición falló)."""
+    try:
+        return resultado["response"]["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+def _ingerir_resultados(estado: dict, trabajo: dict, ruta_resultados: str):
+    """Guarda por el camino normal cada resumen del archivo de resultados (una vez por commit)."""
+    ruta_repo = estado["repositorio"]
+    registros = [] # (preparado, metadatos, ruta, datos) para los índices de reutilización
+    vistos = set()
+    cambios = 0
+    with open(ruta_resultados, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+        for linea in f: # Línea a línea: el archivo de resultados puede ser grande
+            if not linea.strip():
+                continue
+            resultado = json.loads(linea)
+            hash_commit = resultado.get("key")
+            vistos.add(hash_commit)
+            commit = estado["commits"].get(hash_commit)
+            if commit is None or commit["estado"] != COMMIT_PENDIENTE or commit.get("archivo") != trabajo["archivo"]:
+                continue
+            texto = _texto_respuesta(resultado)
+            datos = util_formato.parsear_resumen_json(texto) if texto else None
+            if not datos:
+                commit["estado"] = COMMIT_ERROR
+                commit["error"] = json.dumps(resultado["error"])[:200] if resultado.get("error") else "respuesta no válida"
+            else:
+                metadatos = {"origen": "lote", "modelo": trabajo["modelo"], "motivo": f"lote {estado['id']}"}
+                ruta_archivo = nucleo.guardar_resumen(commit["fecha"], hash_commit, datos, ruta_repo, metadatos,
+                                                      commit["info"], informar=False)
+                if not ruta_archivo:
+                    continue # Sigue pendiente: se reintentará al reanudar
+                # El patch-id y la firma se calcularon al crear el lote: no hace falta volver a git
+                preparado = {"info": commit["info"], "patch_id": commit.get("patch_id"),
+                             "firma": util_minhash.firma_desde_texto(commit.get("firma"))}
+                registros.append((preparado, metadatos, ruta_archivo, datos))
+                commit["estado"] = COMMIT_GUARDADO
+            cambios += 1
+            if cambios % constantes.GUARDADO_ESTADO_LOTE_CADA == 0:
+                _guardar_estado(estado)
+
+    # Peticiones sin línea de resultado (p. ej. en un trabajo terminado solo en parte)
+    for hash_commit, commit in _commits_del_trabajo(estado, trabajo, COMMIT_PENDIENTE):
+        if hash_commit not in vistos:
+            commit.update(estado=COMMIT_ERROR, error="sin resultado en el trabajo por lotes")
+            cambios += 1
+    if cambios:
+        _guardar_estado(estado)
+    if registros:
+        nucleo.registrar_resumenes_nuevos(registros)
+        print(f"{len(registros)} resúmenes del trabajo de {trabajo['modelo']} guardados.")
+
+def _mostrar_progreso(estado: dict):
+    estados = [c["estado"] for c in estado["commits"].values()]
+    print(f"Lote {estado['id']}: {estados.count(COMMIT_GUARDADO)} guardados, {estados.count(COMMIT_PENDIENTE)} pendientes, "
+          f"{estados.count(COMMIT_FALLIDO) + estados.count(COMMIT_ERROR)} fallidos o con error (de {len(estados)}).")
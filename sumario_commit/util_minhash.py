@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# Detección de patches casi duplicados con firmas MinHash vectorizadas (NumPy) y LSH por bandas
+
+import json
+import os
+import re
+import threading
+import zlib
+from . import constantes, util_archivos, util_config, util_debug
+
+try:
+    import numpy as np
+except ImportError: # NumPy es opcional: sin él no se calculan ni consultan firmas
+    np = None
+
+_PATRON_LINEAS_CAMBIADAS = re.compile(r"^(?!\+\+\+|---)[+-].*$", re.MULTILINE)
+# El fin de línea es un token más: separa las líneas cambiadas para que los shingles no las mezclen sin más
+_PATRON_TOKENS = re.compile(r"\n|\w+|[^\w\s]")
+
+# Firmas cargadas en memoria (protegidas por _cerrojo): matriz (n, permutaciones) uint32, claves de banda
+# (n, bandas) uint64, las líneas JSON del .jsonl (solo se parsean cuando hay coincidencia) y las
+# firmas registradas que aún no se han unido a la matriz. 'bytes' es el tamaño del .bin que refleja
+# la copia en memoria: si el archivo crece, otro proceso ha añadido firmas y se recarga
+_cerrojo = threading.Lock()
+_almacen = {"firmas": None, "bandas": None, "entradas": None, "pendientes": [], "ruta": None, "bytes": 0}
+
+
+def disponible() -> bool:
+    """Indica si la detección de casi duplicados está activa (NumPy instalado y ajuste activado)."""
+    return np is not None and bool(util_config.obtener_ajuste(constantes.CLAVE_MINHASH_ACTIVADO))
+
+def _parametros() -> tuple:
+    """Coeficientes fijos de las permutaciones (a impar, b) y multiplicadores de banda, iguales en toda ejecución."""
+    generador = np.random.default_rng(constantes.SEMILLA_MINHASH)
+    maximo = np.iinfo(np.uint64).max
+    a = generador.integers(1, maximo, size=constantes.PERMUTACIONES_MINHASH, dtype=np.uint64) | np.uint64(1)
+    b = generador.integers(0, maximo, size=constantes.PERMUTACIONES_MINHASH, dtype=np.uint64)
+    filas = constantes.PERMUTACIONES_MINHASH // constantes.BANDAS_MINHASH
+    multiplicadores = generador.integers(1, maximo, size=filas, dtype=np.uint64) | np.uint64(1)
+    return a, b, multiplicadores
+
+_coeficientes = _parametros() if np is not None else None
+
+def _tokens_cambiados(patch: str) -> tuple[list[str], int]:
+    """
+    Tokens de las líneas añadidas/borradas, normalizados (sin rutas, contexto ni diferencias de
+    espacios), y el número de esas líneas. El signo de cada línea es su primer token: distingue
+    añadir de borrar la misma línea. Ambas pasadas son expresiones regulares sobre todo el texto.
+    """
+    lineas = _PATRON_LINEAS_CAMBIADAS.findall(patch)
+    if not lineas:
+        return [], 0
+    return _PATRON_TOKENS.findall("\n".join(lineas).lower() + "\n"), len(lineas)
+
+def _shingles(tokens: list[str]):
+    """Hashes únicos de 32 bits de los shingles de TAMANO_SHINGLE_MINHASH tokens consecutivos."""
+    # crc32 solo una vez por token distinto; el paso por token (dict.fromkeys y map con el
+    # __getitem__ del vocabulario) corre entero en C, sin ejecutar código Python por token
+    vocabulario = {token: indice for indice, token in enumerate(dict.fromkeys(tokens))}
+    indices = np.fromiter(map(vocabulario.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+    hashes_vocabulario = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in vocabulario),
+                                     dtype=np.uint64, count=len(vocabulario))
+    hashes_token = hashes_vocabulario[indices]
+    k = min(constantes.TAMANO_SHINGLE_MINHASH, len(hashes_token))
+    # Combinación polinómica de k hashes consecutivos, en bloque (la aritmética uint64 desborda de forma modular)
+    combinado = np.zeros(len(hashes_token) - k + 1, dtype=np.uint64)
+    for posicion in range(k):
+        combinado = combinado * np.uint64(0x100000001B3) + hashes_token[posicion:len(hashes_token) - k + 1 + posicion]
+    return np.unique((combinado ^ (combinado >> np.uint64(32))) & np.uint64(0xFFFFFFFF))
+
+def calcular_firma(patch: str):
+    """
+    Calcula la firma MinHash (array uint32 de PERMUTACIONES_MINHASH valores) de un patch.
+
+    Devuelve None si NumPy no está disponible o el patch es demasiado pequeño para que la
+    firma signifique algo (menos de LINEAS_MINIMAS_MINHASH líneas o SHINGLES_MINIMOS_MINHASH shingles).
+    """
+    if np is None or not patch:
+        return None
+    tokens, lineas = _tokens_cambiados(patch)
+    if lineas < constantes.LINEAS_MINIMAS_MINHASH:
+        return None
+    shingles = _shingles(tokens)
+    if len(shingles) < constantes.SHINGLES_MINIMOS_MINHASH:
+        return None
+    a, b, _ = _coeficientes
+    firma = np.full(constantes.PERMUTACIONES_MINHASH, np.iinfo(np.uint32).max, dtype=np.uint64)
+    # Hash multiplicativo (a·x + b) >> 32 por permutación, por bloques para acotar la memoria
+    for inicio in range(0, len(shingles), constantes.BLOQUE_SHINGLES_MINHASH):
+        bloque = shingles[inicio:inicio + constantes.BLOQUE_SHINGLES_MINHASH]
+        valores = a[:, None] * bloque[None, :]
+        valores += b[:, None]
+        valores >>= np.uint64(32)
+        np.minimum(firma, valores.min(axis=1), out=firma)
+    return firma.astype(np.uint32)
+
+def firma_a_texto(firma) -> str | None:
+    """Serializa una firma (o None) como texto hexadecimal para guardarla en JSON."""
+    return None if firma is None else firma.astype(np.uint32).tobytes().hex()
+
+def firma_desde_texto(texto: str | None):
+    """Inversa de firma_a_texto (None si no hay firma o NumPy no está disponible)."""
+    if not texto or np is None:
+        return None
+    return np.frombuffer(bytes.fromhex(texto), dtype=np.uint32).copy()
+
+def _claves_banda(firmas):
+    """Una clave uint64 por banda y firma: dos firmas son candidatas si coinciden en alguna banda."""
+    _, _, multiplicadores = _coeficientes
+    filas = constantes.PERMUTACIONES_MINHASH // constantes.BANDAS_MINHASH
+    por_banda = firmas.reshape(len(firmas), constantes.BANDAS_MINHASH, filas).astype(np.uint64)
+    return (por_banda * multiplicadores).sum(axis=2, dtype=np.uint64)
+
+def _obtener_rutas() -> tuple[str, str]:
+    carpeta = util_config.obtener_ruta_carpeta_resumenes()
+    return (os.path.join(carpeta, constantes.NOMBRE_ARCHIVO_FIRMAS_MINHASH),
+            os.path.join(carpeta, constantes.NOMBRE_ARCHIVO_ENTRADAS_MINHASH))
+
+def _tamano_en_disco(ruta_firmas: str) -> int:
+    try:
+        return os.path.getsize(ruta_firmas)
+    except OSError:
+        return 0
+
+def _esta_al_dia(ruta_firmas: str) -> bool:
+    """Indica si la copia en memoria corresponde al archivo (otro proceso puede haber añadido firmas)."""
+    return _almacen["ruta"] == ruta_firmas and _almacen["bytes"] == _tamano_en_disco(ruta_firmas)
+
+def _cargar(ruta_firmas: str, ruta_entradas: str):
+    """Lee las firmas del disco (con el bloqueo del almacén ya tomado) y repara una escritura cortada."""
+    firmas = np.zeros(0, dtype=np.uint32)
+    entradas = []
+    try:
+        if os.path.exists(ruta_firmas):
+            firmas = np.fromfile(ruta_firmas, dtype=np.uint32)
+        if os.path.exists(ruta_entradas):
+            with open(ruta_entradas, 'r', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+                entradas = f.read().splitlines()
+        firmas = firmas[:len(firmas) - len(firmas) % constantes.PERMUTACIONES_MINHASH].reshape(-1, constantes.PERMUTACIONES_MINHASH)
+        total = min(len(firmas), len(entradas))
+        if firmas.nbytes != _tamano_en_disco(ruta_firmas) or total != len(firmas) or total != len(entradas):
+            # Una escritura se cortó entre los dos archivos: se descarta la fila incompleta para no desalinearlos
+            util_debug.registrar_depuracion(f"Firmas MinHash desalineadas ({len(firmas)}/{len(entradas)}), se recortan a {total}.")
+            firmas, entradas = firmas[:total], entradas[:total]
+            util_archivos.escribir_atomico(ruta_entradas, "".join(entrada + "\n" for entrada in entradas))
+            util_archivos.escribir_atomico(ruta_firmas, firmas.tobytes())
+        util_debug.registrar_depuracion(f"Firmas MinHash cargadas: {total}.")
+    except (OSError, ValueError) as e:
+        print(f"Advertencia: No se pudieron leer las firmas de casi duplicados: {e}")
+        util_debug.registrar_depuracion(f"Error al cargar firmas MinHash: {e}")
+        firmas, entradas = np.zeros((0, constantes.PERMUTACIONES_MINHASH), dtype=np.uint32), []
+    _almacen.update(firmas=firmas, bandas=_claves_banda(firmas), entradas=entradas, pendientes=[],
+                    ruta=ruta_firmas, bytes=firmas.nbytes)
+
+def _unir_pendientes():
+    """Une de una vez las firmas registradas, en lugar de copiar la matriz en cada registro."""
+    if _almacen["pendientes"]:
+        nuevas = np.vstack(_almacen["pendientes"])
+        _almacen["firmas"] = np.vstack([_almacen["firmas"], nuevas])
+        _almacen["bandas"] = np.vstack([_almacen["bandas"], _claves_banda(nuevas)])
+        _almacen["pendientes"] = []
+
+def buscar_similar(firma, hash_excluido: str | None = None) -> dict | None:
+    """
+    Busca el resumen guardado cuyo patch más se parece a la firma, si supera el umbral configurado.
+
+    Devuelve {'hash', 'archivo', 'datos', 'similitud'} o None.
+    """
+    if firma is None or not disponible():
+        return None
+    umbral = util_config.obtener_ajuste(constantes.CLAVE_UMBRAL_SIMILITUD_MINHASH)
+    ruta_firmas, ruta_entradas = _obtener_rutas()
+    with _cerrojo:
+        if not _esta_al_dia(ruta_firmas):
+            with util_archivos.bloqueo(ruta_firmas):
+                _cargar(ruta_firmas, ruta_entradas)
+        _unir_pendientes()
+        if not len(_almacen["firmas"]):
+            return None
+        # Candidatos por LSH (alguna banda idéntica) y similitud estimada solo sobre ellos
+        candidatos = np.flatnonzero((_almacen["bandas"] == _claves_banda(firma[None, :])).any(axis=1))
+        if not candidatos.size:
+            return None
+        similitudes = (_almacen["firmas"][candidatos] == firma).mean(axis=1)
+        for posicion in np.argsort(similitudes)[::-1]:
+            if similitudes[posicion] < umbral:
+                return None
+            entrada = json.loads(_almacen["entradas"][candidatos[posicion]])
+            if entrada.get("hash") != hash_excluido:
+                entrada["similitud"] = float(similitudes[posicion])
+                util_debug.registrar_depuracion(f"Casi duplicado: {entrada['hash'][:7]} (similitud {entrada['similitud']:.2f}).")
+                return entrada
+    return None
+
+def registrar_firma(firma, hash_commit: str, ruta_archivo: str, datos_resumen: dict) -> bool:
+    """Añade la firma de un resumen nuevo al almacén (al final de ambos archivos, bajo bloqueo entre procesos)."""
+    if firma is None or not disponible():
+        return False
+    ruta_firmas, ruta_entradas = _obtener_rutas()
+    linea = json.dumps({"hash": hash_commit, "archivo": ruta_archivo, "datos": datos_resumen}, ensure_ascii=False)
+    fila = firma.astype(np.uint32).tobytes()
+    with _cerrojo:
+        try:
+            with util_archivos.bloqueo(ruta_firmas):
+                if not _esta_al_dia(ruta_firmas):
+                    _cargar(ruta_firmas, ruta_entradas) # Recoge lo añadido por otros procesos y repara si hace falta
+                # Primero la línea JSON: si se corta antes de la firma, la carga siguiente la descarta
+                with open(ruta_entradas, 'a', encoding=constantes.CODIFICACION_ARCHIVOS) as f:
+                    f.write(linea + "\n")
+                with open(ruta_firmas, 'ab') as f:
+                    f.write(fila)
+        except OSError as e:
+            print(f"Advertencia: No se pudo guardar la firma de casi duplicados: {e}")
+            util_debug.registrar_depuracion(f"Error al guardar firma MinHash: {e}")
+            _almacen["ruta"] = None # Se recargará del disco
+            return False
+        _almacen["pendientes"].append(firma[None, :].astype(np.uint32))
+        _almacen["entradas"].append(linea)
+        _almacen["bytes"] += len(fila)
+    util_debug.registrar_depuracion(f"Firma MinHash registrada para {hash_commit[:7]}.")
+    return True
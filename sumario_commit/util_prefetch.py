@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# Prefetch especulativo: prepara el patch (y opcionalmente el resumen) de HEAD mientras el menú está inactivo
+
+import threading
+from . import constantes, util_config, util_debug, util_git, util_ia, util_indice_patch, util_minhash, util_triaje
+
+# Hilo trabajador y su señal de parada. Cada hilo tiene la suya: un hilo antiguo que siga dentro
+# de una llamada a la IA tras detener() ve su señal activada aunque ya se haya arrancado otro
+_hilo = None
+_parar = None
+
+# Resultado del prefetch para el HEAD más reciente detectado (protegido por _cerrojo)
+_cerrojo = threading.Lock()
+_estado = {"ruta": None, "hash": None, "patch": None, "resumen": None, "metadatos": None, "generando": None}
+
+
+def _nuevo_estado(ruta_repo: str | None, hash_commit: str | None) -> dict:
+    # 'generando' se marca (set) cuando termina el intento de generar el resumen, haya salido bien o no
+    return {"ruta": ruta_repo, "hash": hash_commit, "patch": None, "resumen": None, "metadatos": None, "generando": threading.Event()}
+
+def _vigente(ruta_repo: str, hash_commit: str, parar: threading.Event) -> bool:
+    # Llamar con _cerrojo tomado
+    return not parar.is_set() and _estado["ruta"] == ruta_repo and _estado["hash"] == hash_commit
+
+def _sigue_vigente(ruta_repo: str, hash_commit: str, parar: threading.Event) -> bool:
+    """Indica si el trabajo para este commit sigue teniendo sentido (no se paró ni cambió HEAD)."""
+    with _cerrojo:
+        return _vigente(ruta_repo, hash_commit, parar)
+
+def _guardar_si_vigente(ruta_repo: str, hash_commit: str, parar: threading.Event, **campos) -> bool:
+    """Actualiza _estado solo si el hilo no se ha parado y el commit sigue siendo el mismo."""
+    with _cerrojo:
+        if not _vigente(ruta_repo, hash_commit, parar):
+            return False
+        _estado.update(campos)
+        return True
+
+def _preparar_commit(ruta_repo: str, hash_commit: str, con_ia: bool, parar: threading.Event):
+    """Extrae el patch del commit y, si se pide, genera su resumen."""
+    global _estado
+    with _cerrojo:
+        if parar.is_set(): # Un hilo ya detenido no debe pisar el estado del siguiente
+            return
+        _estado = _nuevo_estado(ruta_repo, hash_commit)
+        generando = _estado["generando"]
+    try:
+        util_debug.registrar_depuracion(f"Prefetch: nuevo HEAD {hash_commit[:7]}, extrayendo patch.")
+        patch = util_git.generar_patch_commit(ruta_repo, hash_commit)
+        if not patch or not _guardar_si_vigente(ruta_repo, hash_commit, parar, patch=patch):
+            return
+
+        if not con_ia or util_ia.modelo_ia is None:
+            return
+        if util_triaje.clasificar_commit(ruta_repo, hash_commit):
+            util_debug.registrar_depuracion("Prefetch: commit trivial, su resumen no necesita la IA.")
+            return
+        patch_id = util_git.obtener_patch_id(ruta_repo, patch)
+        if patch_id and util_indice_patch.buscar_resumen(patch_id):
+            util_debug.registrar_depuracion("Prefetch: patch ya resumido (patch-id), no se llama a la IA.")
+            return
+        if (util_minhash.disponible() and util_config.obtener_ajuste(constantes.CLAVE_REUTILIZAR_CASI_DUPLICADOS)
+                and util_minhash.buscar_similar(util_minhash.calcular_firma(patch), hash_commit)):
+            util_debug.registrar_depuracion("Prefetch: patch casi idéntico a otro ya resumido, no se llama a la IA.")
+            return
+        if not _sigue_vigente(ruta_repo, hash_commit, parar):
+            return
+
+        util_debug.registrar_depuracion(f"Prefetch: generando resumen de {hash_commit[:7]} en segundo plano.")
+        resumen, metadatos = util_ia.generar_resumen_enrutado(patch)
+        if resumen and _guardar_si_vigente(ruta_repo, hash_commit, parar, resumen=resumen, metadatos=metadatos):
+            util_debug.registrar_depuracion(f"Prefetch: resumen de {hash_commit[:7]} listo.")
+    finally:
+        generando.set()
+
+def _bucle_prefetch(ruta_repo: str, con_ia: bool, parar: threading.Event):
+    """Comprueba periódicamente HEAD y prepara el commit cuando cambia."""
+    util_debug.registrar_depuracion(f"Prefetch iniciado para {ruta_repo} (con IA: {con_ia}).")
+    while not parar.is_set():
+        try:
+            # En silencio: en un repositorio sin commits se imprimiría un error sobre el menú en cada consulta
+            hash_head, _ = util_git.obtener_ultimo_commit_info(ruta_repo, silencioso=True)
+            with _cerrojo:
+                ya_preparado = _estado["ruta"] == ruta_repo and _estado["hash"] == hash_head
+            if hash_head and not ya_preparado:
+                _preparar_commit(ruta_repo, hash_head, con_ia, parar)
+        except Exception as e: # El hilo nunca debe tumbar la aplicación
+            util_debug.registrar_depuracion(f"Excepción en el hilo de prefetch: {e}")
+        parar.wait(constantes.INTERVALO_PREFETCH_SEGUNDOS)
+    util_debug.registrar_depuracion("Prefetch detenido.")
+
+def iniciar(ruta_repo: str, con_ia: bool = False):
+    """Arranca (o reinicia para otro repositorio) el hilo de prefetch."""
+    global _hilo, _parar
+    detener()
+    _parar = threading.Event()
+    _hilo = threading.Thread(target=_bucle_prefetch, args=(ruta_repo, con_ia, _parar), name="prefetch-sumariocommit", daemon=True)
+    _hilo.start()
+
+def detener():
+    """Detiene el hilo de prefetch y descarta lo preparado."""
+    global _hilo, _parar, _estado
+    if _parar is not None:
+        _parar.set()
+        _parar = None
+    if _hilo is not None:
+        # Una llamada a la IA en curso no se puede interrumpir (al ser daemon no bloquea la salida);
+        # cuando termine, su señal ya está activada y descarta el resultado sin tocar _estado
+        _hilo.join(timeout=1)
+        _hilo = None
+    with _cerrojo:
+        if _estado["generando"] is not None:
+            _estado["generando"].set() # Libera a quien estuviera esperando un resumen
+        _estado = _nuevo_estado(None, None)
+
+def obtener_patch(ruta_repo: str, hash_commit: str) -> str | None:
+    """Devuelve el patch precalculado del commit, si existe."""
+    with _cerrojo:
+        if _estado["ruta"] == ruta_repo and _estado["hash"] == hash_commit and _estado["patch"]:
+            util_debug.registrar_depuracion(f"Prefetch: usando patch precalculado de {hash_commit[:7]}.")
+            return _estado["patch"]
+    return None
+
+def obtener_resumen(ruta_repo: str, hash_commit: str) -> tuple[dict, dict] | None:
+    """
+    Devuelve (y consume) el resumen precalculado del commit junto a su decisión de enrutado.
+
+    Si el resumen de ese commit se está generando en ese momento, espera a que termine
+    en lugar de lanzar una segunda llamada a la IA.
+    """
+    with _cerrojo:
+        if _estado["ruta"] != ruta_repo or _estado["hash"] != hash_commit:
+            return None
+        generando = _estado["generando"]
+    if _hilo is not None and not generando.is_set():
+        print("Esperando al resumen que se está generando en segundo plano...")
+        generando.wait(constantes.ESPERA_MAXIMA_PREFETCH_SEGUNDOS)
+    with _cerrojo:
+        if _estado["hash"] != hash_commit or not _estado["resumen"]:
+            return None
+        resumen, metadatos = _estado["resumen"], _estado["metadatos"]
+        _estado["resumen"] = None # Un segundo intento sobre el mismo commit vuelve a llamar a la IA
+    util_debug.registrar_depuracion(f"Prefetch: usando resumen precalculado de {hash_commit[:7]}.")
+    return resumen, metadatos
+
+def esta_activo() -> bool:
+    """Indica si el hilo de prefetch está en marcha."""
+    return _hilo is not None and _hilo.is_alive()
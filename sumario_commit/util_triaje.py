@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Triaje de commits: resúmenes instantáneos por reglas para commits triviales (sin llamar a la IA)
+
+import os
+import re
+import threading
+from collections import Counter
+from . import util_debug, util_formato, util_git
+
+_PATRON_REVERT = re.compile(r'^Revert "(?P<original>.*)"', re.IGNORECASE)
+# Línea que 'git revert' añade al cuerpo: es lo que distingue un revert real de un asunto que lo parece
+_PATRON_REVERT_CUERPO = re.compile(r"^This reverts commit (?P<hash>[0-9a-f]{7,64})", re.IGNORECASE | re.MULTILINE)
+# Palabra clave explícita en el asunto (un número de versión suelto no basta: "Fix crash on 2.3 input")
+_PATRON_VERSION = re.compile(r"\b(bump(s|ed)?|release[sd]?|versi[oó]n)\b|^v?\d+\.\d+(\.\d+)?$", re.IGNORECASE)
+
+# Archivos de metadatos que cambian en un "bump" de versión (sin archivos de código como setup.py o __init__.py)
+_ARCHIVOS_VERSION = {
+    "package.json", "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "pyproject.toml", "setup.cfg",
+    "version", "version.txt", "cargo.toml", "cargo.lock", "gradle.properties", "composer.json",
+    "composer.lock", "pubspec.yaml", "chart.yaml", "poetry.lock",
+}
+_LINEAS_MAXIMAS_VERSION = 20 # Líneas cambiadas (fuera de lockfiles) para considerar un commit como "bump"
+
+# Llamadas a la IA evitadas en esta sesión, por clase de commit
+_omitidas = Counter()
+_cerrojo_omitidas = threading.Lock()
+
+
+def _es_archivo_version(ruta: str) -> bool:
+    return os.path.basename(ruta).lower() in _ARCHIVOS_VERSION
+
+def _es_changelog(ruta: str) -> bool:
+    nombre = os.path.basename(ruta).lower()
+    return nombre.startswith("changelog") or nombre.startswith("changes")
+
+def _es_lockfile(ruta: str) -> bool:
+    nombre = os.path.basename(ruta).lower()
+    return nombre.endswith(".lock") or nombre in {"package-lock.json", "pnpm-lock.yaml"}
+
+def _plantilla(tareas: list[str], resumen_tareas: str) -> dict:
+    """Resumen estructurado con los mismos campos que devuelve la IA."""
+    return util_formato.crear_resumen(tareas, resumen_tareas)
+
+def _clasificar(datos: dict) -> tuple[str, str, dict] | None:
+    """Devuelve (clase, motivo, resumen) si el commit es trivial, o None si merece pasar por la IA."""
+    asunto = datos['asunto']
+    archivos = datos['archivos']
+
+    if len(datos['padres']) > 1:
+        return "merge", f"merge de {len(datos['padres'])} padres", _plantilla(
+            [f"Integré otra rama mediante un merge (\"{asunto}\")."],
+            "Integré cambios de otra rama (merge) sin desarrollo nuevo propio en este commit.")
+
+    revertido = _PATRON_REVERT_CUERPO.search(datos.get('cuerpo') or "")
+    if revertido:
+        coincidencia = _PATRON_REVERT.match(asunto)
+        original = f"\"{coincidencia.group('original')}\"" if coincidencia else f"{revertido.group('hash')[:7]}"
+        return "revert", "revert de un commit anterior", _plantilla(
+            [f"Revertí el commit {original}."],
+            "Deshice un cambio anterior que no debía mantenerse.")
+
+    if not archivos:
+        return "vacio", "commit sin cambios en archivos", _plantilla(
+            [f"Registré un commit sin cambios en archivos (\"{asunto}\")."],
+            "Commit sin modificaciones de código.")
+
+    if all(a['ruta_anterior'] and a['anadidas'] == 0 and a['borradas'] == 0 for a in archivos):
+        renombrados = [f"Renombré/moví `{a['ruta_anterior']}` a `{a['ruta']}`." for a in archivos[:10]]
+        if len(archivos) > 10:
+            renombrados.append(f"... y {len(archivos) - 10} archivos más.")
+        return "renombrado", f"{len(archivos)} archivos solo renombrados", _plantilla(
+            renombrados, "Reorganicé archivos (renombrados o movidos) sin cambiar su contenido.")
+
+    if datos['archivos_sin_espacios'] == 0 and not any(a['binario'] for a in archivos):
+        return "formato", "solo cambios de espacios/líneas en blanco", _plantilla(
+            [f"Apliqué cambios de formato (espacios y líneas en blanco) en {len(archivos)} archivo(s)."],
+            "Ajusté el formato del código sin cambios funcionales.")
+
+    if _PATRON_VERSION.search(asunto.strip()) and all(_es_archivo_version(a['ruta']) or _es_changelog(a['ruta']) for a in archivos) \
+            and any(_es_archivo_version(a['ruta']) for a in archivos):
+        lineas = sum(a['anadidas'] + a['borradas'] for a in archivos if not _es_lockfile(a['ruta']))
+        if lineas <= _LINEAS_MAXIMAS_VERSION:
+            return "version", "cambio de versión", _plantilla(
+                [f"Actualicé la versión del proyecto (\"{asunto}\")."] +
+                [f"Modifiqué `{a['ruta']}`." for a in archivos[:10]],
+                "Preparé una nueva versión actualizando los archivos de versión.")
+    return None
+
+def clasificar_commit(ruta_repo: str, hash_commit: str, datos: dict | None = None) -> dict | None:
+    """
+    Clasifica el commit con --numstat, --find-renames, número de padres y el asunto.
+
+    Acepta las estadísticas ya obtenidas con util_git.obtener_estadisticas_commit para no
+    repetir las llamadas a git. Devuelve {'clase', 'motivo', 'resumen', 'autor', 'asunto'}
+    si el commit es trivial (merge, revert, vacío, renombrado puro, solo formato o cambio
+    de versión) y None si debe resumirse con la IA o no se pudo clasificar.
+    """
+    if datos is None:
+        datos = util_git.obtener_estadisticas_commit(ruta_repo, hash_commit)
+    if datos is None:
+        return None
+    resultado = _clasificar(datos)
+    if resultado is None:
+        util_debug.registrar_depuracion(f"Triaje: {hash_commit[:7]} necesita la IA.")
+        return None
+    clase, motivo, resumen = resultado
+    util_debug.registrar_depuracion(f"Triaje: {hash_commit[:7]} es trivial ({clase}: {motivo}).")
+    return {'clase': clase, 'motivo': motivo, 'resumen': resumen, 'autor': datos['autor'], 'asunto': datos['asunto']}
+
+def registrar_omision(clase: str):
+    """Cuenta una llamada a la IA evitada gracias al triaje."""
+    with _cerrojo_omitidas:
+        _omitidas[clase] += 1
+
+def obtener_omisiones() -> dict[str, int]:
+    """Llamadas a la IA evitadas en esta sesión, por clase de commit."""
+    with _cerrojo_omitidas:
+        return dict(_omitidas)